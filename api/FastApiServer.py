@@ -1,19 +1,33 @@
-from fastapi import FastAPI, status, Header, Depends, HTTPException
+from fastapi import FastAPI, status, Header, Depends, HTTPException, Request, Response, Query
+from fastapi.responses import StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from typing import Annotated, List, Optional
+import asyncio
+import json
+import logging
+from datetime import date, datetime
+from decimal import Decimal
+import time
+import uuid
 import uvicorn
-from models.vehicle_models import *
+from app_logging import get_logger, bind_context, fields, elapsed_ms
+from models.vehicle_models import Vehicle, VehicleHistorySummary
 from models.user_models import UserRegister, UserLogin, LoginResponse, MessageResponse, User
-from models.parking_models import ParkingLotBase, SessionStart, SessionStop, SessionResponse, ParkingLotResponse
+from models.parking_models import ParkingLotBase, SessionStart, SessionStop, SessionResponse, ParkingLotResponse, Session, ParkingLotOccupancy, GateEvent, GateEventResult
 from models.payment_models import PaymentCreate, PaymentRefund, PaymentUpdate, PaymentOut, PaymentBase
 from models.reservation_models import ReservationRegister, ReservationOut
-from models.discount_model import DiscountBase,DiscountCreate
+from models.discount_model import DiscountBase,DiscountCreate,DiscountBatch,DiscountBatchResult
 from services.user_service import UserService
 from services.parking_service import ParkingService
 from services.reservation_service import ReservationService
 from services.vehicle_service import VehicleService
 from services.payment_service import PaymentService
 from services.discount_service import DiscountService
+from db_pool import pool_metrics
+from storage_utils import cache_metrics, run_in_db_executor, Page, next_cursor, history_cursor
+from timeutil import format_timestamp, naive
+from occupancy import get_occupancy
+from gate_events import gate_queue, submit_gate_events, QueueFull, ACK_TIMEOUT
 
 # Define tags for API organization
 tags_metadata = [
@@ -55,11 +69,78 @@ app = FastAPI(
     openapi_tags=tags_metadata
 )
 security = HTTPBearer(auto_error=False)  
+logger = get_logger("api")
+
+@app.middleware("http")
+async def request_logging(request: Request, call_next):
+    """Bind a request id to every log line of this request and write one (sampled) access log entry"""
+    request_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex
+    started = time.perf_counter()
+    with bind_context(request_id=request_id, method=request.method, path=request.url.path):
+        try:
+            response = await call_next(request)
+        except Exception:
+            logger.exception("request failed", extra=fields(duration_ms=elapsed_ms(started)))
+            raise
+        level = logging.WARNING if response.status_code >= 500 else logging.INFO
+        logger.log(level, "request handled", extra=fields(status=response.status_code, duration_ms=elapsed_ms(started)))
+    response.headers["X-Request-ID"] = request_id
+    return response
+
+# --------------------------
+# Paginated and streamed lists
+# --------------------------
+# List routes take ?limit=&after= for keyset pages (the next page's `after` is sent in the
+# X-Next-Cursor header) and ?stream=true for an NDJSON export read from the database in chunks.
+# Without any of them they return the whole list as before.
+MAX_PAGE_SIZE = 1000
+NDJSON_BATCH = 500
+
+def page_params(
+    after: Optional[str] = Query(None, description="id of the last item of the previous page"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    stream: bool = Query(False, description="stream all rows as NDJSON"),
+) -> Optional[Page]:
+    if after is None and limit is None and not stream:
+        return None
+    return Page(after, limit, stream)
+
+def _json_default(value):
+    # datetimes in the same text format as the typed models, DECIMALs as numbers
+    if isinstance(value, (datetime, date)):
+        return format_timestamp(value)
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+def ndjson_lines(rows, model=None):
+    """Encode rows one JSON document per line, in batches of NDJSON_BATCH lines"""
+    batch = []
+    for row in rows:
+        if model is not None:
+            batch.append(model.model_validate(row, from_attributes=True).model_dump_json())
+        else:
+            batch.append(json.dumps(dict(row), default=_json_default))
+        if len(batch) >= NDJSON_BATCH:
+            yield "\n".join(batch) + "\n"
+            batch = []
+    if batch:
+        yield "\n".join(batch) + "\n"
+
+def list_response(rows, page: Optional[Page], response: Response, model=None, cursor_key=None):
+    """A route's list result as a page (with X-Next-Cursor), an NDJSON stream or the whole list"""
+    if page is None:
+        return rows
+    if page.stream:
+        return StreamingResponse(ndjson_lines(rows, model), media_type="application/x-ndjson")
+    cursor = next_cursor(rows, page, cursor_key)
+    if cursor is not None:
+        response.headers["X-Next-Cursor"] = cursor
+    return rows
 
 def get_token(credentials: Optional[HTTPAuthorizationCredentials] = Depends(security)) -> Optional[str]:
     """Extract token from Authorization header"""
     if credentials:
-        print(credentials)
         return credentials.credentials
     return None
 
@@ -68,20 +149,41 @@ async def read_root():
     """Welcome endpoint with API information"""
     return {"message": "Welcome to MobyPark API!", "version": "1.0.0", "docs": "/docs"}
 
+@app.get("/metrics/db-pool", tags=["General"])
+async def get_db_pool_metrics(token: Optional[str] = Depends(get_token)):
+    """Connection pool usage: open / in-use / idle connections, waiters and checkout latency (Admin only)"""
+    session_user = await run_in_db_executor(ParkingService.validate_session_token, token)
+    ParkingService.validate_admin_access(session_user)
+    return pool_metrics()
+
+@app.get("/metrics/cache", tags=["General"])
+async def get_cache_metrics(token: Optional[str] = Depends(get_token)):
+    """Hit / miss counters, size and invalidations of the in-process row caches (Admin only)"""
+    session_user = await run_in_db_executor(ParkingService.validate_session_token, token)
+    ParkingService.validate_admin_access(session_user)
+    return cache_metrics()
+
+@app.get("/metrics/gate-events", tags=["General"])
+async def get_gate_event_metrics(token: Optional[str] = Depends(get_token)):
+    """Received, duplicate, rejected and applied gate events, batches written and the current backlog (Admin only)"""
+    session_user = await run_in_db_executor(ParkingService.validate_session_token, token)
+    ParkingService.validate_admin_access(session_user)
+    return gate_queue.metrics()
+
 @app.post("/register", response_model=MessageResponse, status_code=status.HTTP_201_CREATED, tags=["Authentication"])
 async def register_user(user_data: UserRegister):
     """Register a new user account with optional extended information"""
-    return UserService.create_user(user_data)
+    return await run_in_db_executor(UserService.create_user, user_data)
 
 @app.post("/login", response_model=LoginResponse, tags=["Authentication"])
 async def login_user(credentials: UserLogin):
     """Authenticate user credentials and create a session token"""
-    return UserService.authenticate_user(credentials)
+    return await UserService.authenticate_user_async(credentials)
 
 @app.get("/users/{username}", response_model=User, tags=["Users"])
 async def get_user_profile(username: str):
     """Get detailed user profile information by username"""
-    user = UserService.get_user_by_username(username)
+    user = await run_in_db_executor(UserService.get_user_by_username, username)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -99,7 +201,7 @@ async def delete_user_account(
     Requires Bearer token in Authorization header with admin privileges.
     Only users with ADMIN role can delete user accounts.
     """
-    return UserService.delete_user(username, token)
+    return await run_in_db_executor(UserService.delete_user, username, token)
 
 @app.get("/users", response_model=List[User], tags=["Users"])
 async def get_all_users(token: Optional[str] = Depends(get_token)):
@@ -108,7 +210,7 @@ async def get_all_users(token: Optional[str] = Depends(get_token)):
     Requires Bearer token in Authorization header with admin privileges.
     Only users with ADMIN role can access this endpoint.
     """
-    return UserService.get_all_users(token)
+    return await run_in_db_executor(UserService.get_all_users, token)
 
 @app.get("/users/{username}/vehicles", response_model=List[Vehicle], tags=["Users"])
 async def get_user_vehicles(
@@ -120,7 +222,7 @@ async def get_user_vehicles(
     Requires Bearer token in Authorization header.
     Users can only access their own vehicle list unless they have ADMIN role.
     """
-    return VehicleService.getUserVehicles(username, token)
+    return await run_in_db_executor(VehicleService.getUserVehicles, username, token)
 
 # Parking Lot Management Endpoints
 @app.post("/parking-lots", response_model=ParkingLotResponse, status_code=status.HTTP_201_CREATED, tags=["Parking Lots"])
@@ -133,7 +235,7 @@ async def create_parking_lot(
     Requires Bearer token in Authorization header with admin privileges.
     Only users with ADMIN role can create new parking lots.
     """
-    return ParkingService.create_parking_lot(parking_lot_data, token)
+    return await run_in_db_executor(ParkingService.create_parking_lot, parking_lot_data, token)
 
 @app.post("/parking-lots/{lot_id}/sessions/start", response_model=SessionResponse, tags=["Parking Lots"])
 async def start_parking_session(
@@ -146,8 +248,7 @@ async def start_parking_session(
     Requires Bearer token in Authorization header.
     Creates a new parking session with start time and links it to the authenticated user.
     """
-    print(f"DEBUG: FastAPI received token: '{token}' (type: {type(token)})")  # Debug line
-    return ParkingService.start_parking_session(lot_id, session_data, token)
+    return await run_in_db_executor(ParkingService.start_parking_session, lot_id, session_data, token)
 
 @app.post("/parking-lots/{lot_id}/sessions/stop", response_model=SessionResponse, tags=["Parking Lots"])
 async def stop_parking_session(
@@ -161,17 +262,53 @@ async def stop_parking_session(
     Requires Bearer token in Authorization header.
     Ends an active parking session by setting the stop time.
     """
-    return ParkingService.stop_parking_session(lot_id, session_data, discount_code, token)
+    return await run_in_db_executor(ParkingService.stop_parking_session, lot_id, session_data, discount_code, token)
+
+# Largest array of events one gate event request may carry
+MAX_GATE_EVENTS = 5000
+
+@app.post("/gate-events", response_model=GateEventResult, tags=["Parking Lots"])
+async def ingest_gate_events(
+    events: List[GateEvent],
+    token: Optional[str] = Depends(get_token)
+):
+    """Record a batch of ANPR camera events (plates entering and leaving lots)
+
+    Requires Bearer token of an admin; the camera integration uses the system user.
+    Answers once every event is stored, so a batch that fails or times out can simply be sent
+    again: events that were already received are counted as duplicates. Answers 503 with
+    Retry-After when the queue is full.
+    """
+    session_user = await run_in_db_executor(ParkingService.validate_session_token, token)
+    ParkingService.validate_admin_access(session_user)
+    if len(events) > MAX_GATE_EVENTS:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=f"At most {MAX_GATE_EVENTS} events per request")
+    retry = {"Retry-After": "1"}
+    try:
+        stored = submit_gate_events(events)
+    except QueueFull:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Gate event queue is full, retry later", headers=retry)
+    try:
+        # Shielded: a request that gives up doesn't cancel storing its events
+        return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(stored)), ACK_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Gate events not stored yet, send them again", headers=retry)
+    except Exception:
+        logger.exception("gate events not stored", extra=fields(events=len(events)))
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Gate events could not be stored, send them again", headers=retry)
 
 @app.get("/parking-lots", response_model=list[ParkingLotResponse])
 async def list_parking_lots(
-    authorization: Annotated[Optional[str], Header()] = None
+    response: Response,
+    authorization: Annotated[Optional[str], Header()] = None,
+    page: Optional[Page] = Depends(page_params)
 ):
     """List all parking lots.
 
     Requires Authorization header with valid session token.
     """
-    return ParkingService.list_parking_lots(authorization)
+    rows = await run_in_db_executor(ParkingService.list_parking_lots, authorization, page)
+    return list_response(rows, page, response)
 
 @app.get("/parking-lots/{lot_id}", response_model=ParkingLotResponse)
 async def get_parking_lot(
@@ -183,7 +320,18 @@ async def get_parking_lot(
     Requires Authorization header with valid session token.
 
     """
-    return ParkingService.get_parking_lot(lot_id, authorization)
+    return await run_in_db_executor(ParkingService.get_parking_lot, lot_id, authorization)
+
+@app.get("/parking-lots/{lot_id}/occupancy", response_model=ParkingLotOccupancy, tags=["Parking Lots"])
+async def get_parking_lot_occupancy(lot_id: str):
+    """Live capacity, reserved and occupied spots of a parking lot.
+
+    Served from an in-memory snapshot that is at most a second old, so gate displays can poll it.
+    """
+    occupancy = await run_in_db_executor(get_occupancy, lot_id)
+    if occupancy is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Parking lot not found")
+    return occupancy
 
 @app.get("/parking-lots/{lot_id}/sessions", response_model=list[SessionResponse])
 async def list_parking_sessions(
@@ -196,7 +344,7 @@ async def list_parking_sessions(
     
     Admins see all sessions; users see only their own.
     """
-    return ParkingService.list_parking_sessions(lot_id, authorization)
+    return await run_in_db_executor(ParkingService.list_parking_sessions, lot_id, authorization)
 
 @app.get("/parking-lots/{lot_id}/sessions/{session_id}", response_model=SessionResponse)
 async def get_parking_session(
@@ -211,14 +359,14 @@ async def get_parking_session(
     Only Admins or the session owner can access.
 
     """
-    return ParkingService.get_parking_session(lot_id, session_id, authorization)
+    return await run_in_db_executor(ParkingService.get_parking_session, lot_id, session_id, authorization)
 
 @app.put("/parking-lots/{lot_id}", response_model=ParkingLotResponse)
 async def update_parking_lot(lot_id: str, updates: dict, token: Optional[str] = Depends(get_token)):
     """
     Update parking lot details (Admin only)
     """
-    return ParkingService.update_parking_lot(lot_id, updates, token)
+    return await run_in_db_executor(ParkingService.update_parking_lot, lot_id, updates, token)
 
 @app.delete("/parking-lots/{lot_id}", status_code=status.HTTP_200_OK)
 async def delete_parking_lot(
@@ -226,7 +374,7 @@ async def delete_parking_lot(
     authorization: Annotated[Optional[str], Header()] = None
 ):
     """Delete a parking lot (Admin only)."""
-    return ParkingService.delete_parking_lot(lot_id, authorization)
+    return await run_in_db_executor(ParkingService.delete_parking_lot, lot_id, authorization)
 
 @app.delete("/parking-lots/{lot_id}/sessions/{session_id}", status_code=status.HTTP_200_OK)
 async def delete_parking_session(
@@ -238,59 +386,61 @@ async def delete_parking_session(
 ):
 
     """Delete a specific parking session (Admin only)."""
-    return ParkingService.delete_parking_session(lot_id, session_id, authorization)
+    return await run_in_db_executor(ParkingService.delete_parking_session, lot_id, session_id, authorization)
 
 @app.get("/payments", response_model=List[PaymentBase], tags=["Payments"])
-async def get_payments(token: Optional[str] = Depends(get_token)):
+async def get_payments(response: Response, token: Optional[str] = Depends(get_token), page: Optional[Page] = Depends(page_params)):
     """Get all payments for the authenticated user"""
-    session = PaymentService.get_session(token)
+    session = await run_in_db_executor(PaymentService.get_session, token)
     if not session:
         raise HTTPException(status_code=401, detail="Invalid or missing token")
-    return PaymentService.get_user_payments(session["username"])
+    rows = await run_in_db_executor(PaymentService.get_user_payments, session["username"], page)
+    return list_response(rows, page, response, PaymentBase)
 
 
 @app.get("/payments/{username}", response_model=List[PaymentOut], tags=["Payments"])
-async def get_user_payments(username: str, token: Optional[str] = Depends(get_token)):
+async def get_user_payments(username: str, response: Response, token: Optional[str] = Depends(get_token), page: Optional[Page] = Depends(page_params)):
     """Admin only: Get payments of a specific user"""
-    session = PaymentService.get_session(token)
+    session = await run_in_db_executor(PaymentService.get_session, token)
     if not session:
         raise HTTPException(status_code=401, detail="Invalid or missing token")
     try:
-        return PaymentService.get_all_user_payments(session, username)
+        rows = await run_in_db_executor(PaymentService.get_all_user_payments, session, username, page)
     except PermissionError:
         raise HTTPException(status_code=403, detail="Access denied")
+    return list_response(rows, page, response, PaymentOut)
 
 
 @app.post("/payments/create", response_model=dict, status_code=201, tags=["Payments"])
 async def create_payment(payment: PaymentCreate, token: Optional[str] = Depends(get_token)):
     """Create a new payment"""
-    session = PaymentService.get_session(token)
+    session = await run_in_db_executor(PaymentService.get_session, token)
     if not session:
         raise HTTPException(status_code=401, detail="Invalid or missing token")
-    payment_obj = PaymentService.create_payment(payment, session)
+    payment_obj = await run_in_db_executor(PaymentService.create_payment, payment, session)
     return {"status": "Success", "payment": payment_obj}
 
 
 @app.post("/payments/refund", response_model=dict, status_code=201, tags=["Payments"])
 async def refund_payment(payment: PaymentRefund, token: Optional[str] = Depends(get_token)):
     """Issue a refund (Admin only)"""
-    session = PaymentService.get_session(token)
+    session = await run_in_db_executor(PaymentService.get_session, token)
     if not session:
         raise HTTPException(status_code=401, detail="Invalid or missing token")
     if session["role"] != "ADMIN":
         raise HTTPException(status_code=403, detail="Access denied")
-    refund_obj = PaymentService.refund_payment(payment, session)
+    refund_obj = await run_in_db_executor(PaymentService.refund_payment, payment, session)
     return {"status": "Success", "payment": refund_obj}
 
 
 @app.put("/payments/{transaction_id}", response_model=dict, tags=["Payments"])
 async def update_payment(transaction_id: str, update: PaymentUpdate, token: Optional[str] = Depends(get_token)):
     """Complete or validate a payment transaction"""
-    session = PaymentService.get_session(token)
+    session = await run_in_db_executor(PaymentService.get_session, token)
     if not session:
         raise HTTPException(status_code=401, detail="Invalid or missing token")
     try:
-        updated_payment = PaymentService.update_payment(transaction_id, update, session)
+        updated_payment = await run_in_db_executor(PaymentService.update_payment, transaction_id, update, session)
         return {"status": "Success", "payment": updated_payment}
     except ValueError:
         raise HTTPException(status_code=404, detail="Payment not found")
@@ -300,11 +450,11 @@ async def update_payment(transaction_id: str, update: PaymentUpdate, token: Opti
 @app.delete("/payments/{transaction_id}", response_model=dict, tags=["Payments"])
 async def update_payment(transaction_id: str, update: PaymentUpdate, token: Optional[str] = Depends(get_token)):
     """Complete or validate a payment transaction"""
-    session = PaymentService.get_session(token)
+    session = await run_in_db_executor(PaymentService.get_session, token)
     if not session:
         raise HTTPException(status_code=401, detail="Invalid or missing token")
     try:
-        updated_payment = PaymentService.update_payment(transaction_id, update)
+        updated_payment = await run_in_db_executor(PaymentService.update_payment, transaction_id, update)
         return {"status": "Success", "payment": updated_payment}
     except ValueError:
         raise HTTPException(status_code=404, detail="Payment not found")
@@ -321,16 +471,30 @@ async def get_vehicle_id_reservations(
     """
     Acquire all reservations for a vehicle ID deze check
     """
-    return VehicleService.get_vehicle_reservations(token, vehicle_id)
+    return await run_in_db_executor(VehicleService.get_vehicle_reservations, token, vehicle_id)
 
-@app.get("/vehicles/{vehicle_id}/history", response_model=SessionResponse, tags=["Vehicles"])
+@app.get("/vehicles/{vehicle_id}/history", response_model=List[Session], tags=["Vehicles"])
 async def get_vehicle_id_history(
+    vehicle_id : str,
+    response: Response,
+    since: Optional[datetime] = Query(None, description="only sessions started at or after this time"),
+    until: Optional[datetime] = Query(None, description="only sessions started before this time"),
+    token: Optional[str] = Depends(get_token),
+    page: Optional[Page] = Depends(page_params)):
+    """
+    Acquire the parking sessions of a vehicle by ID, oldest first
+    """
+    rows = await run_in_db_executor(VehicleService.get_vehicle_history, token, vehicle_id, page, naive(since), naive(until))
+    return list_response(rows, page, response, Session, cursor_key=history_cursor)
+
+@app.get("/vehicles/{vehicle_id}/history/summary", response_model=VehicleHistorySummary, tags=["Vehicles"])
+async def get_vehicle_id_history_summary(
     vehicle_id : str,
     token: Optional[str] = Depends(get_token)):
     """
-    Acquire all history for a vehicle by ID (currently none functional)
+    Number of sessions, total parked minutes and cost of a vehicle
     """
-    return  VehicleService.get_vehicle_history(token, vehicle_id) 
+    return await run_in_db_executor(VehicleService.get_vehicle_history_summary, token, vehicle_id)
 
 @app.get("/vehicle", response_model=List[Vehicle], tags=["Vehicles"])
 async def get_vehicles(
@@ -338,7 +502,7 @@ async def get_vehicles(
     """
     Acquire all vehicles for the logged-in user
     """
-    return VehicleService.getUserVehicles(None, token)
+    return await run_in_db_executor(VehicleService.getUserVehicles, None, token)
 
 @app.get("/vehicle/{license_plate}", response_model=Vehicle, tags=["Vehicles"])
 async def get_vehicle_by_license_plate(
@@ -349,7 +513,7 @@ async def get_vehicle_by_license_plate(
     
     Requires Bearer token in Authorization header with admin privileges.
     """
-    return VehicleService.get_vehicle_by_license_plate(license_plate, token)
+    return await run_in_db_executor(VehicleService.get_vehicle_by_license_plate, license_plate, token)
 
 @app.get("/vehicles/{user_name}", response_model=SessionResponse, tags=["Vehicles"])
 async def get_vehicles(
@@ -358,7 +522,7 @@ async def get_vehicles(
     """
     Acquire all vehicles from a user as an admin
     """
-    return VehicleService.get_all_vehicles (token, user_name)
+    return await run_in_db_executor(VehicleService.get_all_vehicles, token, user_name)
 
 @app.put("/vehicles/{vid}", tags=["Vehicles"])
 async def change_vehicle(
@@ -373,7 +537,7 @@ async def change_vehicle(
         vehicle: Vehicle data to update (license_plate, name)
         authorization: Session token for authentication
     """
-    return VehicleService.change_vehicle(
+    return await run_in_db_executor(VehicleService.change_vehicle,
         token,
         vid,
         vehicle
@@ -390,7 +554,7 @@ async def create_vehicle(
         vehicle_data: Dictionary containing vehicle information (name, license_plate)
         authorization: Session token for authentication
     """
-    return VehicleService.create_vehicle(token, vehicle_data)
+    return await run_in_db_executor(VehicleService.create_vehicle, token, vehicle_data)
 
 @app.delete("/vehicles/{vid}", tags=["Vehicles"])
 async def delete_vehicle(
@@ -403,7 +567,7 @@ async def delete_vehicle(
         vid: Vehicle ID to delete
         authorization: Session token for authentication
     """
-    return VehicleService.delete_vehicle(token, vid)
+    return await run_in_db_executor(VehicleService.delete_vehicle, token, vid)
 
 
 @app.get("/parking-lots", response_model=list[ParkingLotResponse])
@@ -414,7 +578,7 @@ async def list_parking_lots(
     
     Requires Authorization header with valid session token.
     """
-    return ParkingService.list_parking_lots(authorization)
+    return await run_in_db_executor(ParkingService.list_parking_lots, authorization)
 
 
 @app.get("/parking-lots/{lot_id}", response_model=ParkingLotResponse)
@@ -426,7 +590,7 @@ async def get_parking_lot(
     
     Requires Authorization header with valid session token.
     """
-    return ParkingService.get_parking_lot(lot_id, authorization)
+    return await run_in_db_executor(ParkingService.get_parking_lot, lot_id, authorization)
 
 
 @app.get("/parking-lots/{lot_id}/sessions", response_model=list[SessionResponse])
@@ -439,7 +603,7 @@ async def list_parking_sessions(
     Requires Authorization header with session token.
     Admins see all sessions; users see only their own.
     """
-    return ParkingService.list_parking_sessions(lot_id, authorization)
+    return await run_in_db_executor(ParkingService.list_parking_sessions, lot_id, authorization)
 
 
 @app.get("/parking-lots/{lot_id}/sessions/{session_id}", response_model=SessionResponse)
@@ -453,7 +617,7 @@ async def get_parking_session(
     Requires Authorization header with session token.
     Only Admins or the session owner can access.
     """
-    return ParkingService.get_parking_session(lot_id, session_id, authorization)
+    return await run_in_db_executor(ParkingService.get_parking_session, lot_id, session_id, authorization)
 
 @app.put("/parking-lots/{lot_id}/sessions/{session_id}", response_model=SessionResponse, tags=["Parking Lots"])
 async def update_parking_session(
@@ -463,7 +627,7 @@ async def update_parking_session(
     token: Optional[str] = Depends(get_token)
 ):
     """Update a parking session (Admin only)"""
-    return ParkingService.update_parking_session(lot_id, session_id, updates, token)
+    return await run_in_db_executor(ParkingService.update_parking_session, lot_id, session_id, updates, token)
 
 @app.delete("/parking-lots/{lot_id}", status_code=status.HTTP_200_OK)
 async def delete_parking_lot(
@@ -471,7 +635,7 @@ async def delete_parking_lot(
     authorization: Annotated[Optional[str], Header()] = None
 ):
     """Delete a parking lot (Admin only)."""
-    return ParkingService.delete_parking_lot(lot_id, authorization)
+    return await run_in_db_executor(ParkingService.delete_parking_lot, lot_id, authorization)
 
 
 @app.delete("/parking-lots/{lot_id}/sessions/{session_id}", status_code=status.HTTP_200_OK)
@@ -481,7 +645,7 @@ async def delete_parking_session(
     authorization: Annotated[Optional[str], Header()] = None
 ):
     """Delete a specific parking session (Admin only)."""
-    return ParkingService.delete_parking_session(lot_id, session_id, authorization)
+    return await run_in_db_executor(ParkingService.delete_parking_session, lot_id, session_id, authorization)
 
 
 @app.get("/reservations/{res_id}", response_model=ReservationOut, tags=["Reservations"]) 
@@ -491,17 +655,20 @@ async def get_reservation_by_id(
     """
     Acquire a reservation by its ID
     """
-    return ReservationService.get_reservation(res_id, token)      
+    return await run_in_db_executor(ReservationService.get_reservation, res_id, token)      
 
-@app.get("/reservations/{user_id}", tags=["Reservations"])
+@app.get("/users/{user_id}/reservations", tags=["Reservations"])
 async def list_reservations(
         user_id: str,
-        token: Optional[str] = Depends(get_token)
+        response: Response,
+        token: Optional[str] = Depends(get_token),
+        page: Optional[Page] = Depends(page_params)
     ):
-    """Get reservation details by reservation ID
+    """Get the reservations of a user, optionally as keyset pages or an NDJSON stream
     Requires Bearer token in Authorization header.
     """
-    return ReservationService.get_reservations_list(user_id, token)
+    rows = await run_in_db_executor(ReservationService.get_reservations_list, user_id, token, page)
+    return list_response(rows, page, response)
 
 @app.get("/reservations/{res_id}", tags=["Reservations"])
 async def get_reservations(
@@ -523,12 +690,27 @@ async def create_discount(
     
     """
     if discount.code :
-            disc = DiscountService.generate_discount_manual(token, discount)
+            disc = await run_in_db_executor(DiscountService.generate_discount_manual, token, discount)
             return disc
-    disc = DiscountService.generate_discount_automatic(token, discount)
+    disc = await run_in_db_executor(DiscountService.generate_discount_automatic, token, discount)
     return disc
 
 
+@app.post("/discounts/batch", response_model=DiscountBatchResult, tags=["Discounts"])
+async def create_discount_batch(
+    batch : DiscountBatch,
+    token: Optional[str] = Depends(get_token)):
+
+    """
+
+    Admin only 
+    Generates `count` discounts with the same terms and random codes in one go (for a campaign)
+    and returns their codes. 
+    
+    """
+    return await run_in_db_executor(DiscountService.generate_discount_batch, token, batch)
+
+
 @app.put("/discounts/edit/{id}", response_model=DiscountBase, tags=["Discounts"])
 async def edit_discount(
     id : int, 
@@ -542,7 +724,7 @@ async def edit_discount(
     Leave the values empty that are not to be changed 
     
     """
-    disc = DiscountService.edit_discount(token, id, discount)
+    disc = await run_in_db_executor(DiscountService.edit_discount, token, id, discount)
     return disc
     
 @app.delete("/discounts/remove/{id}", response_model=dict, tags=["Discounts"])
@@ -556,7 +738,7 @@ async def remove_discount(
     Delete a discount based on its ID 
     
     """
-    DiscountService.delete_discount(token, id)
+    await run_in_db_executor(DiscountService.delete_discount, token, id)
     return {"status": "Success", "Discount": id}
    
     
@@ -570,7 +752,7 @@ async def delete_reservation(
     
     Requires Bearer token in Authorization header.
     """
-    return ReservationService.delete_reservation(res_id, token)
+    return await run_in_db_executor(ReservationService.delete_reservation, res_id, token)
 
 if __name__ == "__main__":
     uvicorn.run("FastApiServer:app", host="127.0.0.1", port=8000, reload=True)
\ No newline at end of file
@@ -0,0 +1,124 @@
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+from fastapi import HTTPException
+from mysql.connector import IntegrityError, errorcode
+
+from models.parking_models import SessionStart
+from services.parking_service import ParkingService
+from storage_utils import save_parking_sessions
+
+
+class FakeSessions:
+    """parking_sessions with the UNIQUE active_plate index, checked and written under one lock"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.rows = []
+
+    def connect(self):
+        return FakeConn(self)
+
+
+class FakeConn:
+    def __init__(self, table):
+        self.table = table
+
+    def cursor(self):
+        return FakeCursor(self.table)
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class FakeCursor:
+    def __init__(self, table):
+        self.table = table
+        self.lastrowid = None
+
+    def execute(self, sql, params=()):
+        columns = [c.strip("`") for c in sql.split("(", 1)[1].split(")", 1)[0].split(", ")]
+        row = dict(zip(columns, params))
+        # Widen the window between the check and the write a thread would otherwise race through
+        time.sleep(0.001)
+        with self.table.lock:
+            active = [r for r in self.table.rows if r["stopped"] is None]
+            if row["stopped"] is None and any(r["licenseplate"] == row["licenseplate"] for r in active):
+                raise IntegrityError(
+                    msg=f"Duplicate entry '{row['licenseplate']}' for key 'parking_sessions.ux_parking_sessions_active_plate'",
+                    errno=errorcode.ER_DUP_ENTRY,
+                )
+            self.table.rows.append(row)
+            self.lastrowid = len(self.table.rows)
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def sessions():
+    table = FakeSessions()
+    with patch("storage_utils.get_db_connection", side_effect=table.connect), \
+            patch("services.parking_service.session_entered") as entered:
+        table.entered = entered
+        yield table
+
+
+def test_parallel_starts_for_one_plate_start_one_session(sessions):
+    user = {"username": "gate", "role": "ADMIN"}
+    start = threading.Barrier(25)
+    results = []
+
+    def gate_event():
+        start.wait()
+        try:
+            ParkingService.start_parking_session("1", SessionStart(licenseplate="AB-123-C"), "token")
+            results.append(200)
+        except HTTPException as e:
+            results.append(e.status_code)
+
+    with patch.object(ParkingService, "validate_session_token", return_value=user):
+        threads = [threading.Thread(target=gate_event) for _ in range(25)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+    assert results.count(200) == 1
+    assert results.count(409) == 24
+    assert len(sessions.rows) == 1
+    sessions.entered.assert_called_once_with("1")
+
+
+def test_other_plates_and_stopped_sessions_dont_block_a_start(sessions):
+    sessions.rows.append({"licenseplate": "AB-123-C", "stopped": "2025-01-01 10:00:00"})
+    assert save_parking_sessions.start_parking_sessions({"licenseplate": "AB-123-C", "stopped": None}) == 2
+    assert save_parking_sessions.start_parking_sessions({"licenseplate": "XY-999-Z", "stopped": None}) == 3
+    assert save_parking_sessions.start_parking_sessions({"licenseplate": "AB-123-C", "stopped": None}) is None
+
+
+def test_restart_within_the_same_second_is_refused_not_raised():
+    # stop + start in the same lot within one second collides on the natural key, not active_plate
+    error = IntegrityError(msg="Duplicate entry for key 'parking_sessions.ux_parking_sessions_natural'",
+                           errno=errorcode.ER_DUP_ENTRY)
+    with patch("storage_utils.create_data", side_effect=error):
+        assert save_parking_sessions.start_parking_sessions({"licenseplate": "AB-123-C", "stopped": None}) is None
+
+
+def test_other_duplicate_keys_still_raise():
+    error = IntegrityError(msg="Duplicate entry '7' for key 'parking_sessions.PRIMARY'",
+                           errno=errorcode.ER_DUP_ENTRY)
+    with patch("storage_utils.create_data", side_effect=error):
+        with pytest.raises(IntegrityError):
+            save_parking_sessions.start_parking_sessions({"licenseplate": "AB-123-C", "stopped": None})
+
+
+@patch("storage_utils.change_data")
+def test_changes_never_write_the_generated_column(mock_change):
+    save_parking_sessions.change_parking_sessions({"id": "1", "stopped": None, "active_plate": "AB-123-C"})
+    assert "active_plate" not in mock_change.call_args[0][1]
@@ -0,0 +1,54 @@
+import io
+import json
+
+from app_logging import configure_logging, get_logger, bind_context, fields, token_hint
+
+
+def capture(level="DEBUG", debug_rate=1.0, info_rate=1.0):
+    buf = io.StringIO()
+    configure_logging(level=level, debug_sample_rate=debug_rate, info_sample_rate=info_rate, stream=buf)
+    return buf
+
+
+def lines(buf):
+    return [json.loads(line) for line in buf.getvalue().splitlines()]
+
+
+def teardown_function():
+    configure_logging(level="INFO")
+
+
+def test_records_are_json_with_request_context():
+    buf = capture()
+    logger = get_logger("test")
+    with bind_context(request_id="req-1", path="/login"):
+        logger.info("login succeeded", extra=fields(username="user1"))
+    logger.info("outside request")
+
+    first, second = lines(buf)
+    assert first["msg"] == "login succeeded"
+    assert first["request_id"] == "req-1"
+    assert first["username"] == "user1"
+    assert first["logger"] == "mobypark.test"
+    assert "request_id" not in second
+
+
+def test_sampling_drops_debug_but_keeps_warnings():
+    buf = capture(debug_rate=0.0, info_rate=0.0)
+    logger = get_logger("test")
+    for _ in range(50):
+        logger.debug("noisy")
+        logger.info("access")
+    logger.warning("important")
+    assert [entry["msg"] for entry in lines(buf)] == ["important"]
+
+
+def test_level_filters_before_sampling():
+    buf = capture(level="WARNING")
+    get_logger("test").info("hidden")
+    assert lines(buf) == []
+
+
+def test_token_hint_hides_token():
+    assert token_hint("0123456789abcdef") == "01234567…"
+    assert token_hint(None) is None
@@ -0,0 +1,190 @@
+import threading
+import time
+import pytest
+
+from db_pool import ConnectionPool, PoolTimeout
+
+
+# ------------------------
+# Fake connection used as pool factory output
+# ------------------------
+class FakeConnection:
+    def __init__(self):
+        self.closed = False
+        self.in_transaction = False
+        self.rollbacks = 0
+        self.ping_ok = True
+        self.cursors = []
+
+    def cursor(self, prepared=False):
+        cursor = FakeCursor(prepared)
+        self.cursors.append(cursor)
+        return cursor
+
+    def ping(self, reconnect=False):
+        if not self.ping_ok:
+            raise Exception("server has gone away")
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.in_transaction = False
+
+    def close(self):
+        self.closed = True
+
+
+class FakeCursor:
+    def __init__(self, prepared):
+        self.prepared = prepared
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def make_pool(**kwargs):
+    created = []
+
+    def factory():
+        c = FakeConnection()
+        created.append(c)
+        return c
+
+    return ConnectionPool(factory=factory, **kwargs), created
+
+
+# ------------------------
+# Reuse and limits
+# ------------------------
+def test_connection_is_reused_after_close():
+    pool, created = make_pool(size=2)
+    conn = pool.acquire()
+    conn.close()
+    conn2 = pool.acquire()
+    conn2.close()
+    assert len(created) == 1
+    assert pool.metrics()["checkouts"] == 2
+
+
+def test_double_close_releases_once():
+    pool, _ = make_pool(size=1)
+    conn = pool.acquire()
+    conn.close()
+    conn.close()
+    assert pool.metrics()["idle"] == 1
+    assert pool.metrics()["in_use"] == 0
+
+
+def test_checkout_timeout_when_exhausted():
+    pool, _ = make_pool(size=1, timeout=0.05)
+    conn = pool.acquire()
+    with pytest.raises(PoolTimeout):
+        pool.acquire()
+    assert pool.metrics()["timeouts"] == 1
+    conn.close()
+
+
+def test_waiter_gets_released_connection():
+    pool, created = make_pool(size=1, timeout=2)
+    conn = pool.acquire()
+    got = []
+
+    def worker():
+        with pool.connection() as c:
+            got.append(c)
+
+    t = threading.Thread(target=worker)
+    t.start()
+    time.sleep(0.05)
+    assert pool.metrics()["waiters"] == 1
+    conn.close()
+    t.join()
+    assert len(got) == 1
+    assert len(created) == 1
+
+
+# ------------------------
+# Health checks and eviction
+# ------------------------
+def test_open_transaction_is_rolled_back_on_release():
+    pool, created = make_pool(size=1)
+    conn = pool.acquire()
+    created[0].in_transaction = True
+    conn.close()
+    assert created[0].rollbacks == 1
+
+
+def test_failed_ping_replaces_connection():
+    pool, created = make_pool(size=1, ping_interval=0)
+    conn = pool.acquire()
+    created[0].ping_ok = False
+    conn.close()
+    pool.acquire().close()
+    assert len(created) == 2
+    assert created[0].closed
+    assert pool.metrics()["failed_health_checks"] == 1
+    assert pool.metrics()["open"] == 1
+
+
+def test_idle_connections_are_evicted():
+    pool, created = make_pool(size=2, idle_timeout=0)
+    pool.acquire().close()
+    time.sleep(0.01)
+    pool.acquire().close()
+    assert created[0].closed
+    assert pool.metrics()["evicted"] == 1
+
+
+def test_factory_error_frees_slot():
+    def factory():
+        raise ConnectionError("refused")
+
+    pool = ConnectionPool(size=1, factory=factory)
+    with pytest.raises(ConnectionError):
+        pool.acquire()
+    assert pool.metrics()["open"] == 0
+    assert pool.metrics()["in_use"] == 0
+
+
+# ------------------------
+# Prepared statements
+# ------------------------
+def test_prepared_statements_are_kept_across_checkouts():
+    pool, created = make_pool(size=1)
+    with pool.connection() as conn:
+        first = conn.statement("SELECT 1")
+    with pool.connection() as conn:
+        assert conn.statement("SELECT 1") is first
+        assert conn.statement("SELECT 2") is not first
+    assert first.prepared
+    assert len(created[0].cursors) == 2
+    metrics = pool.metrics()
+    assert (metrics["prepared_statements"], metrics["statements_prepared"], metrics["statement_cache_hits"]) == (2, 2, 1)
+
+
+def test_least_recently_used_statement_is_closed():
+    pool, created = make_pool(size=1, statement_cache_size=2)
+    with pool.connection() as conn:
+        one, two = conn.statement("SELECT 1"), conn.statement("SELECT 2")
+        conn.statement("SELECT 1")
+        conn.statement("SELECT 3")
+    assert two.closed and not one.closed
+    assert pool.metrics()["prepared_statements"] == 2
+
+
+def test_replaced_connection_starts_without_statements():
+    pool, created = make_pool(size=1, ping_interval=0)
+    with pool.connection() as conn:
+        conn.statement("SELECT 1")
+    created[0].ping_ok = False
+    with pool.connection() as conn:
+        conn.statement("SELECT 1")
+    assert len(created[1].cursors) == 1
+    assert pool.metrics()["prepared_statements"] == 1
+
+
+def test_without_a_statement_cache_queries_go_out_as_text():
+    pool, created = make_pool(size=1, statement_cache_size=0)
+    with pool.connection() as conn:
+        assert not conn.statement("SELECT 1").prepared
+    assert pool.metrics()["prepared_statements"] == 0
@@ -0,0 +1,102 @@
+from unittest.mock import patch
+
+import pytest
+from fastapi import HTTPException
+from mysql.connector import IntegrityError, errorcode
+
+from models.discount_model import DiscountBatch, DiscountCreate
+from services.discount_service import DiscountService
+from services.validation_service import ValidationService
+from storage_utils import save_discount, unit_of_work
+
+
+def taken(code="abcdefghij", key="discounts.ux_discounts_code"):
+    return IntegrityError(msg=f"Duplicate entry '{code}' for key '{key}'", errno=errorcode.ER_DUP_ENTRY)
+
+
+@pytest.fixture
+def admin():
+    # check_valid_admin answers True for non-admins (see validation_service), so patch the answer
+    with patch.object(ValidationService, "validate_session_token", return_value={"role": "ADMIN"}), \
+            patch.object(ValidationService, "check_valid_admin", return_value=True):
+        yield
+
+
+# ------------------------
+# Storage
+# ------------------------
+def test_a_taken_code_is_reported_not_raised():
+    with patch("storage_utils.create_data", side_effect=taken()):
+        assert save_discount.insert_discount({"code": "abcdefghij"}) is None
+    with patch("storage_utils.create_data", side_effect=taken(key="PRIMARY")):
+        with pytest.raises(IntegrityError):
+            save_discount.insert_discount({"code": "abcdefghij"})
+
+
+def test_a_batch_with_a_taken_code_is_retried_with_new_codes():
+    codes = iter(["A", "B", "C", "D", "E"])
+    with patch("storage_utils.create_many_data", side_effect=[taken("B"), [7, 8]]) as mock_insert:
+        rows = save_discount.insert_with_codes([{"percentage": 10}] * 2, lambda: next(codes))
+
+    assert mock_insert.call_count == 2
+    assert sorted(row["code"] for row in rows) == ["C", "D"]
+    assert [row["id"] for row in rows] == ["7", "8"]
+    assert all(row["percentage"] == 10 for row in rows)
+
+
+def test_code_batches_refuse_to_run_inside_a_unit_of_work():
+    with patch("storage_utils.create_many_data") as mock_insert:
+        with pytest.raises(RuntimeError):
+            with unit_of_work():
+                save_discount.insert_with_codes([{}], lambda: "A")
+    mock_insert.assert_not_called()
+
+
+def test_codes_within_a_batch_are_distinct():
+    codes = iter(["A", "A", "B", "B", "C"])
+    with patch("storage_utils.create_many_data", return_value=[1, 2, 3]) as mock_insert:
+        save_discount.insert_with_codes([{}] * 3, lambda: next(codes))
+    assert sorted(row["code"] for row in mock_insert.call_args[0][1]) == ["A", "B", "C"]
+
+
+# ------------------------
+# Service
+# ------------------------
+@patch("services.discount_service.save_discount")
+def test_generated_code_is_not_looked_up_first(mock_save, admin):
+    mock_save.insert_discount.side_effect = [None, None, 12]
+    with patch("storage_utils.get_item_db") as mock_get:
+        discount = DiscountService.generate_discount_automatic("token", DiscountCreate(percentage=10))
+
+    mock_get.assert_not_called()
+    assert mock_save.insert_discount.call_count == 3
+    assert len(discount["code"]) == 10 and discount["code"].isalpha()
+
+
+@patch("services.discount_service.save_discount")
+def test_manual_code_that_is_taken_conflicts(mock_save, admin):
+    mock_save.insert_discount.return_value = None
+    with pytest.raises(HTTPException) as exc:
+        DiscountService.generate_discount_manual("token", DiscountCreate(code="SUMMER", percentage=10))
+    assert exc.value.status_code == 409
+
+    with pytest.raises(HTTPException) as exc:
+        DiscountService.generate_discount_manual("token", DiscountCreate(code="SUMMER25"))
+    assert exc.value.status_code == 400
+
+
+@patch("services.discount_service.save_discount")
+def test_batch_generates_count_codes_in_one_call(mock_save, admin):
+    mock_save.insert_with_codes.side_effect = lambda rows, new_code: [dict(row, code=new_code()) for row in rows]
+    result = DiscountService.generate_discount_batch("token", DiscountBatch(count=500, percentage=15, lot_id=2))
+
+    mock_save.insert_with_codes.assert_called_once()
+    rows = mock_save.insert_with_codes.call_args[0][0]
+    assert len(rows) == 500 and rows[0]["percentage"] == 15 and rows[0]["lot_id"] == 2
+    assert result["count"] == 500 and len(result["codes"]) == 500
+
+
+def test_batch_size_is_bounded(admin):
+    with pytest.raises(HTTPException) as exc:
+        DiscountService.generate_discount_batch("token", DiscountBatch(count=0))
+    assert exc.value.status_code == 400
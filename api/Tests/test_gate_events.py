@@ -0,0 +1,239 @@
+import threading
+import time
+from datetime import datetime
+from unittest.mock import MagicMock, patch
+
+import mysql.connector
+import pytest
+from fastapi.testclient import TestClient
+
+import gate_events
+from FastApiServer import app
+from gate_events import GateEventQueue, QueueFull, plan, write_events
+from models.parking_models import GateEvent
+
+client = TestClient(app)
+
+
+def at(minute):
+    return datetime(2025, 3, 1, 8, minute)
+
+
+def event(plate, direction, minute, lot="1"):
+    return GateEvent(lot_id=lot, licenseplate=plate, direction=direction, timestamp=at(minute))
+
+
+def key(plate, direction, minute, lot="1"):
+    return lot, plate, direction, at(minute)
+
+
+# ------------------------
+# Coalescing per plate
+# ------------------------
+def test_entry_and_exit_in_one_batch_become_one_closed_session():
+    closes, inserts, ignored = plan([key("AA", "out", 30), key("AA", "in", 0)], {})
+    assert closes == []
+    assert inserts == [("1", "AA", at(0), at(30))]
+    assert ignored == 0
+
+
+def test_repeated_entry_reads_start_one_session():
+    closes, inserts, ignored = plan([key("AA", "in", 0), key("AA", "in", 1), key("AA", "in", 2)], {})
+    assert inserts == [("1", "AA", at(0), None)]
+    assert ignored == 2
+
+
+def test_exit_ends_the_active_session():
+    active = {"AA": (41, "2", at(0)), "BB": (42, "1", at(20))}
+    closes, inserts, ignored = plan([key("AA", "out", 45, lot="2"), key("BB", "out", 10), key("CC", "out", 5)], active)
+    assert closes == [(41, "2", at(0), at(45))]
+    assert inserts == []
+    # BB's exit is older than its entry and CC has no session
+    assert ignored == 2
+
+
+# ------------------------
+# Queue
+# ------------------------
+class Writes:
+    """A write function that records batches and can be held or made to fail"""
+
+    def __init__(self, failures=0):
+        self.batches = []
+        self.failures = failures
+        self.release = threading.Event()
+        self.release.set()
+
+    def __call__(self, batch):
+        self.release.wait(5)
+        self.batches.append(list(batch))
+        if self.failures:
+            self.failures -= 1
+            raise mysql.connector.Error(msg="Deadlock found", errno=1213)
+
+
+@pytest.fixture
+def queue():
+    queues = []
+
+    def make(writes, **kwargs):
+        q = GateEventQueue(writes, linger=0.01, retry_delay=0, **kwargs)
+        queues.append(q)
+        return q
+    yield make
+    for q in queues:
+        q.close(1)
+
+
+def test_duplicates_are_counted_not_applied(queue):
+    writes = Writes()
+    q = queue(writes)
+    first = q.submit([event("AA", "in", 0), event("AA", "in", 0), event("BB", "in", 1)]).result(2)
+    assert first == {"received": 3, "duplicates": 1, "applied": 2}
+
+    # A camera sending the batch again after it was stored
+    again = q.submit([event("AA", "in", 0), event("BB", "in", 1)]).result(2)
+    assert again == {"received": 2, "duplicates": 2, "applied": 0}
+    assert sum(len(b) for b in writes.batches) == 2
+
+
+def test_concurrent_requests_share_a_batch(queue):
+    writes = Writes()
+    q = queue(writes)
+    writes.release.clear()
+    held = q.submit([event("AA", "in", 0)])
+    while q.metrics()["queued"]:
+        time.sleep(0.001)
+    # While the first batch is written, the next requests queue up behind it
+    results = [q.submit([event(f"P{i}", "in", 1)]) for i in range(20)]
+    writes.release.set()
+    held.result(2)
+    assert all(r.result(2)["applied"] == 1 for r in results)
+    assert len(writes.batches) == 2
+    assert len(writes.batches[1]) == 20
+
+
+def test_a_repeated_event_waits_for_the_queued_one(queue):
+    writes = Writes()
+    q = queue(writes)
+    writes.release.clear()
+    first = q.submit([event("AA", "in", 0)])
+    retry = q.submit([event("AA", "in", 0)])
+    assert not retry.done()
+    writes.release.set()
+    assert first.result(2)["applied"] == 1
+    assert retry.result(2) == {"received": 1, "duplicates": 1, "applied": 0}
+
+
+def test_full_queue_refuses_the_whole_request(queue):
+    writes = Writes()
+    q = queue(writes, max_pending=3)
+    writes.release.clear()
+    q.submit([event("AA", "in", 0), event("BB", "in", 0)])
+    with pytest.raises(QueueFull):
+        q.submit([event("CC", "in", 0), event("DD", "in", 0)])
+    assert q.metrics()["rejected"] == 2
+    assert q.metrics()["pending"] == 2
+    writes.release.set()
+
+
+def test_failed_batches_are_retried(queue):
+    writes = Writes(failures=2)
+    q = queue(writes)
+    assert q.submit([event("AA", "in", 0)]).result(2)["applied"] == 1
+    assert len(writes.batches) == 3
+
+
+def test_events_that_could_not_be_stored_are_accepted_again(queue):
+    writes = Writes(failures=2)
+    q = queue(writes, max_attempts=2)
+    with pytest.raises(mysql.connector.Error):
+        q.submit([event("AA", "in", 0)]).result(2)
+    # Not remembered as applied: the camera's retry goes through
+    assert q.submit([event("AA", "in", 0)]).result(2)["applied"] == 1
+
+
+# ------------------------
+# Writing
+# ------------------------
+@patch("gate_events.get_parking_lot_row", return_value={"tariff": 2.0, "daytariff": 20.0})
+def test_a_batch_is_a_fixed_number_of_statements(mock_lot):
+    conn = MagicMock()
+    cursor = conn.cursor.return_value
+    # Active sessions of the batch's plates, then the lots of the sessions it opened
+    cursor.fetchall.side_effect = [[(41, "AA", 1, at(0))], [(2, 1)]]
+    events = [key("AA", "out", 30), key("BB", "in", 0), key("BB", "out", 45), key("CC", "in", 5, lot="2")]
+
+    closes, inserts, ignored = gate_events.apply_batch(conn, events)
+
+    statements = [" ".join(c[0][0].split()) for c in cursor.execute.call_args_list]
+    assert [s.split()[0] for s in statements] == ["SELECT", "UPDATE", "INSERT", "SELECT", "UPDATE"]
+    assert statements[0].endswith("FOR UPDATE")
+    assert closes == [(41, "1", at(0), at(30))]
+    assert inserts == [("1", "BB", at(0), at(45)), ("2", "CC", at(5), None)]
+    # AA left lot 1, BB came and went, CC is in lot 2
+    assert cursor.execute.call_args_list[4][0][1] == ["1", -1, "2", 1, "1", "2"]
+    conn.commit.assert_called_once()
+
+
+def test_rejected_plates_are_quarantined_and_the_rest_applied():
+    conn = MagicMock()
+    applied = []
+
+    def apply(conn, events):
+        if len({e[1] for e in events}) > 1 or events[0][1] == "BAD":
+            raise mysql.connector.Error(msg="Cannot add or update a child row", errno=1452)
+        applied.append(events)
+
+    events = [key("AA", "in", 0), key("BAD", "in", 0, lot="999")]
+    with patch("gate_events.get_db_connection", return_value=conn), \
+            patch("gate_events.apply_batch", side_effect=apply), \
+            patch("gate_events.quarantine") as mock_quarantine:
+        write_events(events)
+
+    assert applied == [[key("AA", "in", 0)]]
+    stage, _, rows = mock_quarantine.call_args[0][1:]
+    assert stage == "gate_events"
+    assert [row[1] for row in rows] == ["BAD"]
+    conn.commit.assert_called_once()
+
+
+def test_transient_errors_are_left_to_the_queue():
+    with patch("gate_events.get_db_connection"), \
+            patch("gate_events.apply_batch", side_effect=mysql.connector.Error(msg="Deadlock", errno=1213)), \
+            patch("gate_events.quarantine") as mock_quarantine:
+        with pytest.raises(mysql.connector.Error):
+            write_events([key("AA", "in", 0)])
+    mock_quarantine.assert_not_called()
+
+
+# ------------------------
+# Endpoint
+# ------------------------
+payload = [{"lot_id": "1", "licenseplate": "AA", "direction": "in", "timestamp": "2025-03-01 08:00:00"}]
+system = {"Authorization": "Bearer system-token"}
+
+
+def stored(result):
+    future = gate_events.Future()
+    future.set_result(result)
+    return future
+
+
+@patch("FastApiServer.submit_gate_events", return_value=stored({"received": 1, "duplicates": 0, "applied": 1}))
+def test_gate_events_endpoint_answers_once_stored(mock_submit):
+    resp = client.post("/gate-events", json=payload, headers=system)
+    assert resp.status_code == 200
+    assert resp.json() == {"received": 1, "duplicates": 0, "applied": 1}
+    assert mock_submit.call_args[0][0][0].timestamp == at(0)
+
+
+@patch("FastApiServer.submit_gate_events", side_effect=QueueFull("full"))
+def test_gate_events_endpoint_pushes_back_when_full(mock_submit):
+    resp = client.post("/gate-events", json=payload, headers=system)
+    assert resp.status_code == 503
+    assert resp.headers["Retry-After"] == "1"
+
+
+def test_gate_events_endpoint_requires_a_session():
+    assert client.post("/gate-events", json=payload).status_code == 401
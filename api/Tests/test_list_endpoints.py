@@ -0,0 +1,125 @@
+import json
+from datetime import datetime
+from decimal import Decimal
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+from FastApiServer import app
+from storage_utils import Page
+
+client = TestClient(app)
+HEADERS = {"Authorization": "Bearer testtoken"}
+
+PAYMENTS = [
+    {"id": str(i), "transaction": f"tx{i}", "amount": Decimal("2.50"), "initiator": "alice",
+     "created_at": datetime(2025, 1, i, 9, 0), "completed": None, "hash": "h"}
+    for i in range(1, 4)
+]
+
+
+@patch("FastApiServer.PaymentService.get_session", return_value={"username": "alice", "role": "USER"})
+@patch("FastApiServer.PaymentService.get_user_payments")
+def test_payments_page_sets_next_cursor(mock_payments, _):
+    mock_payments.return_value = PAYMENTS[:2]
+    resp = client.get("/payments?limit=2", headers=HEADERS)
+
+    assert resp.status_code == 200
+    assert [p["transaction"] for p in resp.json()] == ["tx1", "tx2"]
+    assert resp.headers["X-Next-Cursor"] == "2"
+    mock_payments.assert_called_once_with("alice", Page(None, 2, False))
+
+    mock_payments.return_value = PAYMENTS[2:]
+    resp = client.get("/payments?limit=2&after=2", headers=HEADERS)
+    assert "X-Next-Cursor" not in resp.headers
+    assert mock_payments.call_args.args == ("alice", Page("2", 2, False))
+
+
+@patch("FastApiServer.PaymentService.get_session", return_value={"username": "alice", "role": "USER"})
+@patch("FastApiServer.PaymentService.get_user_payments")
+def test_payments_without_paging_return_whole_list(mock_payments, _):
+    mock_payments.return_value = PAYMENTS
+    resp = client.get("/payments", headers=HEADERS)
+    assert len(resp.json()) == 3
+    mock_payments.assert_called_once_with("alice", None)
+
+
+@patch("FastApiServer.PaymentService.get_session", return_value={"username": "alice", "role": "USER"})
+@patch("FastApiServer.PaymentService.get_user_payments")
+def test_payments_stream_as_ndjson(mock_payments, _):
+    mock_payments.return_value = iter(PAYMENTS)
+    resp = client.get("/payments?stream=true", headers=HEADERS)
+
+    assert resp.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in resp.text.splitlines()]
+    assert [p["transaction"] for p in lines] == ["tx1", "tx2", "tx3"]
+    assert lines[0]["created_at"] == "2025-01-01 09:00:00" and lines[0]["amount"] == 2.5
+
+
+@patch("services.parking_service.ParkingService.list_parking_lots")
+def test_parking_lots_stream_raw_rows(mock_lots):
+    mock_lots.return_value = iter([{"id": "1", "tariff": Decimal("2.5"), "created_at": datetime(2024, 5, 1)}])
+    resp = client.get("/parking-lots?stream=true", headers=HEADERS)
+    assert json.loads(resp.text) == {"id": "1", "tariff": 2.5, "created_at": "2024-05-01 00:00:00"}
+
+
+def test_page_size_is_bounded():
+    resp = client.get("/parking-lots?limit=100000", headers=HEADERS)
+    assert resp.status_code == 422
+
+
+@patch("FastApiServer.VehicleService.get_vehicle_history")
+def test_vehicle_history_page_and_range(mock_history):
+    mock_history.return_value = [
+        {"id": "9", "licenseplate": "AB-12-CD", "started": datetime(2025, 2, 1, 8, 0), "stopped": None, "user": "alice"}
+    ]
+    resp = client.get("/vehicles/1/history?limit=1&since=2025-01-01T00:00:00%2B01:00", headers=HEADERS)
+
+    assert resp.status_code == 200
+    assert resp.json()[0]["started"] == "2025-02-01 08:00:00"
+    assert resp.headers["X-Next-Cursor"] == "2025-02-01 08:00:00,9"
+    # time zones are dropped like everywhere else: DATETIME columns hold wall-clock time
+    assert mock_history.call_args.args[3:] == (datetime(2025, 1, 1), None)
+
+
+class FakeReservations:
+    """Runs the keyset query of list_rows over in-memory reservation rows"""
+    columns = ("id", "user_id", "parking_lot_id", "vehicle_id", "start_time", "end_time")
+
+    def __init__(self, count):
+        self.rows = [(i, 7, 1, 9, datetime(2025, 3, i, 8, 0), datetime(2025, 3, i, 10, 0)) for i in range(1, count + 1)]
+        self.rows.append((count + 1, 8, 1, 9, datetime(2025, 3, 1, 8, 0), datetime(2025, 3, 1, 10, 0)))
+
+    def cursor(self, **kwargs):
+        return self
+
+    def execute(self, sql, params):
+        user_id, rest = params[0], list(params[1:])
+        after = int(rest.pop(0)) if "`id` > %s" in sql else 0
+        limit = rest.pop(0) if "LIMIT" in sql else None
+        self.result = [r for r in self.rows if str(r[1]) == user_id and r[0] > after][:limit]
+        self.column_names = self.columns
+
+    def fetchall(self):
+        return self.result
+
+    def close(self):
+        pass
+
+
+@patch("services.reservation_service.ValidationService.validate_session_token", return_value={"id": "7", "role": "USER"})
+def test_user_reservations_page_through_keyset_pages(_):
+    db = FakeReservations(5)
+    seen, after = [], None
+    with patch("storage_utils.get_db_connection", return_value=db):
+        for _ in range(5):
+            resp = client.get("/users/7/reservations", params={"limit": 2, "after": after} if after else {"limit": 2},
+                              headers=HEADERS)
+            assert resp.status_code == 200
+            seen += [r["id"] for r in resp.json()]
+            after = resp.headers.get("X-Next-Cursor")
+            if after is None:
+                break
+
+    # another user's reservation never shows up, and the last (short) page ends the paging
+    assert seen == ["1", "2", "3", "4", "5"]
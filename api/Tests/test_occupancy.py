@@ -0,0 +1,191 @@
+import re
+import threading
+from datetime import datetime, timedelta
+
+from occupancy import OccupancyCounters, REFRESH_OVERLAP
+
+
+class FakeLots:
+    """The parking_lots counters, with the statements occupancy.py runs applied under one lock"""
+
+    def __init__(self, **capacities):
+        self.lock = threading.Lock()
+        self.clock = datetime(2025, 1, 1, 8, 0)
+        self.rows = {lot_id: {"capacity": c, "reserved": 0, "occupied": 0, "occupancy_changed_at": None}
+                     for lot_id, c in capacities.items()}
+        self.queries = []
+
+    def tick(self):
+        self.clock += timedelta(milliseconds=1)
+        return self.clock
+
+    def connect(self):
+        return FakeConn(self)
+
+
+class FakeConn:
+    def __init__(self, lots):
+        self.lots = lots
+
+    def cursor(self):
+        return FakeCursor(self.lots)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class FakeCursor:
+    def __init__(self, lots):
+        self.lots = lots
+        self.rowcount = 0
+        self.result = []
+
+    def execute(self, sql, params=()):
+        sql = " ".join(sql.split())
+        self.lots.queries.append((sql, params))
+        with self.lots.lock:
+            if sql.startswith("UPDATE"):
+                column, sign = re.search(r"SET (\w+) = \w+ ([+-]) 1", sql).groups()
+                guard = sql.split(" AND ", 1)[1]
+                row = self.lots.rows.get(str(params[0]))
+                self.rowcount = 0
+                if row and eval(guard.replace("TRUE", "True"), {}, dict(row)):
+                    row[column] += 1 if sign == "+" else -1
+                    row["occupancy_changed_at"] = self.lots.tick()
+                    self.rowcount = 1
+                return
+            rows = self.lots.rows.items()
+            if "WHERE id = %s" in sql:
+                rows = [(k, v) for k, v in rows if k == str(params[0])]
+            elif "occupancy_changed_at IS NOT NULL" in sql:
+                rows = [(k, v) for k, v in rows if v["occupancy_changed_at"]]
+            elif "occupancy_changed_at >= %s" in sql:
+                rows = [(k, v) for k, v in rows if v["occupancy_changed_at"] and v["occupancy_changed_at"] >= params[0]]
+            self.result = [(k, v["capacity"], v["reserved"], v["occupied"], v["occupancy_changed_at"]) for k, v in rows]
+
+    def fetchone(self):
+        return self.result[0] if self.result else None
+
+    def fetchall(self):
+        return list(self.result)
+
+    def close(self):
+        pass
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def counters(lots, clock=None):
+    return OccupancyCounters(lots.connect, refresh_interval=1.0, full_refresh_interval=60.0, clock=clock or Clock())
+
+
+def test_reservations_stop_at_capacity_including_active_sessions():
+    lots = FakeLots(**{"1": 3})
+    occ = counters(lots)
+    assert occ.session_entered("1")
+    assert occ.reserve_spot("1") and occ.reserve_spot("1")
+    assert not occ.reserve_spot("1")
+    assert occ.get("1") == {"lot_id": "1", "capacity": 3, "reserved": 2, "occupied": 1, "available": 0,
+                            "updated_at": lots.rows["1"]["occupancy_changed_at"]}
+
+
+def test_counters_never_go_negative():
+    lots = FakeLots(**{"1": 3})
+    occ = counters(lots)
+    assert not occ.release_spot("1")
+    assert not occ.session_left("1")
+    assert lots.rows["1"]["reserved"] == 0 and lots.rows["1"]["occupied"] == 0
+
+
+def test_concurrent_reservations_never_overbook():
+    lots = FakeLots(**{"1": 10})
+    occ = counters(lots)
+    results = []
+    start = threading.Barrier(40)
+
+    def reserve():
+        start.wait()
+        results.append(occ.reserve_spot("1"))
+
+    threads = [threading.Thread(target=reserve) for _ in range(40)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert results.count(True) == 10
+    assert lots.rows["1"]["reserved"] == 10
+    assert occ.get("1")["available"] == 0
+
+
+def test_snapshot_refreshes_incrementally_once_per_interval():
+    lots = FakeLots(**{"1": 10, "2": 10})
+    clock = Clock()
+    occ = counters(lots, clock)
+    occ.get("1")
+    assert lots.queries[-1][0].endswith("FROM parking_lots")  # first read loads everything
+
+    # Another worker lets a car in
+    other = counters(lots)
+    other.session_entered("2")
+    lots.queries.clear()
+
+    assert occ.get("2")["occupied"] == 0  # within the interval: no query, previous snapshot
+    assert lots.queries == []
+
+    clock.now = 1.5
+    assert occ.get("2")["occupied"] == 1
+    [(sql, params)] = lots.queries
+    assert "WHERE occupancy_changed_at" in sql  # only changed rows
+
+    other.session_entered("2")
+    clock.now = 3.0
+    assert occ.get("2")["occupied"] == 2
+    assert lots.queries[-1][1] == (lots.rows["2"]["occupancy_changed_at"] - timedelta(milliseconds=1) - REFRESH_OVERLAP,)
+
+
+def test_own_writes_are_visible_immediately():
+    lots = FakeLots(**{"1": 10})
+    occ = counters(lots)
+    occ.get("1")
+    occ.reserve_spot("1")
+    lots.queries.clear()
+    assert occ.get("1")["reserved"] == 1
+    assert lots.queries == []
+
+
+def test_unknown_lot_is_looked_up_once_then_none():
+    lots = FakeLots(**{"1": 10})
+    occ = counters(lots)
+    occ.get("1")
+    lots.rows["7"] = {"capacity": 4, "reserved": 0, "occupied": 0, "occupancy_changed_at": None}
+    assert occ.get("7")["capacity"] == 4
+    assert occ.get("99") is None
+
+
+def test_unknown_lot_is_not_queried_again_until_the_next_refresh():
+    lots = FakeLots(**{"1": 10})
+    clock = Clock()
+    occ = counters(lots, clock)
+    occ.get("1")
+    assert occ.get("99") is None
+    lots.queries.clear()
+    assert occ.get("99") is None
+    assert lots.queries == []
+
+    # Created in the meantime: found once the snapshot refreshes
+    lots.rows["99"] = {"capacity": 4, "reserved": 0, "occupied": 0, "occupancy_changed_at": None}
+    clock.now = 1.5
+    assert occ.get("99")["capacity"] == 4
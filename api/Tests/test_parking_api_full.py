@@ -170,32 +170,38 @@ def test_admin_update_session(mock_save, mock_get, mock_validate):
 
 @patch("services.parking_service.get_item_db", return_value=[])
 @patch("services.parking_service.save_parking_sessions")
-def test_auto_start_parking(mock_save, mock_get):
+@patch("services.parking_service.session_entered")
+def test_auto_start_parking(mock_entered, mock_save, mock_get):
     from services.parking_service import ParkingService
     licenseplate = "AUTO123"
     result = ParkingService.auto_start_parking("1", licenseplate)
     assert result.message == "Session started successfully"
     assert result.licenseplate == licenseplate
+    mock_entered.assert_called_once_with("1")
 
 @patch("services.parking_service.get_item_db", return_value=[
-    {"id":"1","licenseplate": "AUTO123", "started": "2025-12-09 10:00:00", "stopped": 'None', "user": "system"}
+    {"id":"1","licenseplate": "AUTO123", "started": "2025-12-09 10:00:00", "stopped": None, "user": "system"}
 ])
+@patch("services.parking_service.get_parking_lot_row", return_value=None)
 @patch("services.parking_service.save_parking_sessions")
-def test_auto_stop_parking(mock_save, mock_get):
+@patch("services.parking_service.session_left")
+def test_auto_stop_parking(mock_left, mock_save, mock_lot, mock_get):
     from services.parking_service import ParkingService
     licenseplate = "AUTO123"
     result = ParkingService.auto_stop_parking("1", licenseplate)
     assert result.message == "Session stopped successfully"
     assert result.licenseplate == licenseplate
+    mock_left.assert_called_once_with("1")
 
-@patch("services.parking_service.get_item_db", return_value=[
-    {"id":"1","licenseplate": "AUTO123", "started": "2025-12-09 10:00:00", "stopped": None, "user": "system"}
-])
-def test_auto_start_existing_session_raises(mock_get, licenseplate):
+@patch("services.parking_service.save_parking_sessions")
+@patch("services.parking_service.session_entered")
+def test_auto_start_existing_session_raises(mock_entered, mock_save, licenseplate):
     from services.parking_service import ParkingService
+    mock_save.start_parking_sessions.return_value = None  # the active_plate index refused the insert
     with pytest.raises(Exception) as exc:
         ParkingService.auto_start_parking("1", licenseplate)
     assert "Cannot start a session when another session for this license plate is already active" in str(exc.value)
+    mock_entered.assert_not_called()
 
 @patch("services.parking_service.get_item_db", return_value=[])
 def test_auto_stop_nonexistent_session_raises(mock_get, licenseplate):
@@ -229,6 +235,15 @@ def test_admin_permissions(mock_save_lot, mock_save_sess, mock_get_session, auth
         assert resp.status_code == 200
         assert resp.json()["detail"] == detail
 
+@pytest.mark.parametrize("url", ["/metrics/db-pool", "/metrics/cache", "/metrics/gate-events"])
+@patch("services.parking_service.get_session")
+def test_metrics_are_admin_only(mock_get_session, url, auth_header):
+    assert client.get(url).status_code == 401
+    mock_get_session.return_value = mock_normal_user
+    assert client.get(url, headers=auth_header()).status_code == 403
+    mock_get_session.return_value = mock_admin_user
+    assert client.get(url, headers=auth_header()).status_code == 200
+
 @patch("services.parking_service.ParkingService.validate_session_token")
 def test_normal_user_cannot_update_lot(mock_validate):
     # Mock normale user
@@ -254,8 +269,10 @@ def test_normal_user_cannot_update_lot(mock_validate):
 ])
 @patch("services.parking_service.ParkingService.validate_session_token")
 @patch("services.parking_service.get_item_db")
-def test_session_errors(mock_get, mock_validate, method, session_data, session_obj, expected_msg):
+@patch("services.parking_service.save_parking_sessions")
+def test_session_errors(mock_save, mock_get, mock_validate, method, session_data, session_obj, expected_msg):
     mock_validate.return_value = mock_normal_user
+    mock_save.start_parking_sessions.return_value = None
     # Flatten dict session_data values to list for get_item_db return
     vals = list(session_data.values()) if isinstance(session_data, dict) else session_data
     mock_get.return_value = vals
@@ -267,9 +284,9 @@ def test_session_errors(mock_get, mock_validate, method, session_data, session_o
             getattr(ParkingService, method)("1", session_obj, token="token")
     assert expected_msg in str(exc.value)
 
-@patch("services.parking_service.get_item_db")
+@patch("services.parking_service.get_parking_lot_row")
 def test_get_nonexistent_lot(mock_get):
-    mock_get.return_value = []
+    mock_get.return_value = None
     from services.parking_service import ParkingService
     with pytest.raises(Exception) as exc:
         ParkingService.get_parking_lot("99", token="token")
@@ -2,6 +2,7 @@ import pytest
 from unittest.mock import patch
 from services.payment_service import PaymentService
 from models.payment_models import PaymentCreate, PaymentRefund, PaymentUpdate
+from storage_utils import Page
 
 # ------------------------
 # Sample Data
@@ -107,11 +108,15 @@ def test_update_payment_invalid_validation(mock_load):
 # ------------------------
 # Get User Payments Tests
 # ------------------------
-@patch("services.payment_service.load_data_db_table", return_value=sample_payment_data.copy())
+def payments_for(row, item, table):
+    return [p for p in sample_payment_data if p[row] == item]
+
+@patch("services.payment_service.get_item_db", side_effect=payments_for)
 def test_get_user_payments(mock_load):
     result = PaymentService.get_user_payments("user1")
     assert len(result) == 1
     assert result[0]["initiator"] == "user1"
+    mock_load.assert_called_with("initiator", "user1", "payments")
 
     result_empty = PaymentService.get_user_payments("nonexistent")
     assert result_empty == []
@@ -119,7 +124,7 @@ def test_get_user_payments(mock_load):
 # ------------------------
 # Get All User Payments Tests (Admin / Non-Admin)
 # ------------------------
-@patch("services.payment_service.load_data_db_table", return_value=sample_payment_data.copy())
+@patch("services.payment_service.get_item_db", side_effect=payments_for)
 def test_get_all_user_payments_admin(mock_load):
     admin_session = {"username": "admin", "role": "ADMIN"}
     result = PaymentService.get_all_user_payments(admin_session, "user1")
@@ -133,7 +138,7 @@ def test_get_all_user_payments_non_admin():
 # ------------------------
 # Multiple Payments / Filtering
 # ------------------------
-@patch("services.payment_service.load_data_db_table", return_value=sample_payment_data.copy())
+@patch("services.payment_service.get_item_db", side_effect=payments_for)
 def test_get_user_payments_multiple_users(mock_load):
     result_user1 = PaymentService.get_user_payments("user1")
     result_user2 = PaymentService.get_user_payments("user2")
@@ -142,6 +147,13 @@ def test_get_user_payments_multiple_users(mock_load):
     assert len(result_user2) == 1
     assert result_user2[0]["initiator"] == "user2"
 
+@patch("services.payment_service.list_rows", return_value=sample_payment_data[:1])
+def test_get_user_payments_page(mock_rows):
+    page = Page(after="10", limit=1)
+    result = PaymentService.get_user_payments("user1", page)
+    assert result == sample_payment_data[:1]
+    mock_rows.assert_called_once_with("payments", page, "initiator", "user1")
+
 # ------------------------
 # Hash Generation Coverage (internal)
 # ------------------------
@@ -0,0 +1,114 @@
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+import query_builder
+import storage_utils
+
+
+def test_statements_are_parameterized_and_quoted():
+    assert query_builder.select_sql("vehicles", "license_plate") == \
+        "SELECT * FROM `vehicles` WHERE `license_plate` = %s"
+    assert query_builder.select_sql("parking_sessions", "id", True).endswith("WHERE `id` = %s FOR UPDATE")
+    assert query_builder.delete_sql("users") == "DELETE FROM `users` WHERE `id` = %s"
+    sql, params = query_builder.update("parking_sessions", {"id": "7", "user": "bob", "cost": 2.5})
+    assert sql == "UPDATE `parking_sessions` SET `user` = %s, `cost` = %s WHERE `id` = %s"
+    assert params == ["bob", 2.5, "7"]
+
+
+def test_the_same_statement_object_is_returned():
+    # The prepared statement cache and mysql-connector both rely on identity
+    first, _ = query_builder.update("vehicles", {"id": "1", "color": "red"})
+    second, _ = query_builder.update("vehicles", {"id": "2", "color": "blue"})
+    assert first is second
+
+
+@pytest.mark.parametrize("table, column", [
+    ("vehicles; DROP TABLE users", "id"),
+    ("Vehicles", "id"),
+    ("users", "id = 1 OR 1"),
+    ("users", "transaction_id"),
+])
+def test_unknown_identifiers_are_refused(table, column):
+    with pytest.raises(ValueError):
+        query_builder.select_sql(table, column)
+
+
+def test_bulk_and_keyset_writes_refuse_unknown_identifiers():
+    conn = MagicMock()
+    with patch("storage_utils.get_db_connection", return_value=conn):
+        with pytest.raises(ValueError):
+            storage_utils.create_many_data("users", [{"name) VALUES ('x'); --": "x"}])
+        with pytest.raises(ValueError):
+            storage_utils.change_many_data("users", [{"id": "1", "role = 'ADMIN', name": "x"}])
+        with pytest.raises(ValueError):
+            storage_utils.delete_many_data("users; DROP TABLE users", ["1"])
+        with pytest.raises(ValueError):
+            storage_utils.save_record("users", {"id": "1", "name=VALUES(name), role": "ADMIN"}, update_on_duplicate=True)
+        with pytest.raises(ValueError):
+            storage_utils.get_page("payments", storage_utils.Page(), "initiator = initiator OR 1", "x")
+    conn.cursor.return_value.execute.assert_not_called()
+
+
+def test_bulk_statements_are_quoted_and_shared():
+    assert query_builder.insert_sql("users", ("name", "role"), 2, True) == (
+        "INSERT INTO `users` (`name`, `role`) VALUES (%s, %s), (%s, %s)"
+        " ON DUPLICATE KEY UPDATE `name` = VALUES(`name`), `role` = VALUES(`role`)")
+    assert query_builder.delete_in_sql("users", "id", 2) == "DELETE FROM `users` WHERE `id` IN (%s, %s)"
+    assert query_builder.keyset_sql("payments", "initiator", True, True) is \
+        query_builder.keyset_sql("payments", "initiator", True, True)
+
+
+def test_nothing_to_change_is_refused():
+    with pytest.raises(ValueError):
+        query_builder.update("users", {"id": "1"})
+
+
+def test_change_data_binds_the_key():
+    conn = MagicMock()
+    with patch("storage_utils.get_db_connection", return_value=conn):
+        storage_utils.change_data("users", {"id": "1 OR 1=1", "name": "Eve"}, "id")
+
+    sql, params = conn.statement.return_value.execute.call_args[0]
+    assert conn.statement.call_args[0][0] is sql
+    assert "1=1" not in sql
+    assert params == ["Eve", "1 OR 1=1"]
+    conn.commit.assert_called_once()
+    conn.close.assert_called_once()
+
+
+def test_unknown_columns_never_reach_the_database():
+    conn = MagicMock()
+    with patch("storage_utils.get_db_connection", return_value=conn):
+        with pytest.raises(ValueError):
+            storage_utils.change_data("users", {"id": "1", "role = 'ADMIN', name": "x"}, "id")
+    conn.statement.assert_not_called()
+
+
+def test_projection_order_and_limit():
+    sql, params = query_builder.select("vehicles", "user_id", "3", columns=["id"], order_by="-created_at", limit=10)
+    assert sql == "SELECT `id` FROM `vehicles` WHERE `user_id` = %s ORDER BY `created_at` DESC LIMIT %s"
+    assert params == ("3", 10)
+    # Any limit runs on the same statement
+    assert query_builder.select("vehicles", "user_id", "4", columns=["id"], order_by="-created_at", limit=1)[0] is sql
+    assert query_builder.select("users", order_by=["role", "-id"])[0] == \
+        "SELECT * FROM `users` ORDER BY `role`, `id` DESC"
+
+
+def test_unknown_projected_or_ordered_columns_are_refused():
+    with pytest.raises(ValueError):
+        query_builder.select("users", columns=["password; --"])
+    with pytest.raises(ValueError):
+        query_builder.select("users", order_by="-nope")
+
+
+def test_projected_reads_decode_only_the_fetched_columns():
+    conn = MagicMock()
+    cursor = conn.statement.return_value
+    cursor.column_names = ("id",)
+    cursor.fetchall.return_value = [(5,), (9,)]
+    with patch("storage_utils.get_db_connection", return_value=conn):
+        rows = storage_utils.get_item_db("user_id", "3", "vehicles", columns=("id",))
+
+    assert [dict(row) for row in rows] == [{"id": "5"}, {"id": "9"}]
+    assert cursor.execute.call_args[0][0].startswith("SELECT `id` FROM `vehicles`")
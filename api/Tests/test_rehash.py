@@ -0,0 +1,72 @@
+import hashlib
+
+from argon2 import PasswordHasher
+
+import rehash
+
+
+def md5(pw):
+    return hashlib.md5(pw.encode()).hexdigest()
+
+
+class FakeCursor:
+    def __init__(self, users):
+        self.users = users
+        self.result = []
+        self.selects = 0
+
+    def execute(self, sql, params):
+        self.selects += 1
+        last_id, limit = params
+        self.result = sorted((i, p) for i, p in self.users.items() if i > last_id)[:limit]
+
+    def fetchall(self):
+        return self.result
+
+    def executemany(self, sql, rows):
+        for new_hash, user_id, old in rows:
+            if self.users[user_id] == old:
+                self.users[user_id] = new_hash
+
+    def close(self):
+        pass
+
+
+class FakeConn:
+    def __init__(self, users):
+        self.cursor_obj = FakeCursor(users)
+        self.commits = 0
+
+    def cursor(self):
+        return self.cursor_obj
+
+    def commit(self):
+        self.commits += 1
+
+
+def test_rehash_migrates_only_legacy_hashes(tmp_path):
+    already = PasswordHasher().hash(md5("kept"))
+    users = {1: md5("one"), 2: already, 3: md5("three")}
+    conn = FakeConn(users)
+
+    migrated = rehash.rehash_users(conn, chunk_size=2, workers=1, checkpoint_path=str(tmp_path / "cp"), log=lambda *_: None)
+
+    assert migrated == 2
+    assert users[2] == already
+    ph = PasswordHasher()
+    assert ph.verify(users[1], md5("one"))
+    assert ph.verify(users[3], md5("three"))
+    assert conn.commits == 2
+
+
+def test_rehash_resumes_from_checkpoint(tmp_path):
+    checkpoint = str(tmp_path / "cp")
+    rehash.save_checkpoint(checkpoint, 2, 2)
+    users = {1: md5("one"), 2: md5("two"), 3: md5("three")}
+
+    migrated = rehash.rehash_users(FakeConn(users), chunk_size=10, workers=1, checkpoint_path=checkpoint, log=lambda *_: None)
+
+    assert migrated == 1
+    assert users[1] == md5("one")
+    assert users[3].startswith("$argon2")
+    assert rehash.load_checkpoint(checkpoint) == 3
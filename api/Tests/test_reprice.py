@@ -0,0 +1,123 @@
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import pytest
+
+import reprice
+from services.parking_service import calculate_rate
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.result = []
+
+    def execute(self, sql, params=()):
+        if "FROM parking_lots" in sql:
+            self.result = [lot for lot in self.conn.lots if not params or lot[0] in params]
+        elif "FROM discounts" in sql:
+            self.result = [d[1:] for d in self.conn.discounts if d[0] == params[0]]
+        elif sql.strip().startswith("SELECT"):
+            lot_id, last_id, limit = params[0], params[1], params[-1]
+            rows = sorted(s for s in self.conn.sessions.values() if s[0] > last_id and s[5] == lot_id)
+            self.result = [row[:5] for row in rows][:limit]
+        else:
+            count = len(params) // 5
+            minutes, costs = params[:2 * count], params[2 * count:4 * count]
+            self.conn.updates.append(count)
+            for i in range(count):
+                row = list(self.conn.sessions[minutes[2 * i]])
+                row[3], row[4] = minutes[2 * i + 1], Decimal(str(costs[2 * i + 1]))
+                self.conn.sessions[row[0]] = tuple(row)
+
+    def fetchall(self):
+        return self.result
+
+    def fetchone(self):
+        return self.result[0] if self.result else None
+
+    def close(self):
+        pass
+
+
+class FakeConn:
+    def __init__(self, lots, sessions, discounts=()):
+        self.lots = lots
+        self.sessions = {s[0]: s for s in sessions}
+        self.discounts = list(discounts)
+        self.updates = []
+        self.commits = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+
+START = datetime(2024, 5, 1, 8, 0)
+
+
+def session(session_id, lot_id, minutes, cost):
+    """(id, started, stopped, duration_minutes, cost, parking_lot_id)"""
+    return (session_id, START, START + timedelta(minutes=minutes), minutes, cost, lot_id)
+
+
+def expected_cost(minutes, tariff, day_tariff, discount=0):
+    return round(calculate_rate(float(minutes), str(START), tariff, day_tariff) * (1 - discount / 100), 2)
+
+
+def test_reprice_updates_only_changed_sessions_in_chunks():
+    lots = [(1, Decimal("2.50"), Decimal("20.00")), (2, Decimal("1.00"), Decimal("9.00"))]
+    sessions = [
+        session(1, 1, 90, Decimal(str(expected_cost(90, 2.5, 20.0)))),  # already correct
+        session(2, 1, 30, Decimal("99.00")),
+        session(3, 1, 3000, Decimal("0.00")),
+        session(4, 2, 45, None),
+        session(5, 1, 600, Decimal("1.00")),
+    ]
+    conn = FakeConn(lots, sessions)
+
+    scanned, changed = reprice.reprice(conn, workers=1, chunk_size=2, log=lambda *_: None, full_price=True)
+
+    assert (scanned, changed) == (5, 4)
+    assert float(conn.sessions[2][4]) == expected_cost(30, 2.5, 20.0)
+    assert float(conn.sessions[3][4]) == expected_cost(3000, 2.5, 20.0)
+    assert float(conn.sessions[4][4]) == expected_cost(45, 1.0, 9.0)
+    # one UPDATE ... CASE per chunk that had changes, never per row
+    assert conn.updates == [1, 2, 1]
+    assert conn.commits == 3
+
+
+def test_dry_run_reports_diff_without_writing():
+    conn = FakeConn([(1, Decimal("2.50"), Decimal("20.00"))], [session(1, 1, 30, Decimal("99.00"))])
+    lines = []
+    scanned, changed = reprice.reprice(conn, workers=1, dry_run=True, log=lines.append)
+
+    assert changed == 1
+    assert conn.updates == [] and conn.commits == 0
+    assert "session 1: minutes 30 -> 30, cost 99.00 -> 1.25" in lines[0]
+
+
+def test_discount_applies_to_its_lot_until_it_expires():
+    lots = [(1, Decimal("2.00"), Decimal("20.00")), (2, Decimal("2.00"), Decimal("20.00"))]
+    sessions = [session(1, 1, 60, None), session(2, 2, 60, None),
+                (3, START + timedelta(days=30), START + timedelta(days=30, minutes=60), 60, None, 1),
+                # stopped later on the expiry day than the code's expiration time
+                (4, START + timedelta(days=7, hours=10), START + timedelta(days=7, hours=11), 60, None, 1)]
+    discounts = [("SUMMER", 1, Decimal("25.00"), START + timedelta(days=7))]
+    conn = FakeConn(lots, sessions, discounts)
+
+    reprice.reprice(conn, discount_code="SUMMER", workers=1, log=lambda *_: None)
+
+    assert float(conn.sessions[1][4]) == 1.5   # 2.00 minus 25%
+    assert float(conn.sessions[2][4]) == 2.0   # other lot
+    assert float(conn.sessions[3][4]) == 2.0   # stopped after the code expired
+    assert float(conn.sessions[4][4]) == 1.5   # the expiry day still counts, as at exit
+
+
+def test_without_a_discount_full_price_must_be_asked_for():
+    conn = FakeConn([(1, Decimal("2.00"), Decimal("20.00"))], [session(1, 1, 60, Decimal("1.50"))])
+    with pytest.raises(ValueError):
+        reprice.reprice(conn, workers=1, log=lambda *_: None)
+    assert conn.updates == []
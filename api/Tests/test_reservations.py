@@ -1,8 +1,11 @@
+from contextlib import contextmanager
+from datetime import datetime
 
 from unittest.mock import Mock
 import pytest
 from fastapi import HTTPException, status
 
+from models.reservation_models import ReservationRegister
 from services.reservation_service import ReservationService
 
 @pytest.fixture
@@ -18,23 +21,41 @@ def mock_validation_service(mocker):
 def mock_storage_functions(mocker):
     """Fixture to provide mocked database functions"""
     save_reservation = mocker.patch('services.reservation_service.save_reservation')
-    save_parking_lot = mocker.patch('services.reservation_service.save_parking_lot')
+    # The id AUTO_INCREMENT hands out
+    save_reservation.create_reservation.return_value = 3
+    load_data = mocker.patch('services.reservation_service.load_data_db_table')
+    # Lot lookups go through the parking lot cache; serve them from the tests' "parking_lots" table
+    mocker.patch('services.reservation_service.get_parking_lot_row',
+                 side_effect=lambda lot_id: (load_data("parking_lots") or {}).get(lot_id))
+
+    # The spot counters are conditional UPDATEs; emulate them on the same table and record
+    # every counter write with the lot row as it is afterwards
+    lot_writes = mocker.Mock()
+    def counter_update(lot_id, delta, allowed):
+        lot = (load_data("parking_lots") or {}).get(lot_id)
+        if not lot or not allowed(lot):
+            return False
+        lot_writes(dict(lot, reserved=lot["reserved"] + delta))
+        return True
+    reserve_spot = mocker.patch('services.reservation_service.reserve_spot', side_effect=lambda lot_id: counter_update(
+        lot_id, 1, lambda lot: lot["reserved"] + lot.get("occupied", 0) < lot["capacity"]))
+    release_spot = mocker.patch('services.reservation_service.release_spot', side_effect=lambda lot_id: counter_update(
+        lot_id, -1, lambda lot: lot["reserved"] > 0))
     return {
-        'load_data': mocker.patch('services.reservation_service.load_data_db_table'),
+        'load_data': load_data,
         'get_item': mocker.patch('services.reservation_service.get_item_db'),
         'save_reservation': save_reservation,
-        'save_parking_lot': save_parking_lot,
+        'reserve_spot': reserve_spot,
+        'release_spot': release_spot,
         'create_data': save_reservation.create_reservation,
-        'change_data': save_parking_lot.change_plt,
+        'change_data': lot_writes,
         'delete_data': save_reservation.delete_reservation
     }
 
 @pytest.fixture
 def mock_datetime(mocker):
-    """Fixture to mock datetime.now() for consistent timestamps"""
-    mock_dt = mocker.patch('services.reservation_service.datetime')
-    mock_dt.now.return_value.timestamp.return_value = 1234567890
-    return mock_dt
+    """Fixture to mock now() for consistent timestamps"""
+    return mocker.patch('services.reservation_service.now', return_value=datetime(2009, 2, 14, 0, 31, 30))
 
 @pytest.fixture
 def sample_reservation_data():
@@ -54,7 +75,7 @@ def existing_reservations():
         {
             "id": "1",
             "user_id": "user456",
-            "lot_id": "lot1",
+            "parking_lot_id": "lot1",
             "vehicle_id": "vehicle2",
             "start_time": "2024-12-01T14:00:00",
             "end_time": "2024-12-01T16:00:00",
@@ -63,7 +84,7 @@ def existing_reservations():
         {
             "id": "2",
             "user_id": "user789",
-            "lot_id": "lot2",
+            "parking_lot_id": "lot2",
             "vehicle_id": "vehicle3",
             "start_time": "2024-12-02T10:00:00",
             "end_time": "2024-12-02T12:00:00",
@@ -99,7 +120,7 @@ class TestCreateReservation:
         user_id = "user123"
         
         # Setup load_data to return different data based on table
-        def load_data_side_effect(table_name):
+        def load_data_side_effect(table_name, **kwargs):
             if table_name == "reservations":
                 return existing_reservations.copy()
             elif table_name == "parking_lots":
@@ -121,13 +142,13 @@ class TestCreateReservation:
         
         # Assertions
         assert result["status"] == "Success"
-        assert result["reservation"]["id"] == "3"  # len(existing) + 1
+        assert result["reservation"]["id"] == "3"  # assigned by AUTO_INCREMENT
         assert result["reservation"]["user_id"] == user_id
-        assert result["reservation"]["lot_id"] == "lot1"
+        assert result["reservation"]["parking_lot_id"] == "lot1"
         assert result["reservation"]["vehicle_id"] == "vehicle1"
-        assert result["reservation"]["start_time"] == "2024-12-01T10:00:00"
-        assert result["reservation"]["end_time"] == "2024-12-01T12:00:00"
-        assert result["reservation"]["created_at"] == 1234567890
+        assert result["reservation"]["start_time"] == datetime(2024, 12, 1, 10)
+        assert result["reservation"]["end_time"] == datetime(2024, 12, 1, 12)
+        assert result["reservation"]["created_at"] == datetime(2009, 2, 14, 0, 31, 30)
         
         # Verify create_data was called for reservation
         mock_storage_functions['create_data'].assert_called_once()
@@ -160,7 +181,7 @@ class TestCreateReservation:
             end_time="2024-12-01T12:00:00"
         )
         
-        def load_data_side_effect(table_name):
+        def load_data_side_effect(table_name, **kwargs):
             if table_name == "reservations":
                 return existing_reservations.copy()
             elif table_name == "parking_lots":
@@ -204,7 +225,7 @@ class TestCreateReservation:
             end_time="2024-12-01T12:00:00"
         )
         
-        def load_data_side_effect(table_name):
+        def load_data_side_effect(table_name, **kwargs):
             if table_name == "reservations":
                 return existing_reservations.copy()
             elif table_name == "parking_lots":
@@ -248,7 +269,7 @@ class TestCreateReservation:
             end_time="2024-12-01T12:00:00"
         )
         
-        def load_data_side_effect(table_name):
+        def load_data_side_effect(table_name, **kwargs):
             if table_name == "reservations":
                 return existing_reservations.copy()
             elif table_name == "parking_lots":
@@ -276,7 +297,7 @@ class TestCreateReservation:
         mock_storage_functions['create_data'].assert_not_called()
         mock_storage_functions['change_data'].assert_not_called()
     
-    def test_first_reservation_gets_id_1(
+    def test_id_comes_from_the_insert(
         self,
         mock_validation_service,
         mock_storage_functions,
@@ -284,10 +305,10 @@ class TestCreateReservation:
         sample_reservation_data,
         mock_parking_lots
     ):
-        """Test that the first reservation gets ID '1'"""
+        """Test that the database assigns the id, whatever is already stored"""
         token = "valid_token"
         
-        def load_data_side_effect(table_name):
+        def load_data_side_effect(table_name, **kwargs):
             if table_name == "reservations":
                 return []
             elif table_name == "parking_lots":
@@ -302,6 +323,7 @@ class TestCreateReservation:
             "username": "testuser"
         }
         mock_validation_service['check_admin'].return_value = False
+        mock_storage_functions['create_data'].return_value = 1
         
         # Execute
         result = ReservationService.create_reservation(sample_reservation_data, token)
@@ -309,10 +331,10 @@ class TestCreateReservation:
         # Assertions
         assert result["reservation"]["id"] == "1"
         
-        # Verify create_data was called
+        # Verify create_data was called without an id of its own
         mock_storage_functions['create_data'].assert_called_once()
         create_args = mock_storage_functions['create_data'].call_args[0]
-        assert create_args[0]["id"] == "1"
+        assert "id" not in create_args[0]
     
     def test_invalid_token_raises_exception(
         self,
@@ -353,7 +375,7 @@ class TestCreateReservation:
             end_time="2025-01-15T17:30:00"
         )
         
-        def load_data_side_effect(table_name):
+        def load_data_side_effect(table_name, **kwargs):
             if table_name == "reservations":
                 return existing_reservations.copy()
             elif table_name == "parking_lots":
@@ -374,10 +396,10 @@ class TestCreateReservation:
         
         # Assertions - verify all fields
         reservation = result["reservation"]
-        assert reservation["lot_id"] == "lot1"
+        assert reservation["parking_lot_id"] == "lot1"
         assert reservation["vehicle_id"] == "special_vehicle"
-        assert reservation["start_time"] == "2025-01-15T08:30:00"
-        assert reservation["end_time"] == "2025-01-15T17:30:00"
+        assert reservation["start_time"] == datetime(2025, 1, 15, 8, 30)
+        assert reservation["end_time"] == datetime(2025, 1, 15, 17, 30)
     
     def test_created_at_timestamp_is_set(
         self,
@@ -390,9 +412,9 @@ class TestCreateReservation:
     ):
         """Test that created_at timestamp is properly set"""
         token = "valid_token"
-        expected_timestamp = 1234567890
+        expected_timestamp = datetime(2009, 2, 14, 0, 31, 30)
         
-        def load_data_side_effect(table_name):
+        def load_data_side_effect(table_name, **kwargs):
             if table_name == "reservations":
                 return existing_reservations.copy()
             elif table_name == "parking_lots":
@@ -407,14 +429,14 @@ class TestCreateReservation:
             "username": "testuser"
         }
         mock_validation_service['check_admin'].return_value = False
-        mock_datetime.now.return_value.timestamp.return_value = expected_timestamp
+        mock_datetime.return_value = expected_timestamp
         
         # Execute
         result = ReservationService.create_reservation(sample_reservation_data, token)
         
         # Assertions
         assert result["reservation"]["created_at"] == expected_timestamp
-        mock_datetime.now.assert_called_once()
+        mock_datetime.assert_called_once()
     
     def test_reservations_list_is_properly_updated(
         self,
@@ -428,7 +450,7 @@ class TestCreateReservation:
         """Test that the new reservation is created with correct data"""
         token = "valid_token"
         
-        def load_data_side_effect(table_name):
+        def load_data_side_effect(table_name, **kwargs):
             if table_name == "reservations":
                 return existing_reservations.copy()
             elif table_name == "parking_lots":
@@ -449,7 +471,7 @@ class TestCreateReservation:
         
         # Verify create_data was called with correct reservation
         create_args = mock_storage_functions['create_data'].call_args[0]
-        assert create_args[0]["id"] == "3"
+        assert create_args[0]["parking_lot_id"] == "lot1"
         assert create_args[0]["user_id"] == "user123"
     
     def test_parking_lot_not_found_raises_404(
@@ -461,7 +483,7 @@ class TestCreateReservation:
         """Test that referencing a non-existent parking lot raises 404"""
         token = "valid_token"
         
-        def load_data_side_effect(table_name):
+        def load_data_side_effect(table_name, **kwargs):
             if table_name == "parking_lots":
                 return {}  # Empty parking lots
             return []
@@ -501,7 +523,7 @@ class TestCreateReservation:
             }
         }
         
-        def load_data_side_effect(table_name):
+        def load_data_side_effect(table_name, **kwargs):
             if table_name == "parking_lots":
                 return full_parking_lots
             return []
@@ -543,7 +565,7 @@ class TestCreateReservation:
             }
         }
         
-        def load_data_side_effect(table_name):
+        def load_data_side_effect(table_name, **kwargs):
             if table_name == "reservations":
                 return existing_reservations.copy()
             elif table_name == "parking_lots":
@@ -588,7 +610,7 @@ class TestCreateReservation:
             }
         }
         
-        def load_data_side_effect(table_name):
+        def load_data_side_effect(table_name, **kwargs):
             if table_name == "reservations":
                 return existing_reservations.copy()
             elif table_name == "parking_lots":
@@ -614,6 +636,60 @@ class TestCreateReservation:
         change_args = mock_storage_functions['change_data'].call_args[0]
         assert change_args[0]["reserved"] == 10  # Now full
 
+    def test_full_parking_lot_saves_nothing(
+        self,
+        mock_validation_service,
+        mock_storage_functions,
+        sample_reservation_data
+    ):
+        """Test that a lot whose reserved and occupied spots fill it is not booked"""
+        lots = {"lot1": {"id": "lot1", "capacity": 5, "reserved": 2, "occupied": 3}}
+        mock_storage_functions['load_data'].side_effect = lambda table_name: lots if table_name == "parking_lots" else []
+        mock_validation_service['validate_token'].return_value = {"id": "user123", "username": "testuser"}
+        mock_validation_service['check_admin'].return_value = False
+
+        with pytest.raises(HTTPException) as exc_info:
+            ReservationService.create_reservation(sample_reservation_data, "valid_token")
+
+        assert exc_info.value.status_code == status.HTTP_400_BAD_REQUEST
+        mock_storage_functions['reserve_spot'].assert_called_once_with("lot1")
+        mock_storage_functions['create_data'].assert_not_called()
+
+    def test_failed_save_rolls_back_the_spot(
+        self,
+        mocker,
+        mock_validation_service,
+        mock_storage_functions,
+        mock_datetime,
+        sample_reservation_data,
+        existing_reservations,
+        mock_parking_lots
+    ):
+        """Test that the spot is claimed in the same transaction as the save, which rolls back when it fails"""
+        unit = []
+        @contextmanager
+        def unit_of_work():
+            unit.append("begin")
+            try:
+                yield
+            except BaseException:
+                unit.append("rollback")
+                raise
+            unit.append("commit")
+        mocker.patch('services.reservation_service.unit_of_work', unit_of_work)
+        mock_storage_functions['load_data'].side_effect = \
+            lambda table_name, **kwargs: mock_parking_lots if table_name == "parking_lots" else existing_reservations.copy()
+        mock_storage_functions['create_data'].side_effect = RuntimeError("database down")
+        mock_validation_service['validate_token'].return_value = {"id": "user123", "username": "testuser"}
+        mock_validation_service['check_admin'].return_value = False
+
+        with pytest.raises(RuntimeError):
+            ReservationService.create_reservation(sample_reservation_data, "valid_token")
+
+        mock_storage_functions['reserve_spot'].assert_called_once_with("lot1")
+        mock_storage_functions['release_spot'].assert_not_called()
+        assert unit == ["begin", "rollback"]
+
 class TestGetReservationsList:
     """Tests for ReservationService.get_reservations_list"""
 
@@ -946,7 +1022,7 @@ class TestDeleteReservation:
         parking_lots = mock_parking_lots.copy()
         parking_lots["lot1"]["reserved"] = 5
         
-        def load_data_side_effect(table_name):
+        def load_data_side_effect(table_name, **kwargs):
             if table_name == "reservations":
                 return existing_reservations.copy()
             elif table_name == "parking_lots":
@@ -992,7 +1068,7 @@ class TestDeleteReservation:
         parking_lots = mock_parking_lots.copy()
         parking_lots["lot1"]["reserved"] = 3
         
-        def load_data_side_effect(table_name):
+        def load_data_side_effect(table_name, **kwargs):
             if table_name == "reservations":
                 return existing_reservations.copy()
             elif table_name == "parking_lots":
@@ -1029,7 +1105,7 @@ class TestDeleteReservation:
         user_id = "user123"
         res_id = "1"  # Belongs to user456, not user123
         
-        def load_data_side_effect(table_name):
+        def load_data_side_effect(table_name, **kwargs):
             if table_name == "reservations":
                 return existing_reservations.copy()
             elif table_name == "parking_lots":
@@ -1121,7 +1197,7 @@ class TestDeleteReservation:
         parking_lots = mock_parking_lots.copy()
         parking_lots["lot1"]["reserved"] = 7
         
-        def load_data_side_effect(table_name):
+        def load_data_side_effect(table_name, **kwargs):
             if table_name == "reservations":
                 return existing_reservations.copy()
             elif table_name == "parking_lots":
@@ -1155,7 +1231,7 @@ class TestDeleteReservation:
         user_id = "user456"
         res_id = "1"
         
-        def load_data_side_effect(table_name):
+        def load_data_side_effect(table_name, **kwargs):
             if table_name == "reservations":
                 return existing_reservations.copy()
             elif table_name == "parking_lots":
@@ -1196,7 +1272,7 @@ class TestDeleteReservation:
         parking_lots = mock_parking_lots.copy()
         parking_lots["lot1"]["reserved"] = 0
         
-        def load_data_side_effect(table_name):
+        def load_data_side_effect(table_name, **kwargs):
             if table_name == "reservations":
                 return existing_reservations.copy()
             elif table_name == "parking_lots":
@@ -1237,7 +1313,7 @@ class TestDeleteReservation:
             {
                 "id": "1",
                 "user_id": "user123",
-                "lot_id": "lot1",
+                "parking_lot_id": "lot1",
                 "vehicle_id": "vehicle1",
                 "start_time": "2024-12-01T10:00:00",
                 "end_time": "2024-12-01T12:00:00"
@@ -1247,7 +1323,7 @@ class TestDeleteReservation:
         parking_lots = mock_parking_lots.copy()
         parking_lots["lot1"]["reserved"] = 1
         
-        def load_data_side_effect(table_name):
+        def load_data_side_effect(table_name, **kwargs):
             if table_name == "reservations":
                 return single_reservation.copy()
             elif table_name == "parking_lots":
@@ -1289,7 +1365,7 @@ class TestDeleteReservation:
             {
                 "id": "1",
                 "user_id": "user123",
-                "lot_id": "lot1",
+                "parking_lot_id": "lot1",
                 "vehicle_id": "vehicle1",
                 "start_time": "2024-12-01T10:00:00",
                 "end_time": "2024-12-01T12:00:00"
@@ -1297,7 +1373,7 @@ class TestDeleteReservation:
             {
                 "id": "2",
                 "user_id": "user123",
-                "lot_id": "lot1",
+                "parking_lot_id": "lot1",
                 "vehicle_id": "vehicle2",
                 "start_time": "2024-12-02T10:00:00",
                 "end_time": "2024-12-02T12:00:00"
@@ -1305,7 +1381,7 @@ class TestDeleteReservation:
             {
                 "id": "3",
                 "user_id": "user123",
-                "lot_id": "lot2",
+                "parking_lot_id": "lot2",
                 "vehicle_id": "vehicle3",
                 "start_time": "2024-12-03T10:00:00",
                 "end_time": "2024-12-03T12:00:00"
@@ -1321,7 +1397,7 @@ class TestDeleteReservation:
             "reserved": 1
         }
         
-        def load_data_side_effect(table_name):
+        def load_data_side_effect(table_name, **kwargs):
             if table_name == "reservations":
                 return three_reservations.copy()
             elif table_name == "parking_lots":
@@ -1345,4 +1421,93 @@ class TestDeleteReservation:
         
         # Verify correct parking lot was updated
         change_args = mock_storage_functions['change_data'].call_args[0]
-        assert change_args[0]["reserved"] == 1
\ No newline at end of file
+        assert change_args[0]["reserved"] == 1
+
+class FakeDB:
+    """Answers the storage layer's statements the way MySQL would for one lot and one reservation"""
+
+    def __init__(self):
+        self.executed = []
+        self.tables = {
+            "parking_lots": (("id", "name", "capacity", "reserved", "occupied"), [(1, "Lot 1", 10, 1, 0)]),
+            "reservations": (("id", "user_id", "parking_lot_id", "vehicle_id", "start_time", "end_time", "created_at"),
+                             [(5, 7, 1, 9, datetime(2024, 12, 1, 10), datetime(2024, 12, 1, 12), datetime(2024, 11, 1))]),
+        }
+
+    def statement(self, sql):
+        return FakeCursor(self)
+
+    def cursor(self, **kwargs):
+        return FakeCursor(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class FakeCursor:
+    def __init__(self, db):
+        self.db = db
+        self.rowcount = 1
+        self.lastrowid = 42
+        self.column_names = ()
+        self.rows = []
+
+    def execute(self, sql, params=()):
+        self.db.executed.append((" ".join(sql.split()), params))
+        for table, (columns, rows) in self.db.tables.items():
+            if sql.startswith(f"SELECT * FROM `{table}`"):
+                self.column_names, self.rows = columns, rows
+
+    def fetchall(self):
+        return self.rows
+
+    def fetchone(self):
+        # The occupancy counters read back after a guarded UPDATE
+        return (1, 10, 1, 0, None)
+
+    def close(self):
+        pass
+
+
+class TestAgainstTheSchema:
+    """The real storage layer under the service: column whitelist, typed rows and counter updates"""
+
+    @pytest.fixture
+    def db(self, mocker):
+        import storage_utils
+        db = FakeDB()
+        mocker.patch("storage_utils.get_pool").return_value.acquire.return_value = db
+        storage_utils.parking_lot_cache.invalidate()
+        yield db
+        storage_utils.parking_lot_cache.invalidate()
+
+    def test_create_inserts_schema_columns_and_takes_the_database_id(self, db, mock_validation_service):
+        mock_validation_service['validate_token'].return_value = {"id": "7", "username": "testuser"}
+        mock_validation_service['check_admin'].return_value = False
+        mock_validation_service['check_employee'].return_value = False
+        data = ReservationRegister(user_id="7", lot_id="1", vehicle_id="9", start_time=1733043600, end_time=1733050800)
+
+        result = ReservationService.create_reservation(data, "valid_token")
+
+        assert result["reservation"]["id"] == "42"
+        insert_sql, params = next((sql, p) for sql, p in db.executed if sql.startswith("INSERT"))
+        assert "`parking_lot_id`" in insert_sql and "`id`" not in insert_sql
+        assert all(isinstance(value, datetime) for value in params[3:])
+        assert any(sql.startswith("UPDATE parking_lots SET reserved = reserved + 1") for sql, _ in db.executed)
+
+    def test_delete_releases_the_spot_of_the_reservations_lot(self, db, mock_validation_service):
+        mock_validation_service['validate_token'].return_value = {"id": "7", "username": "testuser"}
+        mock_validation_service['check_admin'].return_value = False
+        mock_validation_service['check_employee'].return_value = False
+
+        ReservationService.delete_reservation("5", "valid_token")
+
+        release = next(p for sql, p in db.executed if sql.startswith("UPDATE parking_lots SET reserved = reserved - 1"))
+        assert release == ("1",)
+        assert ("DELETE FROM `reservations` WHERE `id` = %s", ("5",)) in db.executed
@@ -0,0 +1,189 @@
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+from row_cache import TTLCache
+import storage_utils
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeVersion:
+    def __init__(self):
+        self.version = 0
+        self.reads = 0
+
+    def current(self):
+        self.reads += 1
+        return self.version
+
+    def bump(self):
+        self.version += 1
+
+
+def counting_loader(value):
+    calls = []
+
+    def load():
+        calls.append(1)
+        return value
+    return load, calls
+
+
+# ------------------------
+# TTL + LRU
+# ------------------------
+def test_hit_after_miss_and_expiry():
+    clock = FakeClock()
+    cache = TTLCache(ttl=10, clock=clock)
+    load, calls = counting_loader({"id": "1", "tariff": "2.5"})
+
+    assert cache.get("1", load)["tariff"] == "2.5"
+    assert cache.get("1", load)["tariff"] == "2.5"
+    assert len(calls) == 1
+
+    clock.now = 11
+    cache.get("1", load)
+    assert len(calls) == 2
+    metrics = cache.metrics()
+    assert (metrics["hits"], metrics["misses"], metrics["expirations"]) == (1, 2, 1)
+    assert metrics["hit_ratio"] == 0.3333
+
+
+def test_returns_copies():
+    cache = TTLCache(ttl=10)
+    load, _ = counting_loader({"id": "1", "reserved": 0})
+    lot = cache.get("1", load)
+    lot["reserved"] += 1
+    assert cache.get("1", load)["reserved"] == 0
+
+
+def test_lru_eviction_and_no_negative_caching():
+    cache = TTLCache(ttl=10, max_entries=2)
+    for key in ("1", "2", "1", "3"):
+        cache.get(key, lambda: {"id": key})
+    missing, calls = counting_loader(None)
+    assert cache.get("99", missing) is None
+    assert cache.get("99", missing) is None
+
+    assert len(calls) == 2
+    assert cache.metrics()["evictions"] == 1
+    assert cache.get("2", lambda: {"id": "reloaded"}) == {"id": "reloaded"}  # least recently used went first
+
+
+def test_invalidation_discards_in_flight_load():
+    cache = TTLCache(ttl=10)
+
+    def load_racing_a_write():
+        cache.invalidate("1")
+        return {"id": "1", "tariff": "old"}
+
+    cache.get("1", load_racing_a_write)
+    assert cache.get("1", lambda: {"id": "1", "tariff": "new"})["tariff"] == "new"
+
+
+def test_shared_version_clears_other_workers():
+    clock = FakeClock()
+    version = FakeVersion()
+    reader = TTLCache(ttl=60, version=version, version_check_interval=1, clock=clock)
+    writer = TTLCache(ttl=60, version=version, clock=clock)
+
+    reader.get("1", lambda: {"tariff": "2.5"})
+    writer.invalidate("1")
+    # Within the check interval the reader still serves its copy
+    assert reader.get("1", lambda: {"tariff": "3.0"})["tariff"] == "2.5"
+    clock.now = 1.5
+    assert reader.get("1", lambda: {"tariff": "3.0"})["tariff"] == "3.0"
+    assert reader.metrics()["remote_invalidations"] == 1
+    assert version.reads == 2
+
+
+def test_ttl_zero_disables_cache():
+    cache = TTLCache(ttl=0)
+    load, calls = counting_loader({"id": "1"})
+    cache.get("1", load)
+    cache.get("1", load)
+    assert len(calls) == 2
+
+
+def test_lifetime_caps_the_ttl_per_value():
+    clock = FakeClock()
+    cache = TTLCache(ttl=100, clock=clock, lifetime=lambda value: value["left"])
+    soon, soon_calls = counting_loader({"left": 5})
+    gone, gone_calls = counting_loader({"left": 0})
+
+    cache.get("soon", soon)
+    cache.get("gone", gone)
+    cache.get("gone", gone)
+    assert len(gone_calls) == 2
+    assert cache.metrics()["size"] == 1
+
+    clock.now = 6
+    cache.get("soon", soon)
+    assert len(soon_calls) == 2
+
+
+def test_expired_entries_go_before_live_ones_are_evicted():
+    clock = FakeClock()
+    cache = TTLCache(ttl=100, max_entries=2, clock=clock, lifetime=lambda value: value["left"])
+    cache.set("long", {"left": 50})
+    cache.set("short", {"left": 5})
+    clock.now = 10
+    cache.set("new", {"left": 50})
+    # "long" is the least recently used, but "short" had already expired
+    load, calls = counting_loader({"left": 50})
+    cache.get("long", load)
+    assert calls == []
+    assert cache.metrics()["evictions"] == 0
+
+
+# ------------------------
+# Parking lot read-through
+# ------------------------
+@patch("storage_utils.change_data")
+@patch("storage_utils.get_item_db")
+def test_parking_lot_rows_are_cached_until_changed(mock_get, mock_change):
+    storage_utils.parking_lot_cache.invalidate()
+    mock_get.return_value = [{"id": "7", "tariff": "2.5"}]
+
+    assert storage_utils.get_parking_lot_row(7)["tariff"] == "2.5"
+    assert storage_utils.get_parking_lot_row("7")["tariff"] == "2.5"
+    assert mock_get.call_count == 1
+
+    storage_utils.save_parking_lot.change_plt({"id": "7", "tariff": "3.0"})
+    mock_get.return_value = [{"id": "7", "tariff": "3.0"}]
+    assert storage_utils.get_parking_lot_row(7)["tariff"] == "3.0"
+    assert mock_get.call_count == 2
+
+
+# ------------------------
+# Discount read-through
+# ------------------------
+@patch("storage_utils.change_data")
+@patch("storage_utils.get_item_db")
+def test_discounts_are_cached_by_code_until_changed(mock_get, mock_change):
+    storage_utils.discount_cache.invalidate()
+    mock_get.return_value = [{"id": "3", "code": "SUMMER", "percentage": 25.0, "expiration_date": None}]
+
+    assert storage_utils.get_discount_row("SUMMER")["percentage"] == 25.0
+    assert storage_utils.get_discount_row("SUMMER")["percentage"] == 25.0
+    assert mock_get.call_count == 1
+
+    # An edit can change the code, so it clears every code
+    storage_utils.save_discount.change_discount({"id": "3", "code": "WINTER"})
+    mock_get.return_value = []
+    assert storage_utils.get_discount_row("SUMMER") is None
+    assert mock_get.call_count == 2
+
+
+def test_discounts_are_cached_until_the_end_of_their_expiration_date():
+    today = datetime.now()
+    assert storage_utils._discount_lifetime({"expiration_date": None}) == float("inf")
+    assert storage_utils._discount_lifetime({"expiration_date": today - timedelta(days=1)}) <= 0
+    left = storage_utils._discount_lifetime({"expiration_date": today.replace(hour=0, minute=0)})
+    assert 0 < left <= 24 * 3600
@@ -0,0 +1,74 @@
+from datetime import datetime
+from decimal import Decimal
+from unittest.mock import MagicMock, patch
+
+import storage_utils
+from models.parking_models import Session
+from models.vehicle_models import Vehicle
+from row_types import decode_rows, record_class
+
+SESSION_COLUMNS = ("id", "parking_lot_id", "licenseplate", "started", "stopped", "user", "cost")
+SESSION_ROW = (7, 1, "AB-12-CD", datetime(2025, 1, 1, 8, 0), None, "alice", Decimal("4.50"))
+
+
+def test_decode_keeps_native_types():
+    [row] = decode_rows("parking_sessions", SESSION_COLUMNS, [SESSION_ROW])
+    assert row["id"] == "7" and row["parking_lot_id"] == "1"
+    assert row["started"] == datetime(2025, 1, 1, 8, 0)
+    assert row["stopped"] is None
+    assert row["cost"] == 4.5 and isinstance(row["cost"], float)
+
+
+def test_record_behaves_like_a_dict():
+    [row] = decode_rows("parking_sessions", SESSION_COLUMNS, [SESSION_ROW])
+    assert row == dict(zip(SESSION_COLUMNS, ("7", "1", "AB-12-CD", datetime(2025, 1, 1, 8, 0), None, "alice", 4.5)))
+    assert row.get("missing", "x") == "x"
+    assert "licenseplate" in row and len(row) == len(SESSION_COLUMNS)
+
+    row.update({"cost": 5.0, "duration_minutes": 30})
+    assert row["cost"] == 5.0 and row["duration_minutes"] == 30
+    assert list(row)[-1] == "duration_minutes"
+
+    clone = row.copy()
+    clone["cost"] = 1.0
+    clone["extra"] = True
+    assert row["cost"] == 5.0 and "extra" not in row
+
+
+def test_records_have_no_instance_dict():
+    [row] = decode_rows("parking_sessions", SESSION_COLUMNS, [SESSION_ROW])
+    assert not hasattr(row, "__dict__")
+    assert record_class("parking_sessions", SESSION_COLUMNS) is type(row)
+
+
+def test_reserved_column_names_fall_back_to_dicts():
+    [row] = decode_rows("users", ("id", "keys"), [(1, "x")])
+    assert row == {"id": "1", "keys": "x"} and type(row) is dict
+
+
+def test_pydantic_reads_records_directly():
+    [row] = decode_rows("parking_sessions", SESSION_COLUMNS, [SESSION_ROW])
+    session = Session.model_validate(row, from_attributes=True)
+    assert session.started == datetime(2025, 1, 1, 8, 0) and session.stopped is None
+    assert session.model_dump(mode="json")["started"] == "2025-01-01 08:00:00"
+
+
+def test_timestamp_fields_accept_legacy_text():
+    vehicle = Vehicle(id="1", user_id="1", license_plate="76-KQQ-7", make="Peugeot",
+                      model="308", color="Brown", year=2024, created_at="13-08-2024")
+    assert vehicle.created_at == datetime(2024, 8, 13)
+    assert vehicle.model_dump(mode="json")["created_at"] == "2024-08-13 00:00:00"
+
+
+def test_get_item_db_decodes_rows():
+    cursor = MagicMock()
+    cursor.column_names = SESSION_COLUMNS
+    cursor.fetchall.return_value = [SESSION_ROW]
+    conn = MagicMock()
+    conn.statement.return_value = cursor
+
+    with patch("storage_utils.get_db_connection", return_value=conn):
+        [row] = storage_utils.get_item_db("id", 7, "parking_sessions")
+
+    assert row["id"] == "7" and row["stopped"] is None
+    conn.statement.assert_called_once()
@@ -0,0 +1,248 @@
+import json
+
+import mysql.connector
+import pytest
+
+from loaddb import iter_json_items, load_data, salvage_json_records
+import seed_pipeline
+
+
+def session(i, plate):
+    return {"parking_lot_id": 1, "licenseplate": plate, "started": "2020-03-25T20:29:47+00:00",
+            "stopped": "2020-03-26T05:10:47+00:00", "user": "user1", "duration_minutes": 521,
+            "cost": 16.5, "payment_status": "paid"}
+
+
+# ------------------------
+# Incremental JSON parsing
+# ------------------------
+def test_iter_json_items_object_across_chunk_boundaries(tmp_path):
+    data = {str(i): {"value": i, "text": "x" * (i % 7)} for i in range(200)}
+    path = tmp_path / "data.json"
+    path.write_text(json.dumps(data, indent=2))
+    items = list(iter_json_items(str(path), chunk_size=16))
+    assert items == list(data.items())
+
+
+def test_iter_json_items_array(tmp_path):
+    data = [{"transaction": f"T{i}"} for i in range(50)]
+    path = tmp_path / "data.json"
+    path.write_text(json.dumps(data))
+    assert [v for _, v in iter_json_items(str(path), chunk_size=8)] == data
+
+
+def test_iter_json_items_stops_at_corruption(tmp_path):
+    path = tmp_path / "data.json"
+    path.write_text('[{"a": 1}, {"a": 2}, {"a": ]')
+    items = iter_json_items(str(path), chunk_size=4)
+    assert next(items) == (0, {"a": 1})
+    assert next(items) == (1, {"a": 2})
+    with pytest.raises(json.JSONDecodeError):
+        next(items)
+
+
+def test_iter_parking_sessions_converts_rows(tmp_path):
+    path = tmp_path / "p1-sessions.json"
+    path.write_text(json.dumps({"1": session(1, "AB-12-C")}))
+    rows = list(load_data.iter_parking_sessions(str(path)))
+    assert rows[0]["licenseplate"] == "AB-12-C"
+    assert rows[0]["started"].year == 2020
+
+
+# ------------------------
+# Corruption recovery
+# ------------------------
+def payment(i):
+    return {"transaction": f"T{i}", "amount": i, "initiator": "user1", "created_at": "25-03-2020 20:29:47",
+            "completed": "25-03-2020 20:30:12", "hash": "h", "session_id": i, "parking_lot_id": 1,
+            "t_data": {"amount": i, "date": "2020-03-25 20:29:47", "method": "ideal", "issuer": "X", "bank": "Y"}}
+
+
+def write_corrupt_payments(tmp_path, count=40, corrupt=(10, 11, 25)):
+    parts = []
+    for i in range(count):
+        text = json.dumps(payment(i))
+        if i in corrupt:
+            text = text[:len(text) // 2] + '"@@'  # truncated record with garbage
+        parts.append(text)
+    path = tmp_path / "payments.json"
+    path.write_text("[\n" + ",\n".join(parts) + "\n]")
+    return path
+
+
+@pytest.mark.parametrize("chunk_size", [64, 300, 1 << 20])
+def test_salvage_recovers_records_around_corruption(tmp_path, chunk_size):
+    path = write_corrupt_payments(tmp_path)
+    skipped = []
+    records = list(salvage_json_records(str(path), lambda start, end: skipped.append((start, end)), chunk_size=chunk_size))
+
+    assert [r["transaction"] for _, r in records] == [f"T{i}" for i in range(40) if i not in (10, 11, 25)]
+    raw = path.read_bytes()
+    # offsets point at the records and the skipped ranges cover exactly the damaged ones
+    assert all(raw[offset:offset + 1] == b"{" for offset, _ in records)
+    assert len(skipped) == 3
+    assert skipped[0][1] == skipped[1][0]  # two damaged neighbours, one range each
+    assert all(raw[start:end].count(b'"transaction"') == 1 for start, end in skipped)
+    assert raw[skipped[2][1]:].startswith(b'{"transaction": "T26"')
+
+
+def test_salvage_handles_non_ascii_and_large_records(tmp_path):
+    data = [{"transaction": "T0", "note": "é" * 500}, {"transaction": "T1", "note": "x" * 5000}]
+    path = tmp_path / "payments.json"
+    path.write_text(json.dumps(data), encoding="utf-8")
+    assert [r for _, r in salvage_json_records(str(path), chunk_size=100)] == data
+
+
+def test_salvage_missing_closing_bracket(tmp_path):
+    path = tmp_path / "payments.json"
+    path.write_text('[{"transaction": "T0"}, {"transaction": "T1"}, {"transac')
+    skipped = []
+    records = [r for _, r in salvage_json_records(str(path), lambda start, end: skipped.append((start, end)))]
+    assert records == [{"transaction": "T0"}, {"transaction": "T1"}]
+    assert skipped[0][1] == path.stat().st_size
+
+
+def test_load_payments_keeps_records_after_corruption(tmp_path):
+    path = write_corrupt_payments(tmp_path)
+    rows = load_data.load_payments(str(path))
+    assert len(rows) == 37
+    assert rows[-1]["transaction"] == "T39"
+
+
+# ------------------------
+# Import pipeline
+# ------------------------
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def execute(self, sql, params=None):
+        verb = sql.split()[0]
+        if "INSERT INTO" in sql and "import_" not in sql:
+            rows = [tuple(params[i:i + self.conn.width]) for i in range(0, len(params), self.conn.width)]
+            if any(row[1] in self.conn.reject for row in rows):
+                raise mysql.connector.DataError("Data too long for column 'licenseplate'")
+            self.conn.inserted.append(len(params))
+            self.conn.rows.extend(rows)
+        elif "INSERT INTO import_checkpoints" in sql:
+            stage, file, offset, batch_no, last_key, done = params
+            self.conn.checkpoints[(stage, file)] = (offset, batch_no, last_key, done)
+        elif "FROM import_checkpoints" in sql:
+            self._result = [(file, offset, batch_no, done)
+                            for (stage, file), (offset, batch_no, _, done) in self.conn.checkpoints.items()
+                            if stage == params[0]]
+        self.conn.statements.append(verb)
+
+    def executemany(self, sql, rows):
+        if "import_quarantine" in sql:
+            self.conn.quarantined.extend(rows)
+
+    def fetchone(self):
+        return None
+
+    def fetchall(self):
+        return self._result
+
+    def close(self):
+        pass
+
+
+class FakeConn:
+    def __init__(self, width, reject=()):
+        self.width = width
+        self.reject = set(reject)
+        self.inserted = []
+        self.rows = []
+        self.statements = []
+        self.checkpoints = {}
+        self.quarantined = []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+COLUMNS = ["parking_lot_id", "licenseplate", "started"]
+PAYMENT_COLUMNS = ["transaction", "amount", "initiator", "created_at", "completed", "hash", "date"]
+
+
+def write_lots(tmp_path, lots=3, per_lot=25):
+    paths = []
+    for lot in range(1, lots + 1):
+        path = tmp_path / f"p{lot}-sessions.json"
+        path.write_text(json.dumps({str(i): session(i, f"PL-{lot}-{i}") for i in range(per_lot)}))
+        paths.append(str(path))
+    return paths
+
+
+def run(conn, paths, **kwargs):
+    return seed_pipeline.run_import(conn, "parking_sessions", "parking_sessions", COLUMNS, paths,
+                                    batch_size=10, log=lambda *_: None, **kwargs)
+
+
+def test_run_import_streams_files_in_batches(tmp_path):
+    paths = write_lots(tmp_path)
+    conn = FakeConn(len(COLUMNS))
+    inserted, _ = run(conn, paths, workers=2)
+    assert inserted == 75
+    assert sum(conn.inserted) == 75 * len(COLUMNS)
+    assert max(conn.inserted) <= 10 * len(COLUMNS)
+    # every file is checkpointed as finished, with its last source key
+    assert all(conn.checkpoints[("parking_sessions", p)] == (25, 3, "24", 1) for p in paths)
+
+
+def test_run_import_without_resource_module_skips_memory_report(tmp_path, monkeypatch):
+    # Windows has no resource module
+    monkeypatch.setattr(seed_pipeline, "resource", None)
+    lines = []
+    inserted, _ = seed_pipeline.run_import(FakeConn(len(COLUMNS)), "parking_sessions", "parking_sessions", COLUMNS,
+                                           write_lots(tmp_path, lots=1), batch_size=10, log=lines.append, workers=1)
+    assert inserted == 25
+    assert "peak RSS" not in lines[-1]
+
+
+def test_run_import_resumes_after_last_checkpoint(tmp_path):
+    paths = write_lots(tmp_path, lots=2)
+    conn = FakeConn(len(COLUMNS))
+    conn.checkpoints[("parking_sessions", paths[0])] = (25, 3, "24", 1)
+    conn.checkpoints[("parking_sessions", paths[1])] = (20, 2, "19", 0)
+
+    inserted, _ = run(conn, paths, workers=1)
+    assert inserted == 5
+    assert [row[1] for row in conn.rows] == [f"PL-2-{i}" for i in range(20, 25)]
+    assert conn.checkpoints[("parking_sessions", paths[1])] == (25, 3, "24", 1)
+
+
+def test_run_import_quarantines_bad_records(tmp_path):
+    path = tmp_path / "p1-sessions.json"
+    records = {str(i): session(i, f"PL-1-{i}") for i in range(12)}
+    records["3"]["started"] = "not a timestamp"
+    records["7"]["licenseplate"] = "X" * 300
+    path.write_text(json.dumps(records))
+    conn = FakeConn(len(COLUMNS), reject={"X" * 300})
+
+    inserted, _ = run(conn, [str(path)], workers=1)
+    assert inserted == 10
+    assert "X" * 300 not in [row[1] for row in conn.rows]
+    # one record failed to convert, one was rejected by the database
+    assert len(conn.quarantined) == 2
+    assert conn.quarantined[0][2:4] == (3, "3")
+    assert "DataError" in conn.quarantined[1][5]
+    assert conn.checkpoints[("parking_sessions", str(path))][3] == 1
+
+
+def test_run_import_quarantines_corrupt_payment_ranges(tmp_path):
+    path = write_corrupt_payments(tmp_path)
+    conn = FakeConn(len(PAYMENT_COLUMNS))
+    inserted, _ = seed_pipeline.run_import(conn, "payments", "payments", PAYMENT_COLUMNS, [str(path)],
+                                           workers=1, batch_size=10, log=lambda *_: None)
+    assert inserted == 37
+    skipped = []
+    list(salvage_json_records(str(path), lambda start, end: skipped.append(f"bytes {start}-{end}")))
+    assert [q[3] for q in conn.quarantined] == skipped
+    assert conn.checkpoints[("payments", str(path))][2:] == ("T39", 1)
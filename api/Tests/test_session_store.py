@@ -0,0 +1,140 @@
+import json
+
+from session_store import InMemorySessionStore, MySQLSessionStore
+import session_manager
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+# ------------------------
+# In-memory backend
+# ------------------------
+def test_memory_store_set_get_delete():
+    store = InMemorySessionStore()
+    store.set("tok", {"username": "user1"})
+    assert store.get("tok") == {"username": "user1"}
+    assert store.delete("tok") == {"username": "user1"}
+    assert store.get("tok") is None
+
+
+def test_memory_store_ttl_expiry():
+    clock = FakeClock()
+    store = InMemorySessionStore(ttl=10, clock=clock)
+    store.set("tok", {"username": "user1"})
+    clock.now = 9
+    assert store.get("tok") is not None
+    clock.now = 11
+    assert store.get("tok") is None
+    assert len(store) == 0
+
+
+def test_memory_store_zero_ttl_never_expires():
+    clock = FakeClock()
+    store = InMemorySessionStore(ttl=10, clock=clock)
+    store.set("tok", {"username": "system"}, ttl=0)
+    clock.now = 10 ** 6
+    assert store.get("tok") == {"username": "system"}
+
+
+def test_memory_store_lru_eviction():
+    store = InMemorySessionStore(max_sessions=2, shards=1)
+    store.set("a", 1)
+    store.set("b", 2)
+    store.get("a")  # a is now most recently used
+    store.set("c", 3)
+    assert store.get("b") is None
+    assert store.get("a") == 1
+    assert store.get("c") == 3
+
+
+# ------------------------
+# MySQL backend (fake connection)
+# ------------------------
+class FakeCursor:
+    def __init__(self, db):
+        self.db = db
+        self.row = None
+
+    def execute(self, sql, params):
+        self.db.queries.append(sql.split()[0])
+        if sql.lstrip().startswith("INSERT"):
+            self.db.rows[params[0]] = params[1]
+        elif sql.lstrip().startswith("SELECT"):
+            data = self.db.rows.get(params[0])
+            self.row = (data,) if data else None
+        elif sql.lstrip().startswith("DELETE") and params:
+            self.db.rows.pop(params[0], None)
+
+    def fetchone(self):
+        return self.row
+
+    def close(self):
+        pass
+
+
+class FakeDB:
+    def __init__(self):
+        self.rows = {}
+        self.queries = []
+
+    def connect(self):
+        return self
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def test_mysql_store_round_trip_without_cache():
+    db = FakeDB()
+    store = MySQLSessionStore(cache_ttl=0, connection_factory=db.connect)
+    store.set("tok", {"username": "user1", "id": "1"})
+    assert json.loads(db.rows["tok"])["username"] == "user1"
+    assert store.get("tok") == {"username": "user1", "id": "1"}
+    store.delete("tok")
+    assert store.get("tok") is None
+
+
+def test_mysql_store_keeps_password_hash_out_of_sessions():
+    db = FakeDB()
+    store = MySQLSessionStore(cache_ttl=60, connection_factory=db.connect)
+    store.set("tok", {"username": "user1", "id": "1", "password": "$argon2id$..."})
+    assert "password" not in json.loads(db.rows["tok"])
+    assert store.get("tok") == {"username": "user1", "id": "1"}
+
+
+def test_mysql_store_read_through_cache_skips_db():
+    db = FakeDB()
+    writer = MySQLSessionStore(cache_ttl=0, connection_factory=db.connect)
+    writer.set("tok", {"username": "user1"})
+    reader = MySQLSessionStore(cache_ttl=60, connection_factory=db.connect)
+    assert reader.get("tok") == {"username": "user1"}
+    selects = db.queries.count("SELECT")
+    assert reader.get("tok") == {"username": "user1"}
+    assert db.queries.count("SELECT") == selects
+
+
+# ------------------------
+# session_manager facade
+# ------------------------
+def test_pinned_session_survives_store():
+    session_manager.add_session("pinned-token", {"username": "system"}, ttl=0)
+    assert session_manager.get_session("pinned-token") == {"username": "system"}
+    assert session_manager.store.get("pinned-token") is None
+    session_manager.remove_session("pinned-token")
+    assert session_manager.get_session("pinned-token") is None
+
+
+def test_get_session_without_token():
+    assert session_manager.get_session(None) is None
@@ -0,0 +1,304 @@
+import asyncio
+import time
+from datetime import datetime
+from decimal import Decimal
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+import storage_utils
+
+
+# ------------------------
+# Async access path
+# ------------------------
+def test_run_in_db_executor_runs_blocking_calls_concurrently():
+    def slow_query():
+        time.sleep(0.05)
+        return "row"
+
+    async def run():
+        return await asyncio.gather(*(storage_utils.run_in_db_executor(slow_query) for _ in range(5)))
+
+    started = time.perf_counter()
+    results = asyncio.run(run())
+    assert results == ["row"] * 5
+    # Serial execution would take 0.25s
+    assert time.perf_counter() - started < 0.2
+
+
+@patch("storage_utils.get_item_db", return_value=[{"id": "1"}])
+def test_get_item_db_async_delegates(mock_get):
+    rows = asyncio.run(storage_utils.get_item_db_async("id", 1, "users"))
+    assert rows == [{"id": "1"}]
+    mock_get.assert_called_once_with("id", 1, "users", columns=None, limit=None, order_by=None)
+
+
+# ------------------------
+# Keyset pages and streaming
+# ------------------------
+def fake_connection(columns, rows):
+    cursor = MagicMock()
+    cursor.column_names = columns
+    cursor.fetchall.return_value = rows
+    chunks = [rows[i:i + 2] for i in range(0, len(rows), 2)] + [[]]
+    cursor.fetchmany.side_effect = chunks
+    conn = MagicMock()
+    conn.cursor.return_value = cursor
+    return conn, cursor
+
+
+def test_keyset_query_filters_after_the_cursor():
+    page = storage_utils.Page(after="40", limit=20)
+    sql, params = storage_utils._keyset_query("payments", page, "initiator", "alice")
+    assert "WHERE `initiator` = %s AND `id` > %s ORDER BY `id` LIMIT %s" in " ".join(sql.split())
+    assert params == ("alice", "40", 20)
+
+    sql, params = storage_utils._keyset_query("parking_lots", storage_utils.Page())
+    assert " ".join(sql.split()) == "SELECT * FROM `parking_lots` ORDER BY `id`" and params == ()
+
+
+def test_next_cursor_only_for_full_pages():
+    rows = [{"id": "1"}, {"id": "2"}]
+    assert storage_utils.next_cursor(rows, storage_utils.Page(limit=2)) == "2"
+    assert storage_utils.next_cursor(rows, storage_utils.Page(limit=3)) is None
+    assert storage_utils.next_cursor(rows, storage_utils.Page()) is None
+
+
+def test_stream_rows_fetches_in_chunks():
+    conn, cursor = fake_connection(("id", "initiator"), [(i, "alice") for i in range(1, 6)])
+    with patch("storage_utils.get_db_connection", return_value=conn):
+        rows = storage_utils.list_rows("payments", storage_utils.Page(stream=True), "initiator", "alice")
+        conn.cursor.assert_not_called()  # nothing runs until the response is iterated
+        ids = [row["id"] for row in rows]
+
+    assert ids == ["1", "2", "3", "4", "5"]
+    conn.cursor.assert_called_once_with(buffered=False)
+    cursor.fetchmany.assert_called_with(storage_utils.STREAM_CHUNK_SIZE)
+    cursor.fetchall.assert_not_called()
+    conn.close.assert_called_once()
+
+
+def test_stream_rows_releases_connection_when_abandoned():
+    conn, _ = fake_connection(("id",), [(i,) for i in range(1, 6)])
+    with patch("storage_utils.get_db_connection", return_value=conn):
+        rows = storage_utils.stream_rows("payments", storage_utils.Page(stream=True))
+        next(rows)
+        rows.close()
+    conn.consume_results.assert_called_once()
+    conn.close.assert_called_once()
+
+
+# ------------------------
+# Vehicle history
+# ------------------------
+def test_history_query_uses_plate_range_and_cursor():
+    page = storage_utils.Page(after="2025-01-01 08:00:00,17", limit=50)
+    sql, params = storage_utils._history_query("AB-12-CD", page, since=datetime(2024, 1, 1), until=datetime(2026, 1, 1))
+    sql = " ".join(sql.split())
+    assert "WHERE `licenseplate` = %s AND `started` >= %s AND `started` < %s" in sql
+    assert "AND (`started` > %s OR (`started` = %s AND `id` > %s)) ORDER BY `started`, `id` LIMIT %s" in sql
+    assert params == ("AB-12-CD", datetime(2024, 1, 1), datetime(2026, 1, 1),
+                      datetime(2025, 1, 1, 8), datetime(2025, 1, 1, 8), 17, 50)
+
+
+def test_history_cursor_round_trips():
+    row = {"id": "17", "started": datetime(2025, 1, 1, 8, 0)}
+    cursor = storage_utils.next_cursor([row], storage_utils.Page(limit=1), storage_utils.history_cursor)
+    assert cursor == "2025-01-01 08:00:00,17"
+    _, params = storage_utils._history_query("AB-12-CD", storage_utils.Page(after=cursor))
+    assert params[1:] == (datetime(2025, 1, 1, 8), datetime(2025, 1, 1, 8), 17)
+
+
+def test_history_query_rejects_bad_cursor():
+    with pytest.raises(ValueError):
+        storage_utils._history_query("AB-12-CD", storage_utils.Page(after="17"))
+
+
+def test_history_summary_is_cached_until_a_session_changes():
+    cursor = MagicMock()
+    cursor.fetchone.return_value = (3, Decimal("240"), Decimal("12.50"), datetime(2025, 1, 1), datetime(2025, 3, 1))
+    conn = MagicMock()
+    conn.cursor.return_value = cursor
+    storage_utils.history_summary_cache.invalidate()
+
+    with patch("storage_utils.get_db_connection", return_value=conn), patch("storage_utils.change_data"):
+        summary = storage_utils.get_vehicle_history_summary("AB-12-CD")
+        storage_utils.get_vehicle_history_summary("AB-12-CD")
+        assert cursor.execute.call_count == 1
+        assert summary["sessions"] == 3 and summary["total_minutes"] == 240 and summary["total_cost"] == 12.5
+
+        storage_utils.save_parking_sessions.change_parking_sessions({"id": "1", "licenseplate": "AB-12-CD"})
+        storage_utils.get_vehicle_history_summary("AB-12-CD")
+        assert cursor.execute.call_count == 2
+
+
+# ------------------------
+# Bulk writes
+# ------------------------
+def bulk_connection(lastrowids=()):
+    conn = MagicMock()
+    cursor = conn.cursor.return_value
+    cursor.rowcount = 1
+    type(cursor).lastrowid = property(lambda self, ids=iter(lastrowids): next(ids))
+    return conn, cursor
+
+
+def test_create_many_chunks_by_bytes_in_one_transaction():
+    conn, cursor = bulk_connection(lastrowids=[10, 13])
+    rows = [{"license_plate": f"AB-{i:03d}", "user_id": i} for i in range(5)]
+    # Each row is two values of 9 and 4 bytes: three rows fit in the budget
+    with patch("storage_utils.get_db_connection", return_value=conn), \
+            patch("storage_utils.MAX_STATEMENT_BYTES", 40):
+        ids = storage_utils.save_vehicle.create_many(rows)
+
+    assert ids == [10, 11, 12, 13, 14]
+    assert cursor.execute.call_count == 2
+    sql, params = cursor.execute.call_args_list[0][0]
+    assert sql == "INSERT INTO `vehicles` (`license_plate`, `user_id`) VALUES (%s, %s), (%s, %s), (%s, %s)"
+    assert params == ["AB-000", 0, "AB-001", 1, "AB-002", 2]
+    conn.commit.assert_called_once()
+
+
+def test_create_many_rolls_back_every_chunk_on_failure():
+    conn, cursor = bulk_connection(lastrowids=[1])
+    cursor.execute.side_effect = [None, RuntimeError("packet too large")]
+    with patch("storage_utils.get_db_connection", return_value=conn), \
+            patch("storage_utils.MAX_PLACEHOLDERS", 2):
+        with pytest.raises(RuntimeError):
+            storage_utils.save_payment.create_many([{"amount": 1}, {"amount": 2}, {"amount": 3}])
+    conn.commit.assert_not_called()
+    conn.rollback.assert_called_once()
+    conn.close.assert_called_once()
+
+
+def test_create_many_requires_the_same_columns():
+    with pytest.raises(ValueError):
+        storage_utils.create_many_data("vehicles", [{"license_plate": "A"}, {"user_id": 1}])
+
+
+def test_change_many_groups_rows_into_case_updates():
+    conn, cursor = bulk_connection()
+    rows = [{"id": 1, "cost": 2.5, "payment_status": "paid"},
+            {"id": 2, "cost": 4.0, "payment_status": "paid"},
+            {"id": 3, "stopped": None}]
+    with patch("storage_utils.get_db_connection", return_value=conn):
+        assert storage_utils.change_many_data("parking_sessions", rows) == 2
+
+    first, second = [c[0] for c in cursor.execute.call_args_list]
+    assert first[0] == ("UPDATE `parking_sessions` SET `cost` = CASE `id` WHEN %s THEN %s WHEN %s THEN %s END, "
+                        "`payment_status` = CASE `id` WHEN %s THEN %s WHEN %s THEN %s END WHERE `id` IN (%s, %s)")
+    assert first[1] == [1, 2.5, 2, 4.0, 1, "paid", 2, "paid", 1, 2]
+    assert second[1] == [3, None, 3]
+    conn.commit.assert_called_once()
+
+
+def test_bulk_session_changes_skip_generated_columns_and_drop_summaries():
+    storage_utils.history_summary_cache.set("AB-12-CD", {"sessions": 1})
+    with patch("storage_utils.change_many_data") as mock_change:
+        storage_utils.save_parking_sessions.change_many([{"id": 1, "licenseplate": "AB-12-CD", "active_plate": "AB-12-CD"}])
+    assert mock_change.call_args[0][1] == [{"id": 1, "licenseplate": "AB-12-CD"}]
+    assert storage_utils.history_summary_cache.metrics()["size"] == 0
+
+
+def test_delete_many_uses_in_lists():
+    conn, cursor = bulk_connection()
+    with patch("storage_utils.get_db_connection", return_value=conn), \
+            patch("storage_utils.MAX_PLACEHOLDERS", 2):
+        assert storage_utils.save_reservation.delete_many(["1", "2", "2", "3"]) == 2
+    assert [c[0] for c in cursor.execute.call_args_list] == [
+        ("DELETE FROM `reservations` WHERE `id` IN (%s, %s)", ["1", "2"]),
+        ("DELETE FROM `reservations` WHERE `id` IN (%s)", ["3"]),
+    ]
+    conn.commit.assert_called_once()
+
+
+# ------------------------
+# Unit of work
+# ------------------------
+def pooled(conn):
+    pool = MagicMock()
+    pool.acquire.return_value = conn
+    return patch("storage_utils.get_pool", return_value=pool)
+
+
+def test_unit_of_work_shares_one_connection_and_commits_once():
+    conn = MagicMock()
+    conn.cursor.return_value.lastrowid = 7
+    with pooled(conn) as get_pool:
+        with storage_utils.unit_of_work():
+            storage_utils.create_data("reservations", {"parking_lot_id": "1"})
+            storage_utils.change_data("parking_lots", {"id": "1", "name": "Lot"}, "id")
+            storage_utils.delete_data("reservations", "3")
+            conn.commit.assert_not_called()
+            conn.close.assert_not_called()
+
+    get_pool.return_value.acquire.assert_called_once()
+    # The insert on a plain cursor, the update and delete as prepared statements
+    assert conn.cursor.return_value.execute.call_count == 1
+    assert conn.statement.return_value.execute.call_count == 2
+    conn.commit.assert_called_once()
+    conn.close.assert_called_once()
+
+
+def test_unit_of_work_rolls_back_and_skips_after_commit_work():
+    conn = MagicMock()
+    storage_utils.parking_lot_cache.invalidate()
+    storage_utils.parking_lot_cache.set("1", {"id": "1"})
+    with pooled(conn):
+        with pytest.raises(RuntimeError):
+            with storage_utils.unit_of_work():
+                storage_utils.save_parking_lot.change_plt({"id": "1", "name": "Lot"})
+                # The cache isn't touched before the commit
+                assert storage_utils.parking_lot_cache.metrics()["size"] == 1
+                raise RuntimeError("payment failed")
+
+    conn.rollback.assert_called_once()
+    conn.commit.assert_not_called()
+    conn.close.assert_called_once()
+    assert storage_utils.parking_lot_cache.metrics()["size"] == 1
+
+
+def test_after_commit_work_runs_once_committed():
+    conn = MagicMock()
+    storage_utils.parking_lot_cache.invalidate()
+    storage_utils.parking_lot_cache.set("1", {"id": "1"})
+    with pooled(conn):
+        with storage_utils.unit_of_work():
+            with storage_utils.unit_of_work():  # joins the outer unit
+                storage_utils.save_parking_lot.change_plt({"id": "1", "name": "Lot"})
+            conn.commit.assert_not_called()
+    conn.commit.assert_called_once()
+    assert storage_utils.parking_lot_cache.metrics()["size"] == 0
+
+
+def test_after_commit_work_gets_its_own_committed_connection():
+    # A synced cache bumps its version in MySQL after the commit; that write must not land on
+    # the finished unit's connection, where commit and close do nothing
+    from db_pool import ConnectionPool
+    from row_cache import TTLCache, VersionCounter
+
+    raws = []
+
+    def factory():
+        raws.append(MagicMock())
+        return raws[-1]
+
+    pool = ConnectionPool(size=3, timeout=0.05, factory=factory)
+    cache = TTLCache(version=VersionCounter("parking_lots"))
+    with patch("storage_utils.get_pool", return_value=pool), \
+            patch("storage_utils.parking_lot_cache", cache):
+        for _ in range(4):
+            with storage_utils.unit_of_work():
+                storage_utils.save_parking_lot.change_plt({"id": "1", "name": "Lot"})
+            assert pool.metrics()["in_use"] == 0
+
+    # Every unit committed once and so did every version bump
+    assert sum(raw.commit.call_count for raw in raws) == 8
+
+
+def test_unit_of_work_without_statements_takes_no_connection():
+    with pooled(MagicMock()) as get_pool:
+        with storage_utils.unit_of_work():
+            pass
+    get_pool.return_value.acquire.assert_not_called()
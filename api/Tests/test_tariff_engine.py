@@ -0,0 +1,63 @@
+import random
+from datetime import datetime, timedelta
+
+import numpy as np
+
+import tariff_engine
+from services.parking_service import calculate_rate
+from session_calculator import calculate_price
+
+LEGACY_FORMAT = "%d-%m-%Y %H:%M:%S"
+TARIFFS = [(2.5, 20.0), (1.9, 11.0), (0.33, 7.5), (3.0, 4.0), (5.25, 999.0)]
+
+
+def random_sessions(count, seed=12):
+    rng = random.Random(seed)
+    sessions = []
+    for _ in range(count):
+        start = datetime(2020, 1, 1) + timedelta(seconds=rng.randrange(5 * 365 * 86400))
+        # short, same-day, overnight and multi-week sessions, plus a few with the clock running backwards
+        length = rng.choice([rng.randrange(0, 300), rng.randrange(300, 86400), rng.randrange(86400, 40 * 86400),
+                             -rng.randrange(1, 7200)])
+        tariff, daytariff = rng.choice(TARIFFS)
+        sessions.append((start, start + timedelta(seconds=length), tariff, daytariff))
+    return sessions
+
+
+def test_price_batch_matches_calculate_price():
+    sessions = random_sessions(5000)
+    started = tariff_engine.to_datetime64([s.strftime(LEGACY_FORMAT) for s, _, _, _ in sessions])
+    stopped = tariff_engine.to_datetime64([e.strftime(LEGACY_FORMAT) for _, e, _, _ in sessions])
+    price, hours, days = tariff_engine.price_batch(started, stopped, [t for *_, t, _ in sessions], [d for *_, d in sessions])
+
+    for i, (start, stop, tariff, daytariff) in enumerate(sessions):
+        expected = calculate_price({"tariff": tariff, "daytariff": daytariff}, "1",
+                                   {"started": start.strftime(LEGACY_FORMAT), "stopped": stop.strftime(LEGACY_FORMAT)})
+        assert (price[i], hours[i], days[i]) == expected
+
+
+def test_price_batch_running_sessions_and_hotel_guests():
+    now = datetime(2024, 5, 2, 9, 30, 15, 250000)
+    started = tariff_engine.to_datetime64(["01-05-2024 08:00:00", "02-05-2024 09:00:00", "02-05-2024 09:00:00"])
+    stopped = tariff_engine.to_datetime64([None, None, "02-05-2024 10:00:00"])
+    price, hours, days = tariff_engine.price_batch(started, stopped, [2.5] * 3, [20.0] * 3,
+                                                   hotel_guest=[False, False, True], now=now)
+    assert list(price) == [40.0, 2.5, 0.0]
+    assert list(hours) == [26, 1, 0]
+    assert list(days) == [2, 0, 0]
+
+
+def test_rate_batch_matches_calculate_rate():
+    rng = np.random.default_rng(3)
+    minutes = np.concatenate([rng.uniform(0, 1440, 3000), rng.uniform(1440, 60 * 1440, 3000), [0.0, 1440.0, 2880.0]])
+    tariffs = np.array([TARIFFS[i % len(TARIFFS)] for i in range(len(minutes))])
+    rates = tariff_engine.rate_batch(minutes, tariffs[:, 0], tariffs[:, 1])
+
+    for m, (tariff, day_tariff), rate in zip(minutes, tariffs, rates):
+        assert rate == calculate_rate(float(m), "2024-05-01 08:00:00", float(tariff), float(day_tariff))
+
+
+def test_minutes_between_and_mixed_inputs():
+    started = tariff_engine.to_datetime64([datetime(2024, 5, 1, 8, 0), "2024-05-01 08:00:00", "01-05-2024 08:00:00"])
+    stopped = tariff_engine.to_datetime64(["2024-05-01 09:30:30"] * 3)
+    assert list(tariff_engine.minutes_between(started, stopped)) == [90.5] * 3
@@ -0,0 +1,46 @@
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+
+from timeutil import parse_timestamp, format_timestamp, minutes_between, naive, to_epoch
+
+
+@pytest.mark.parametrize("text,expected", [
+    ("2024-05-01 08:00:00", datetime(2024, 5, 1, 8, 0)),
+    ("2024-05-01T08:00:00", datetime(2024, 5, 1, 8, 0)),
+    ("2024-05-01T08:00:00.250000", datetime(2024, 5, 1, 8, 0, 0, 250000)),
+    ("2024-05-01", datetime(2024, 5, 1)),
+    ("01-05-2024 08:00:00", datetime(2024, 5, 1, 8, 0)),
+    ("01-05-2024 08:00:00.123+02:00", datetime(2024, 5, 1, 8, 0)),  # payments: only the first 19 characters count
+    ("24-05-01 08:00:00", datetime(2024, 5, 1, 8, 0)),
+])
+def test_parse_formats(text, expected):
+    assert parse_timestamp(text) == expected
+
+
+def test_parse_iso_with_zone():
+    assert parse_timestamp("2020-03-25T20:29:47Z") == datetime(2020, 3, 25, 20, 29, 47, tzinfo=timezone.utc)
+    offset = parse_timestamp("2020-03-25T20:29:47+02:00")
+    assert offset.utcoffset() == timedelta(hours=2)
+    assert naive(offset) == datetime(2020, 3, 25, 20, 29, 47)
+
+
+def test_parse_native_and_missing_values():
+    moment = datetime(2024, 5, 1, 8, 0)
+    assert parse_timestamp(moment) is moment
+    assert parse_timestamp(date(2024, 5, 1)) == datetime(2024, 5, 1)
+    assert parse_timestamp(to_epoch(moment)) == moment
+    assert parse_timestamp(None) is None
+    assert parse_timestamp("None") is None
+    assert parse_timestamp("") is None
+
+
+def test_rejects_unknown_text():
+    with pytest.raises(ValueError):
+        parse_timestamp("yesterday")
+
+
+def test_format_and_minutes_between():
+    assert format_timestamp("01-05-2024 08:00:00") == "2024-05-01 08:00:00"
+    assert format_timestamp(None) is None
+    assert minutes_between("2024-05-01 08:00:00", datetime(2024, 5, 1, 9, 30, 30)) == 90.5
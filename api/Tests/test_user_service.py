@@ -1,7 +1,12 @@
+import asyncio
+import hashlib
+import threading
 import pytest
-from unittest.mock import patch
+from unittest.mock import patch, AsyncMock, Mock
+from argon2 import PasswordHasher
 from fastapi import HTTPException
 
+from services import user_service
 from services.user_service import UserService
 from models.user_models import UserRegister, UserLogin, User
 
@@ -28,7 +33,7 @@ def make_hashed_user(username="testuser", password="testpassword", uid="1"):
 # ------------------------
 # Existence and creation
 # ------------------------
-@patch("services.user_service.load_data_db_table", return_value=[])
+@patch("services.user_service.get_item_db", return_value=[])
 @patch("services.user_service.save_user")
 def test_create_user_success(mock_save, mock_load):
     user = UserRegister(username="newuser", password="pw", name="New User", email="n@example.com")
@@ -37,28 +42,31 @@ def test_create_user_success(mock_save, mock_load):
     mock_save.create_user.assert_called_once()
 
 
-@patch("services.user_service.load_data_db_table", return_value=[make_hashed_user(username="existing")])
+@patch("services.user_service.get_item_db", return_value=[make_hashed_user(username="existing")])
 def test_create_user_conflict(mock_load):
     user = UserRegister(username="existing", password="pw", name="Existing")
     with pytest.raises(HTTPException):
         UserService.create_user(user)
+    # Only whether a row exists matters: no password hashes over the wire
+    mock_load.assert_called_once_with("username", "existing", "users", columns=("id",), limit=1)
 
 
 # ------------------------
 # Authentication
 # ------------------------
 @patch("services.user_service.add_session")
-@patch("services.user_service.load_data_db_table", return_value=[make_hashed_user(username="loginuser", password="secret")])
+@patch("services.user_service.get_item_db", return_value=[make_hashed_user(username="loginuser", password="secret")])
 def test_authenticate_user_success(mock_load, mock_add_session):
     creds = UserLogin(username="loginuser", password="secret")
     resp = UserService.authenticate_user(creds)
+    mock_load.assert_called_once_with("username", "loginuser", "users")
     assert resp.message == "User logged in successfully"
     assert isinstance(resp.session_token, str)
     assert len(resp.session_token) > 0
     mock_add_session.assert_called_once()
 
 
-@patch("services.user_service.load_data_db_table", return_value=[])
+@patch("services.user_service.get_item_db", return_value=[])
 def test_authenticate_user_invalid(mock_load):
     creds = UserLogin(username="noone", password="bad")
     with pytest.raises(HTTPException):
@@ -76,7 +84,7 @@ def test_get_user_by_username(mock_get_item):
     assert u["email"] is not None
 
 
-@patch("services.user_service.load_data_db_table", return_value=[make_hashed_user(username="upduser")])
+@patch("services.user_service.get_item_db", return_value=[make_hashed_user(username="upduser")])
 @patch("services.user_service.save_user")
 def test_update_user_success(mock_save, mock_load):
     # the update_user in service expects a model with a username attribute
@@ -86,14 +94,14 @@ def test_update_user_success(mock_save, mock_load):
     mock_save.change_user.assert_called_once()
 
 
-@patch("services.user_service.load_data_db_table", return_value=[])
+@patch("services.user_service.get_item_db", return_value=[])
 def test_update_user_not_found(mock_load):
     user_data = User(username="nope", name="X", email="x@example.com")
     with pytest.raises(HTTPException):
         UserService.update_user(user_data)
 
 
-@patch("services.user_service.load_data_db_table", return_value=[make_hashed_user(username="deluser")])
+@patch("services.user_service.get_item_db", return_value=[make_hashed_user(username="deluser")])
 @patch("services.user_service.save_user")
 def test_delete_user_success(mock_save, mock_load):
     res = UserService.delete_user("deluser")
@@ -101,7 +109,65 @@ def test_delete_user_success(mock_save, mock_load):
     mock_save.delete_user.assert_called_once()
 
 
-@patch("services.user_service.load_data_db_table", return_value=[])
+@patch("services.user_service.get_item_db", return_value=[])
 def test_delete_user_not_found(mock_load):
     with pytest.raises(HTTPException):
         UserService.delete_user("missing")
+
+
+@patch("services.user_service.get_item_db", return_value=[make_hashed_user(username="loginuser", password="secret")])
+def test_authenticate_user_wrong_password(mock_load):
+    creds = UserLogin(username="loginuser", password="wrong")
+    with pytest.raises(HTTPException) as exc:
+        UserService.authenticate_user(creds)
+    assert exc.value.status_code == 401
+
+
+def make_stale_user():
+    # Hashed with weaker argon2 parameters than the service's hasher uses
+    user = make_hashed_user(username="olduser")
+    user["password"] = PasswordHasher(time_cost=1, memory_cost=8192).hash(hashlib.md5(b"secret").hexdigest())
+    return user
+
+
+@patch("services.user_service.add_session")
+@patch("services.user_service.save_user")
+@patch("services.user_service.get_item_db", return_value=[make_stale_user()])
+def test_authenticate_user_rehashes_stale_hash(mock_load, mock_save, mock_add_session):
+    resp = UserService.authenticate_user(UserLogin(username="olduser", password="secret"))
+    assert resp.message == "User logged in successfully"
+    saved = mock_save.change_user.call_args[0][0]
+    assert saved["id"] == "1"
+    assert UserService.verify_password(saved["password"], hashlib.md5(b"secret").hexdigest())
+
+
+@patch("services.user_service.add_session")
+@patch("services.user_service.get_item_db_async", new_callable=AsyncMock, return_value=[make_hashed_user(username="asyncuser", password="secret")])
+def test_authenticate_user_async(mock_load, mock_add_session):
+    resp = asyncio.run(UserService.authenticate_user_async(UserLogin(username="asyncuser", password="secret")))
+    assert resp.message == "User logged in successfully"
+    mock_add_session.assert_called_once()
+
+    with pytest.raises(HTTPException):
+        asyncio.run(UserService.authenticate_user_async(UserLogin(username="asyncuser", password="bad")))
+
+
+@patch("services.user_service.add_session")
+@patch("services.user_service.save_user")
+@patch("services.user_service.get_item_db_async", new_callable=AsyncMock, return_value=[make_stale_user()])
+def test_authenticate_user_async_rehashes_on_the_hash_pool(mock_load, mock_save, mock_add_session):
+
+    hashed_on = []
+
+    def recording_hash(password):
+        hashed_on.append(threading.current_thread().name)
+        return PasswordHasher().hash(password)
+
+    ph = Mock(wraps=user_service.ph, hash=Mock(side_effect=recording_hash))
+    with patch.object(user_service, "ph", ph):
+        resp = asyncio.run(UserService.authenticate_user_async(UserLogin(username="olduser", password="secret")))
+
+    assert resp.message == "User logged in successfully"
+    assert len(hashed_on) == 1 and hashed_on[0].startswith("argon2")
+    saved = mock_save.change_user.call_args[0][0]
+    assert UserService.verify_password(saved["password"], hashlib.md5(b"secret").hexdigest())
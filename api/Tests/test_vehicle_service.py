@@ -1,7 +1,10 @@
 from unittest.mock import patch
 import pytest
 from unittest.mock import patch
+from datetime import datetime
+from fastapi import HTTPException
 from services.vehicle_service import VehicleService
+from storage_utils import Page
 from services.user_service import *
 from models.user_models import * 
 
@@ -74,13 +77,11 @@ def test_get_vehicle_id_reservations_mocked(auth_header):
 
 
 # @staticmethod
-#     def get_vehicle_history(token : str, vid : str): 
-#         """Get the vehicle history"""
+#     def get_vehicle_history(token : str, vid : str, page=None, since=None, until=None): 
 #         session_user = ValidationService.validate_session_token(token)
 #         VehicleService.checkForVehicle(session_user, vid)
 #         lp = VehicleService.liscensce_plate_for_id(vid)
-#         ssn = load_data.load_parking_sessions()
-#         return [s for s in ssn if s["licenseplate"] == lp]
+#         return list_vehicle_history(lp, page or Page(), since, until)
 
 def test_get_vehicle_id_history_mock(auth_header):
     token = "fake-token-1"
@@ -88,13 +89,11 @@ def test_get_vehicle_id_history_mock(auth_header):
 
 
     with patch("services.validation_service.ValidationService.validate_session_token") as mock_validate, \
-         patch("services.vehicle_service.load_data.load_parking_sessions") as mock_load, \
+         patch("services.vehicle_service.list_vehicle_history") as mock_history, \
          patch("services.vehicle_service.VehicleService.liscensce_plate_for_id") as mock_plate_load, \
          patch("services.vehicle_service.VehicleService.checkForVehicle") as mock_check :
         
-        mock_load.return_value = [
-                     {"id":"1","parking_lot_id":"1","licenseplate":"JO-227-4","started":"2021-03-25T20:29:47Z","stopped":"2020-03-26T05:10:47Z","user":"natasjadewit","duration_minutes":521,"cost":16.5,"payment_status":"paid"},
-                     {"id":"2","parking_lot_id":"1","licenseplate":"JO-110-4","started":"2022-03-25T20:29:47Z","stopped":"2020-03-26T05:10:47Z","user":"natasjadewit","duration_minutes":521,"cost":16.5,"payment_status":"paid"},
+        mock_history.return_value = [
                      {"id":"3","parking_lot_id":"1","licenseplate":"76-ACB-7","started":"2023-03-25T20:29:47Z","stopped":"2020-03-26T05:10:47Z","user":"natasjadewit","duration_minutes":521,"cost":16.5,"payment_status":"paid"}
                      ]
         
@@ -102,13 +101,24 @@ def test_get_vehicle_id_history_mock(auth_header):
         mock_validate.return_value = {"id": "1", "username": "user1", "role": "USER"}
         mock_check.return_value = None
 
-        result = VehicleService.get_vehicle_history(token, vid)
+        since = datetime(2023, 1, 1)
+        result = VehicleService.get_vehicle_history(token, vid, since=since)
     
         assert isinstance(result, list)
-        assert len(result) >= 1                   # only one item matches vehicle_id == "1"
+        assert len(result) == 1
+        # served by the indexed query for the vehicle's plate, not the JSON archive
+        mock_history.assert_called_once_with("76-ACB-7", Page(), since, None)
       
         mock_validate.assert_called_once_with(token)
         mock_check.assert_called_once_with(mock_validate.return_value, vid)
+
+def test_get_vehicle_history_bad_cursor():
+    with patch("services.validation_service.ValidationService.validate_session_token"), \
+         patch("services.vehicle_service.VehicleService.checkForVehicle"), \
+         patch("services.vehicle_service.VehicleService.liscensce_plate_for_id", return_value="76-ACB-7"):
+        with pytest.raises(HTTPException) as exc:
+            VehicleService.get_vehicle_history("token", "1", Page(after="garbage", limit=10))
+    assert exc.value.status_code == 400
     
 
 def test_get_all_vehicles_for_user_mocked():
@@ -229,3 +239,14 @@ def test_delete_vehicle_mocked():
         # ensure save was called
         mock_save.delete_vehicle.assert_called_once_with(fake_vehicle_id)
         # ensure save was called with the remaining list (no deleted vehicle)
+
+
+def test_check_for_liscense_id_uses_indexed_lookup():
+    with patch("services.vehicle_service.get_item_db") as mock_get_item:
+        mock_get_item.return_value = [mock_user_vehicles[0]]
+        with pytest.raises(HTTPException):
+            VehicleService.check_for_liscense_id("76-ACB-7")
+        mock_get_item.assert_called_once_with("license_plate", "76-ACB-7", "vehicles", columns=("id",), limit=1)
+
+        mock_get_item.return_value = []
+        assert VehicleService.check_for_liscense_id("NEW-123") is None
@@ -0,0 +1,95 @@
+import contextvars
+import json
+import logging
+import os
+import random
+import sys
+import time
+from contextlib import contextmanager
+
+# Fields bound for the current request (request id, method, path, user), copied into every record
+request_context = contextvars.ContextVar("request_context", default={})
+
+_configured = False
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: timestamp, level, logger, message, request context and extra fields"""
+
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        entry.update(request_context.get())
+        fields = getattr(record, "fields", None)
+        if fields:
+            entry.update(fields)
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Keep only a fraction of DEBUG/INFO records; WARNING and above always pass"""
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record):
+        rate = self.rates.get(record.levelno, 1.0)
+        return rate >= 1.0 or random.random() < rate
+
+
+def configure_logging(level=None, debug_sample_rate=None, info_sample_rate=None, stream=None):
+    """Configure the `mobypark` logger tree once from LOG_LEVEL / LOG_*_SAMPLE_RATE"""
+    global _configured
+    root = logging.getLogger("mobypark")
+    if _configured and level is None:
+        return root
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+
+    handler = logging.StreamHandler(stream or sys.stderr)
+    handler.setFormatter(JsonFormatter())
+    handler.addFilter(SamplingFilter({
+        logging.DEBUG: float(debug_sample_rate if debug_sample_rate is not None else os.environ.get("LOG_DEBUG_SAMPLE_RATE", 0.01)),
+        logging.INFO: float(info_sample_rate if info_sample_rate is not None else os.environ.get("LOG_INFO_SAMPLE_RATE", 1.0)),
+    }))
+    root.addHandler(handler)
+    root.setLevel(level or os.environ.get("LOG_LEVEL", "INFO").upper())
+    root.propagate = False
+    _configured = True
+    return root
+
+
+def get_logger(name):
+    configure_logging()
+    return logging.getLogger(f"mobypark.{name}")
+
+
+def fields(**kwargs):
+    """Structured fields for a log call: logger.info("msg", extra=fields(user=...))"""
+    return {"fields": kwargs}
+
+
+@contextmanager
+def bind_context(**kwargs):
+    """Add fields to the request context for the duration of the block"""
+    token = request_context.set({**request_context.get(), **kwargs})
+    try:
+        yield
+    finally:
+        request_context.reset(token)
+
+
+def token_hint(token):
+    """Shortened token that is safe to log"""
+    return f"{token[:8]}…" if token else None
+
+
+def elapsed_ms(started):
+    return round((time.perf_counter() - started) * 1000, 2)
@@ -0,0 +1,98 @@
+"""Requests/sec of the real GET /payments route with its blocking work on the event loop vs. on the DB executor.
+
+MySQL is replaced by a connection that sleeps QUERY_MS per statement (a round-trip) and the
+session store is the MySQL one without its local cache, so every request does two queries: the
+session lookup and the payments page. "inline" runs whatever the route hands to
+run_in_db_executor directly on the event loop, as the routes did before; "executor" is the
+route as it is. Run from the api folder:  python -m benchmarks.bench_async_routes
+"""
+import asyncio
+import json
+import logging
+import time
+from datetime import datetime
+from decimal import Decimal
+from unittest.mock import patch
+
+import httpx
+
+import FastApiServer
+import session_manager
+from session_store import MySQLSessionStore
+
+QUERY_MS = 10
+REQUESTS_PER_LEVEL = 1000
+CONCURRENCY_LEVELS = (50, 100, 250, 500)
+TOKEN = "bench-token"
+COLUMNS = ("id", "transaction", "amount", "initiator", "created_at", "completed", "hash")
+ROWS = [(i, f"tx{i}", Decimal("2.50"), "alice", datetime(2025, 1, 1, 9, 0), None, "h") for i in range(1, 21)]
+
+
+class SlowCursor:
+    column_names = COLUMNS
+
+    def execute(self, sql, params=()):
+        time.sleep(QUERY_MS / 1000)
+
+    def fetchone(self):
+        return (json.dumps({"username": "alice", "role": "USER"}),)
+
+    def fetchall(self):
+        return ROWS
+
+    def close(self):
+        pass
+
+
+class SlowConnection:
+    def cursor(self, **kwargs):
+        return SlowCursor()
+
+    def statement(self, sql):
+        return SlowCursor()
+
+    def commit(self):
+        pass
+
+    def consume_results(self):
+        pass
+
+    def close(self):
+        pass
+
+
+async def inline(func, *args, **kwargs):
+    return func(*args, **kwargs)
+
+
+async def run_level(concurrency):
+    transport = httpx.ASGITransport(app=FastApiServer.app)
+    sem = asyncio.Semaphore(concurrency)
+    headers = {"Authorization": f"Bearer {TOKEN}"}
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def one():
+            async with sem:
+                r = await client.get("/payments?limit=20", headers=headers)
+                r.raise_for_status()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(REQUESTS_PER_LEVEL)))
+        return REQUESTS_PER_LEVEL / (time.perf_counter() - started)
+
+
+async def main():
+    # One access log line per request would drown the table
+    FastApiServer.logger.setLevel(logging.WARNING)
+    store = MySQLSessionStore(cache_ttl=0, connection_factory=SlowConnection)
+    with patch.object(session_manager, "store", store), \
+            patch("storage_utils.get_db_connection", side_effect=SlowConnection):
+        print(f"{'clients':>8} {'inline req/s':>14} {'executor req/s':>15}")
+        for concurrency in CONCURRENCY_LEVELS:
+            with patch.object(FastApiServer, "run_in_db_executor", inline):
+                inline_rps = await run_level(concurrency)
+            executor_rps = await run_level(concurrency)
+            print(f"{concurrency:>8} {inline_rps:>14.0f} {executor_rps:>15.0f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
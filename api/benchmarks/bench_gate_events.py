@@ -0,0 +1,238 @@
+"""Gate camera traffic: one auto_start / auto_stop call per event vs. the batched gate event queue.
+
+Replays camera traffic at SPEEDUPS times its recorded rate (10x peak, and 20x to find the limit). Pass a recording (NDJSON, one
+GateEvent per line, in time order); without one, a peak hour is synthesised: LOTS lots with
+PEAK_PER_SECOND events per second between them, cars staying a few minutes to a few hours
+(so the replay sees both entries and exits), DOUBLE_READS of entries read twice and RESENDS of
+camera requests sent again. Each lot's camera posts what it read every POST_INTERVAL seconds.
+
+MySQL is simulated: every statement and commit costs ROUND_TRIP_MS. The per-event path is
+charged the statements auto_start_parking (INSERT, commit, counter UPDATE, SELECT, commit) and
+auto_stop_parking (SELECT sessions, UPDATE, commit, counter UPDATE, SELECT, commit) make, on
+POOL_SIZE connections. The batched path runs the real GateEventQueue and apply_batch on a
+fake connection that keeps the active sessions in memory.
+Reports throughput, the time from a camera's post to its acknowledgement and the statements run.
+Run from the api folder:  python -m benchmarks.bench_gate_events [recording.ndjson]
+"""
+import json
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+import gate_events
+from gate_events import GateEventQueue, apply_batch
+from models.parking_models import GateEvent
+
+ROUND_TRIP_MS = 1.0
+POOL_SIZE = 10
+SPEEDUPS = (10, 20)
+LOTS = 100
+PEAK_PER_SECOND = 150
+RECORDING_SECONDS = 60
+POST_INTERVAL = 2.0
+DOUBLE_READS = 0.05
+RESENDS = 0.03
+START_STATEMENTS = 5
+STOP_STATEMENTS = 6
+
+
+def round_trip(count=1):
+    time.sleep(count * ROUND_TRIP_MS / 1000)
+
+
+def synthesise(seconds=RECORDING_SECONDS, rate=PEAK_PER_SECOND, seed=7):
+    """Peak-hour events: half of them entries, the other half exits of cars that came earlier"""
+    rng = random.Random(seed)
+    base = datetime(2025, 3, 3, 8, 0)
+    events, parked, plate = [], [], 0
+    for i in range(seconds * rate):
+        at = base + timedelta(seconds=i / rate)
+        if parked and rng.random() < 0.5:
+            lot, car = parked.pop(rng.randrange(len(parked)))
+            events.append(GateEvent(lot_id=lot, licenseplate=car, direction="out", timestamp=at))
+        else:
+            plate += 1
+            lot = str(rng.randrange(1, LOTS + 1))
+            car = f"{plate:02d}-BNC-{plate % 97}"
+            parked.append((lot, car))
+            events.append(GateEvent(lot_id=lot, licenseplate=car, direction="in", timestamp=at))
+            if rng.random() < DOUBLE_READS:
+                events.append(GateEvent(lot_id=lot, licenseplate=car, direction="in", timestamp=at))
+    return events
+
+
+def load_recording(path):
+    with open(path) as f:
+        return [GateEvent.model_validate_json(line) for line in f if line.strip()]
+
+
+def camera_posts(events, speedup, seed=7):
+    """[(replay second, events)]: per lot, what its camera read during each POST_INTERVAL, plus resends"""
+    rng = random.Random(seed)
+    start = events[0].timestamp
+    posts = {}
+    for event in events:
+        window = int((event.timestamp - start).total_seconds() // POST_INTERVAL)
+        posts.setdefault((window, event.lot_id), []).append(event)
+    # Cameras aren't synchronised: each lot posts at its own offset within the interval
+    phase = {lot: rng.random() * POST_INTERVAL for lot in {event.lot_id for event in events}}
+    schedule = []
+    for (window, lot), batch in posts.items():
+        at = ((window + 1) * POST_INTERVAL + phase[lot]) / speedup
+        schedule.append((at, batch))
+        if rng.random() < RESENDS:
+            schedule.append((at + 0.5 / speedup, batch))
+    return sorted(schedule, key=lambda post: post[0])
+
+
+class FakeDatabase:
+    """Active sessions by plate, updated by the statements apply_batch runs"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.active = {}
+        self.next_id = 1
+        self.statements = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.statements += 1
+        round_trip()
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class FakeCursor:
+    def __init__(self, db):
+        self.db = db
+        self.rows = []
+
+    def execute(self, sql, params=()):
+        db = self.db
+        db.statements += 1
+        round_trip()
+        verb = sql.split()[0]
+        with db.lock:
+            if verb == "SELECT" and "FOR UPDATE" in sql:
+                self.rows = [(db.active[p][0], p, db.active[p][1], db.active[p][2]) for p in params if p in db.active]
+            elif verb == "SELECT":
+                counts = {}
+                for p in params:
+                    counts[db.active[p][1]] = counts.get(db.active[p][1], 0) + 1
+                self.rows = list(counts.items())
+            elif verb == "INSERT":
+                width = len(gate_events.SESSION_COLUMNS)
+                for i in range(0, len(params), width):
+                    lot, plate, started, stopped = params[i:i + 4]
+                    if stopped is None:
+                        db.active[plate] = (db.next_id, lot, started)
+                    db.next_id += 1
+            elif "parking_sessions" in sql:
+                closed = set(params[-sql.count("WHEN") // 3:])
+                db.active = {p: s for p, s in db.active.items() if s[0] not in closed}
+
+    def fetchall(self):
+        return self.rows
+
+    def close(self):
+        pass
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+
+def replay(schedule, send):
+    """Post each camera batch at its replay time; send(batch, on_done) acknowledges asynchronously"""
+    latencies, done = [], threading.Event()
+    remaining = [len(schedule)]
+    lock = threading.Lock()
+    started = time.perf_counter()
+
+    for at, batch in schedule:
+        delay = at - (time.perf_counter() - started)
+        if delay > 0:
+            time.sleep(delay)
+        posted = time.perf_counter()
+
+        def acknowledged(posted=posted):
+            with lock:
+                latencies.append(time.perf_counter() - posted)
+                remaining[0] -= 1
+                if remaining[0] == 0:
+                    done.set()
+        send(batch, acknowledged)
+    done.wait()
+    return time.perf_counter() - started, latencies
+
+
+def per_event(schedule):
+    executor = ThreadPoolExecutor(max_workers=POOL_SIZE)
+    statements = [0]
+
+    def handle(event):
+        count = START_STATEMENTS if event.direction == "in" else STOP_STATEMENTS
+        statements[0] += count
+        round_trip(count)
+
+    def send(batch, acknowledged):
+        futures = [executor.submit(handle, event) for event in batch]
+        left = [len(futures)]
+        lock = threading.Lock()
+
+        def one_done(_):
+            with lock:
+                left[0] -= 1
+                if left[0] == 0:
+                    acknowledged()
+        for future in futures:
+            future.add_done_callback(one_done)
+
+    elapsed, latencies = replay(schedule, send)
+    executor.shutdown()
+    return elapsed, latencies, statements[0], None
+
+
+def batched(schedule):
+    db = FakeDatabase()
+    queue = GateEventQueue(lambda batch: apply_batch(db, batch))
+
+    def send(batch, acknowledged):
+        queue.submit(batch).add_done_callback(lambda _: acknowledged())
+
+    with patch("gate_events.get_parking_lot_row", return_value={"tariff": 2.5, "daytariff": 20.0}), \
+            patch("gate_events.shift_occupied", lambda cursor, deltas: cursor.execute("UPDATE parking_lots", ())):
+        elapsed, latencies = replay(schedule, send)
+    queue.close()
+    return elapsed, latencies, db.statements, queue.metrics()
+
+
+def main():
+    events = load_recording(sys.argv[1]) if len(sys.argv) > 1 else synthesise()
+    recorded = (events[-1].timestamp - events[0].timestamp).total_seconds()
+    print(f"{len(events)} events over {recorded:.0f}s from {len({e.lot_id for e in events})} lots")
+    print(f"{'speedup':>8} {'path':>10} {'offered/s':>10} {'events/s':>9} {'ack p50 ms':>11} {'ack p99 ms':>11} {'statements':>11}")
+    for speedup in SPEEDUPS:
+        schedule = camera_posts(events, speedup)
+        sent = sum(len(batch) for _, batch in schedule)
+        for name, run in (("per event", per_event), ("batched", batched)):
+            elapsed, latencies, statements, metrics = run(schedule)
+            print(f"{speedup:>7}x {name:>10} {sent / recorded * speedup:>10.0f} {sent / elapsed:>9.0f} "
+                  f"{percentile(latencies, 0.5) * 1000:>11.1f} {percentile(latencies, 0.99) * 1000:>11.1f} {statements:>11}")
+            if metrics:
+                print(f"{'':>19} {json.dumps(metrics)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""List endpoints: whole list vs. keyset page vs. NDJSON stream, for a large payments table.
+
+MySQL is replaced by a cursor that generates rows on demand (fetchall materialises the whole
+result, like a buffered cursor; fetchmany hands out one chunk at a time, like a server-side
+cursor), so the numbers cover what the API process does: decoding, encoding and holding rows.
+Reports response size, time to first byte, total time and peak Python memory.
+Run from the api folder:  python -m benchmarks.bench_list_endpoints [rows]
+"""
+import json
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from decimal import Decimal
+from unittest.mock import patch
+
+import storage_utils
+from FastApiServer import ndjson_lines, _json_default
+from storage_utils import Page
+
+COLUMNS = ("id", "transaction", "amount", "initiator", "created_at", "completed", "date",
+           "method", "issuer", "bank", "hash", "session_id", "parking_lot_id")
+BASE = datetime(2024, 1, 1)
+
+
+class GeneratedCursor:
+    def __init__(self, count):
+        self.count = count
+        self.column_names = COLUMNS
+        self._rows = None
+
+    def execute(self, sql, params=()):
+        limit = params[-1] if "LIMIT" in sql else self.count
+        after = int(params[-2] if "LIMIT" in sql else params[-1]) if "id >" in sql else 0
+        stop = min(self.count, after + limit)
+        self._rows = (
+            (i, f"tx{i:010d}", Decimal("12.50"), "alice", BASE + timedelta(minutes=i), BASE + timedelta(minutes=i + 1),
+             BASE + timedelta(minutes=i), "ideal", "ING", "ING", "f" * 32, i, i % 1500)
+            for i in range(after + 1, stop + 1)
+        )
+
+    def fetchall(self):
+        return list(self._rows)
+
+    def fetchmany(self, size):
+        return [row for _, row in zip(range(size), self._rows)]
+
+    def close(self):
+        pass
+
+
+class GeneratedConnection:
+    def __init__(self, count):
+        self.count = count
+
+    def cursor(self, **kwargs):
+        return GeneratedCursor(self.count)
+
+    def statement(self, sql):
+        return GeneratedCursor(self.count)
+
+    def consume_results(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def whole_list():
+    rows = storage_utils.get_item_db("initiator", "alice", "payments")
+    yield json.dumps([dict(row) for row in rows], default=_json_default)
+
+
+def first_page():
+    page = Page(limit=100)
+    rows = storage_utils.list_rows("payments", page, "initiator", "alice")
+    yield json.dumps([dict(row) for row in rows], default=_json_default)
+
+
+def ndjson_stream():
+    return ndjson_lines(storage_utils.list_rows("payments", Page(stream=True), "initiator", "alice"))
+
+
+def measure(body):
+    tracemalloc.start()
+    started = time.perf_counter()
+    first = None
+    size = 0
+    for chunk in body():
+        if first is None:
+            first = time.perf_counter() - started
+        size += len(chunk)
+    total = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return size, first, total, peak
+
+
+def main(count):
+    print(f"payments table with {count} rows")
+    print(f"{'mode':14} {'bytes':>12} {'first byte':>11} {'total':>9} {'peak MB':>9}")
+    with patch("storage_utils.get_db_connection", return_value=GeneratedConnection(count)):
+        for name, body in (("whole list", whole_list), ("page of 100", first_page), ("ndjson stream", ndjson_stream)):
+            size, first, total, peak = measure(body)
+            print(f"{name:14} {size:>12} {first * 1000:>9.1f}ms {total:>8.2f}s {peak / 2**20:>9.1f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
@@ -0,0 +1,192 @@
+"""Statement preparation per request: SQL text built and sent per call vs. cached prepared statements.
+
+Three ways to run the change_data UPDATE and get_item_db SELECT of one request:
+
+  text              the SQL built per call (the f-string / comma counting code change_data had) and
+                    sent as text, which the server parses and plans every time
+  prepare per call  query_builder SQL, prepared, executed and closed for every request
+  cached            query_builder SQL on the prepared statement cached with the pooled connection
+                    (what storage_utils does)
+
+The real mysql-connector cursors run against a fake wire connection that answers every command
+after ROUND_TRIP_MS, so the numbers are the client's CPU time plus the round-trips each way
+costs. The driver resets a prepared statement (one round-trip) before every execution, so a
+cached statement still takes two round-trips where text takes one; what it saves is the server's
+parsing and planning, which only a real server shows:  --mysql runs the same three against the
+MYSQL_* database (the UPDATE inside a transaction that is rolled back). Where text comes out
+ahead, MYSQL_STATEMENT_CACHE_SIZE=0 makes the pool hand out plain cursors instead.
+Run from the api folder:  python -m benchmarks.bench_query_builder [--mysql] [requests]
+"""
+import sys
+import time
+from unittest.mock import patch
+
+from mysql.connector.connection import MySQLConnection
+
+import query_builder
+import storage_utils
+from db_pool import ConnectionPool, connect_mysql
+
+ROUND_TRIP_MS = 0.2
+REQUESTS = 2000
+COLUMNS = ("id", "username", "name", "email", "role")
+ROW = (1, "alice", "Alice", "alice@example.com", "USER")
+DESCRIPTION = [(name, 253, None, None, None, None, 1, 0, 45) for name in COLUMNS]
+
+
+class Wire(MySQLConnection):
+    """A MySQLConnection that never connects: every command costs a round-trip and is counted"""
+
+    def __init__(self):
+        super().__init__()
+        self.commands = 0
+        self.statements = {}
+        self.set_charset_collation("utf8mb4")
+        self.set_converter_class(self._converter_class)
+        self._sql_mode = ""
+
+    def round_trip(self):
+        self.commands += 1
+        time.sleep(ROUND_TRIP_MS / 1000)
+
+    def is_connected(self):
+        return True
+
+    def handle_unread_result(self):
+        pass
+
+    @staticmethod
+    def _ok():
+        return {"affected_rows": 1, "insert_id": 0, "warning_count": 0, "status_flag": 0}
+
+    @staticmethod
+    def _selects(statement):
+        return statement.lstrip().upper().startswith(b"SELECT")
+
+    def cmd_query(self, query, *args, **kwargs):
+        self.round_trip()
+        query = query if isinstance(query, bytes) else query.encode()
+        return {"columns": DESCRIPTION, "eof": {"status_flag": 0, "warning_count": 0}} if self._selects(query) else self._ok()
+
+    def cmd_stmt_prepare(self, statement):
+        self.round_trip()
+        statement_id = len(self.statements) + 1
+        self.statements[statement_id] = statement
+        return {"statement_id": statement_id, "parameters": [None] * statement.count(b"?"), "columns": []}
+
+    def cmd_stmt_reset(self, statement_id):
+        self.round_trip()
+
+    def cmd_stmt_execute(self, statement_id, data=(), parameters=(), flags=0):
+        self.round_trip()
+        return (1, DESCRIPTION, {"status_flag": 0, "warning_count": 0}) if self._selects(self.statements[statement_id]) else self._ok()
+
+    def cmd_stmt_close(self, statement_id):
+        # COM_STMT_CLOSE has no reply
+        pass
+
+    def get_rows(self, count=None, binary=False, columns=None, raw=None, prep_stmt=None):
+        self.unread_result = False
+        return [ROW], {"status_flag": 0, "warning_count": 0}
+
+
+def legacy_update(table, values, condition):
+    """change_data's statement as it was built before query_builder (its WHERE interpolated the key)"""
+    columns = list(values.keys())
+    update_values = [values[k] for k in columns if k != condition]
+    set_sql = f"""UPDATE {table}\n SET """
+    count = 0
+    for c in columns:
+        if not c == condition:
+            if count + 1 != len(columns) - 1:
+                set_sql += f"{c} = %s, \n "
+            else:
+                set_sql += f"{c} = %s \n "
+            count += 1
+    set_sql += f"\n WHERE {condition} = {values[condition]}"
+    return set_sql, update_values
+
+
+def request_values(i):
+    return {"id": i, "name": f"User {i}", "email": f"user{i}@example.com", "role": "USER"}
+
+
+def text(conn, i):
+    cursor = conn.cursor()
+    cursor.execute("""
+                   SELECT * FROM users
+                   WHERE username = %s
+                   """, ("alice",))
+    cursor.fetchall()
+    cursor.execute(*legacy_update("users", request_values(i), "id"))
+    cursor.close()
+
+
+def prepare_per_call(conn, i):
+    for sql, params in ((query_builder.select_sql("users", "username"), ("alice",)),
+                        query_builder.update("users", request_values(i))):
+        cursor = conn.cursor(prepared=True)
+        cursor.execute(sql, params)
+        if sql.startswith("SELECT"):
+            cursor.fetchall()
+        cursor.close()
+
+
+class Rollback(Exception):
+    pass
+
+
+def cached(conn, i):
+    try:
+        with storage_utils.unit_of_work():
+            storage_utils.get_item_db("username", "alice", "users")
+            storage_utils.change_data("users", request_values(i), "id")
+            raise Rollback
+    except Rollback:
+        pass
+
+
+def run(connect, requests):
+    print(f"{'strategy':>17} {'us/request':>11} {'round-trips':>12}")
+    for name, handle in (("text", text), ("prepare per call", prepare_per_call), ("cached", cached)):
+        raw = connect()
+        pool = ConnectionPool(size=1, factory=lambda: raw)
+        before = getattr(raw, "commands", 0)
+        with patch("storage_utils.get_pool", return_value=pool):
+            started = time.perf_counter()
+            for i in range(1, requests + 1):
+                if handle is cached:
+                    handle(None, i)
+                else:
+                    with pool.connection() as conn:
+                        handle(conn, i)
+                        conn.rollback()
+            elapsed = time.perf_counter() - started
+        trips = f"{(raw.commands - before) / requests:.1f}" if hasattr(raw, "commands") else "-"
+        print(f"{name:>17} {elapsed / requests * 1e6:>11.0f} {trips:>12}")
+        pool.close_all()
+
+
+def build_cost(requests):
+    """Client CPU spent building the two statements, without any I/O"""
+    for name, build in (("per call", lambda i: legacy_update("users", request_values(i), "id")),
+                        ("query_builder", lambda i: query_builder.update("users", request_values(i)))):
+        started = time.perf_counter()
+        for i in range(requests):
+            build(i)
+        print(f"build UPDATE {name:>14}: {(time.perf_counter() - started) / requests * 1e6:.2f} us")
+
+
+def main():
+    args = [a for a in sys.argv[1:] if a != "--mysql"]
+    requests = int(args[0]) if args else REQUESTS
+    build_cost(requests * 10)
+    if "--mysql" in sys.argv:
+        run(connect_mysql, requests)
+    else:
+        print(f"fake server, {ROUND_TRIP_MS} ms per round-trip, {requests} requests")
+        run(Wire, requests)
+
+
+if __name__ == "__main__":
+    main()
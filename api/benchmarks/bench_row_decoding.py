@@ -0,0 +1,57 @@
+"""Row decoding: dictionary cursor + normalize_row (everything to str) vs. typed slotted records.
+
+Measures the Python side of a listing only (the rows are already fetched), with the row shape
+of parking_sessions. Run from the api folder:  python -m benchmarks.bench_row_decoding [count]
+"""
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from row_types import decode_rows
+
+COLUMNS = ("id", "parking_lot_id", "licenseplate", "started", "stopped", "user",
+           "duration_minutes", "cost", "payment_status")
+
+
+def normalize_row(row):
+    # storage_utils.normalize_row before typed rows
+    return {k: str(v) for k, v in row.items()}
+
+
+def old_decode(columns, rows):
+    # the dictionary cursor builds a dict per row, then every value became a string
+    return [normalize_row(dict(zip(columns, row))) for row in rows]
+
+
+def new_decode(columns, rows):
+    return decode_rows("parking_sessions", columns, rows)
+
+
+def measure(func, rows):
+    started = time.perf_counter()
+    func(COLUMNS, rows)
+    elapsed = time.perf_counter() - started
+    tracemalloc.start()
+    result = func(COLUMNS, rows)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return len(rows) / elapsed, size / len(rows)
+
+
+def main(count):
+    base = datetime(2024, 1, 1)
+    rows = [(i, i % 50, f"AB-{i % 1000:03d}-C", base + timedelta(minutes=i), base + timedelta(minutes=i + 90),
+             f"user{i % 500}", 90, Decimal("7.50"), "paid") for i in range(count)]
+
+    print(f"{count} parking_sessions rows")
+    print(f"{'decoder':22} {'rows/s':>10} {'bytes/row':>10}")
+    for name, func in (("dict + normalize_row", old_decode), ("typed records", new_decode)):
+        speed, size = measure(func, rows)
+        print(f"{name:22} {speed:>10.0f} {size:>10.0f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000)
@@ -0,0 +1,62 @@
+"""Pricing throughput: the scalar calculate_price / calculate_rate loops vs. the vectorized tariff engine.
+
+Sessions are synthetic, so no database is needed. Run from the api folder:
+    python -m benchmarks.bench_tariff_engine [sessions]
+"""
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+import tariff_engine
+from services.parking_service import calculate_rate
+from session_calculator import calculate_price
+
+LEGACY_FORMAT = "%d-%m-%Y %H:%M:%S"
+
+
+def make_sessions(count):
+    rng = random.Random(1)
+    rows = []
+    for _ in range(count):
+        start = datetime(2020, 1, 1) + timedelta(seconds=rng.randrange(5 * 365 * 86400))
+        stop = start + timedelta(seconds=rng.randrange(60, 3 * 86400))
+        rows.append((start.strftime(LEGACY_FORMAT), stop.strftime(LEGACY_FORMAT), 2.5, 20.0))
+    return rows
+
+
+def timed(func):
+    started = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - started
+
+
+def main(count):
+    rows = make_sessions(count)
+    lot = {"tariff": 2.5, "daytariff": 20.0}
+
+    scalar, scalar_s = timed(lambda: [calculate_price(lot, "1", {"started": s, "stopped": e}) for s, e, _, _ in rows])
+
+    def vectorized():
+        started = tariff_engine.to_datetime64([r[0] for r in rows])
+        stopped = tariff_engine.to_datetime64([r[1] for r in rows])
+        return tariff_engine.price_batch(started, stopped, np.full(count, 2.5), np.full(count, 20.0))
+    (price, _, _), vector_s = timed(vectorized)
+    assert [p for p, _, _ in scalar] == list(price)
+
+    minutes = np.random.default_rng(1).uniform(0, 3 * 1440, count)
+    start = "2024-05-01 08:00:00"
+    rates, rate_scalar_s = timed(lambda: [calculate_rate(m, start, 2.5, 20.0) for m in minutes.tolist()])
+    batch, rate_vector_s = timed(lambda: tariff_engine.rate_batch(minutes, 2.5, 20.0))
+    assert rates == list(batch)
+
+    print(f"{count} sessions")
+    print(f"{'':16} {'scalar s':>10} {'batch s':>10} {'speedup':>9}")
+    print(f"{'calculate_price':16} {scalar_s:>10.2f} {vector_s:>10.2f} {scalar_s / vector_s:>8.0f}x")
+    print(f"{'calculate_rate':16} {rate_scalar_s:>10.2f} {rate_vector_s:>10.3f} {rate_scalar_s / rate_vector_s:>8.0f}x")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000)
@@ -0,0 +1,56 @@
+"""Timestamp parsing: the strptime loops the services used vs. timeutil.parse_timestamp.
+
+A session listing parses the same few thousand distinct timestamps over and over, so both a
+"unique" (every value distinct, no cache hits) and a "listing" (values repeat) workload are
+measured. Run from the api folder:  python -m benchmarks.bench_timestamps [count]
+"""
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+from timeutil import parse_timestamp, _parse_string
+
+FORMATS = {
+    "canonical": "%Y-%m-%d %H:%M:%S",
+    "legacy": "%d-%m-%Y %H:%M:%S",
+    "iso": "%Y-%m-%dT%H:%M:%S",
+}
+
+
+def old_to_dt(v):
+    # ReservationService.get_reservation before the time layer
+    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%dT%H:%M:%S.%f"):
+        try:
+            return datetime.strptime(v.replace("Z", ""), fmt)
+        except ValueError:
+            continue
+
+
+def rate(func, values):
+    started = time.perf_counter()
+    for v in values:
+        func(v)
+    return len(values) / (time.perf_counter() - started)
+
+
+def main(count):
+    rng = random.Random(1)
+    base = datetime(2020, 1, 1)
+    moments = [base + timedelta(seconds=rng.randrange(5 * 365 * 86400)) for _ in range(count)]
+    distinct = moments[:2000]
+    listing = [rng.choice(distinct) for _ in range(count)]
+
+    print(f"{count} timestamps (parses/s)")
+    print(f"{'format':10} {'workload':9} {'strptime':>10} {'timeutil':>10} {'speedup':>8}")
+    for name, fmt in FORMATS.items():
+        for workload, values in (("unique", moments), ("listing", listing)):
+            texts = [m.strftime(fmt) for m in values]
+            _parse_string.cache_clear()
+            old = rate(old_to_dt if name == "iso" else (lambda v, fmt=fmt: datetime.strptime(v, fmt)), texts)
+            new = rate(parse_timestamp, texts)
+            print(f"{name:10} {workload:9} {old:>10.0f} {new:>10.0f} {new / old:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000)
@@ -0,0 +1,278 @@
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
+import mysql.connector
+
+
+def connect_mysql():
+    """Open a raw MySQL connection using the MYSQL_* environment variables"""
+    return mysql.connector.connect(
+        host=os.environ.get("MYSQL_HOST", "127.0.0.1"),
+        port=int(os.environ.get("MYSQL_PORT", 3307)),
+        user=os.environ.get("MYSQL_USER", "stilstaan"),
+        password=os.environ.get("MYSQL_PASSWORD", "stil"),
+        database=os.environ.get("MYSQL_DATABASE", "mobypark"),
+    )
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection could be checked out within the timeout"""
+
+
+class PooledConnection:
+    """Wraps a raw connection; close() hands it back to the pool instead of closing it"""
+
+    def __init__(self, pool, raw):
+        self._pool = pool
+        self._raw = raw
+        self._released = False
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def statement(self, sql):
+        """The cursor to execute sql on: its prepared statement, kept with the connection across checkouts"""
+        return self._pool.statement(self._raw, sql)
+
+    def close(self):
+        if not self._released:
+            self._released = True
+            self._pool.release(self._raw)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class ConnectionPool:
+    """Thread-safe, bounded pool of MySQL connections.
+
+    Connections are opened lazily up to `size`, pinged before reuse once they have been
+    idle longer than `ping_interval`, and closed when idle longer than `idle_timeout`.
+    Callers block for at most `timeout` seconds waiting for a free connection.
+
+    Every connection keeps up to `statement_cache_size` prepared statements (least recently used
+    ones are closed first); they live as long as the connection does. With a size of 0 statements
+    go out as plain text queries instead.
+    """
+
+    def __init__(self, size=10, timeout=5.0, idle_timeout=300.0, ping_interval=30.0, factory=connect_mysql,
+                 statement_cache_size=64):
+        if size < 1:
+            raise ValueError("Pool size must be at least 1")
+        self.size = size
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.ping_interval = ping_interval
+        self._factory = factory
+        self.statement_cache_size = statement_cache_size
+        self._statements = {}  # id(raw connection) -> OrderedDict(sql -> prepared cursor)
+        self._idle = deque()  # (raw connection, time it was returned)
+        self._open = 0
+        self._in_use = 0
+        self._waiters = 0
+        self._cond = threading.Condition()
+        self._stats = {
+            "checkouts": 0,
+            "timeouts": 0,
+            "created": 0,
+            "evicted": 0,
+            "failed_health_checks": 0,
+            "checkout_wait_total": 0.0,
+            "checkout_wait_max": 0.0,
+            "statements_prepared": 0,
+            "statement_cache_hits": 0,
+        }
+
+    # --------------------------
+    # Checkout / return
+    # --------------------------
+
+    def acquire(self, timeout=None) -> PooledConnection:
+        timeout = self.timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+
+        with self._cond:
+            self._evict_idle()
+            self._waiters += 1
+            try:
+                while not self._idle and self._open >= self.size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats["timeouts"] += 1
+                        raise PoolTimeout(f"No database connection available within {timeout}s")
+                    self._cond.wait(remaining)
+            finally:
+                self._waiters -= 1
+
+            if self._idle:
+                raw, returned_at = self._idle.pop()
+            else:
+                raw, returned_at = None, None
+                self._open += 1
+            self._in_use += 1
+
+        # Network work (connect / ping) happens outside the lock
+        try:
+            if raw is not None and not self._healthy(raw, returned_at):
+                self._discard(raw)
+                raw = None
+                with self._cond:
+                    self._stats["failed_health_checks"] += 1
+            if raw is None:
+                raw = self._factory()
+                with self._cond:
+                    self._stats["created"] += 1
+        except Exception:
+            with self._cond:
+                self._open -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+        waited = time.monotonic() - started
+        with self._cond:
+            self._stats["checkouts"] += 1
+            self._stats["checkout_wait_total"] += waited
+            self._stats["checkout_wait_max"] = max(self._stats["checkout_wait_max"], waited)
+        return PooledConnection(self, raw)
+
+    def release(self, raw):
+        # Never hand a connection with an open transaction to the next caller
+        try:
+            if getattr(raw, "in_transaction", False):
+                raw.rollback()
+        except Exception:
+            self._discard(raw)
+            with self._cond:
+                self._open -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            return
+
+        with self._cond:
+            self._in_use -= 1
+            self._idle.append((raw, time.monotonic()))
+            self._cond.notify()
+
+    def connection(self, timeout=None) -> PooledConnection:
+        """Check out a connection for use in a `with` block"""
+        return self.acquire(timeout)
+
+    # --------------------------
+    # Prepared statements
+    # --------------------------
+
+    def statement(self, raw, sql):
+        if self.statement_cache_size <= 0:
+            return raw.cursor()
+        # Only the thread that has raw checked out touches its statements
+        with self._cond:
+            statements = self._statements.setdefault(id(raw), OrderedDict())
+        cursor = statements.get(sql)
+        if cursor is not None:
+            statements.move_to_end(sql)
+            with self._cond:
+                self._stats["statement_cache_hits"] += 1
+            return cursor
+        # Prepared on its first execute(); the same sql object is executed on it after that
+        cursor = raw.cursor(prepared=True)
+        statements[sql] = cursor
+        while len(statements) > self.statement_cache_size:
+            _, evicted = statements.popitem(last=False)
+            try:
+                evicted.close()
+            except Exception:
+                pass
+        with self._cond:
+            self._stats["statements_prepared"] += 1
+        return cursor
+
+    # --------------------------
+    # Maintenance
+    # --------------------------
+
+    def _healthy(self, raw, returned_at) -> bool:
+        if time.monotonic() - returned_at < self.ping_interval:
+            return True
+        try:
+            raw.ping(reconnect=False)
+            return True
+        except Exception:
+            return False
+
+    def _evict_idle(self):
+        # Called with the lock held; the oldest connections sit at the left of the deque
+        now = time.monotonic()
+        while self._idle and now - self._idle[0][1] > self.idle_timeout:
+            raw, _ = self._idle.popleft()
+            self._open -= 1
+            self._stats["evicted"] += 1
+            self._discard(raw)
+
+    def _discard(self, raw):
+        # The server drops a connection's prepared statements when it closes
+        with self._cond:
+            self._statements.pop(id(raw), None)
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+    def close_all(self):
+        with self._cond:
+            while self._idle:
+                raw, _ = self._idle.popleft()
+                self._open -= 1
+                self._discard(raw)
+            self._cond.notify_all()
+
+    def metrics(self) -> dict:
+        with self._cond:
+            checkouts = self._stats["checkouts"]
+            return {
+                "size": self.size,
+                "open": self._open,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "waiters": self._waiters,
+                "checkouts": checkouts,
+                "timeouts": self._stats["timeouts"],
+                "created": self._stats["created"],
+                "evicted": self._stats["evicted"],
+                "failed_health_checks": self._stats["failed_health_checks"],
+                "checkout_wait_avg_ms": (self._stats["checkout_wait_total"] / checkouts * 1000) if checkouts else 0.0,
+                "checkout_wait_max_ms": self._stats["checkout_wait_max"] * 1000,
+                "prepared_statements": sum(len(statements) for statements in self._statements.values()),
+                "statements_prepared": self._stats["statements_prepared"],
+                "statement_cache_hits": self._stats["statement_cache_hits"],
+            }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """Return the process-wide pool, creating it from MYSQL_POOL_* settings on first use"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    size=int(os.environ.get("MYSQL_POOL_SIZE", 10)),
+                    timeout=float(os.environ.get("MYSQL_POOL_TIMEOUT", 5)),
+                    idle_timeout=float(os.environ.get("MYSQL_POOL_IDLE_TIMEOUT", 300)),
+                    ping_interval=float(os.environ.get("MYSQL_POOL_PING_INTERVAL", 30)),
+                    statement_cache_size=int(os.environ.get("MYSQL_STATEMENT_CACHE_SIZE", 64)),
+                )
+    return _pool
+
+
+def pool_metrics() -> dict:
+    return get_pool().metrics()
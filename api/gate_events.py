@@ -0,0 +1,389 @@
+"""Batched ingestion of ANPR gate events: a camera read a plate entering or leaving a lot.
+
+POST /gate-events takes an array of events. Before, each event was one auto_start_parking /
+auto_stop_parking call with several round-trips. Now events go into an in-process queue and a
+single worker thread applies them in grouped transactions:
+
+- duplicates are dropped: an event (lot, plate, direction, timestamp) that is already queued
+  or was applied recently is counted but not applied again;
+- a batch is coalesced per plate: the plate's events are replayed in time order against its
+  active session, so an entry and an exit in the same batch become one closed session, and
+  repeated reads of one entry collapse into a single start;
+- a batch is one transaction: one locking read of the active sessions, one UPDATE closing
+  sessions, one multi-row INSERT and one counter UPDATE per lot.
+
+Delivery is at least once. A request is answered only after all of its events are committed
+(or quarantined), so a camera that gets an error or no answer sends the batch again. The
+duplicate checks, the active_plate index and the natural key on
+(parking_lot_id, licenseplate, started) make such a replay harmless. When more than
+`max_pending` events are waiting, new events are refused (QueueFull, a 503 for the camera)
+instead of the queue growing without bound.
+
+A batch that fails is retried. If the database rejects it for a reason other than a deadlock,
+lock wait or lost connection, the batch is applied again one plate per transaction, and the
+plates that still fail are written to import_quarantine (stage "gate_events").
+"""
+import json
+import threading
+import time
+from collections import OrderedDict, defaultdict, deque
+from concurrent.futures import Future, InvalidStateError
+
+import mysql.connector
+from mysql.connector import errorcode
+
+from app_logging import get_logger, fields
+from occupancy import shift_occupied
+from seed_pipeline import quarantine
+from services.parking_service import calculate_rate, system_user
+from storage_utils import get_db_connection, get_parking_lot_row, history_summary_cache
+from timeutil import format_timestamp, minutes_between, naive
+
+logger = get_logger("gate_events")
+
+# Seconds a request waits for its events to be stored before it is told to send them again
+ACK_TIMEOUT = 30.0
+
+# Failures worth retrying the whole batch for; anything else is a problem with the data
+TRANSIENT_ERRORS = {
+    errorcode.ER_LOCK_DEADLOCK, errorcode.ER_LOCK_WAIT_TIMEOUT,
+    errorcode.CR_SERVER_LOST, errorcode.CR_SERVER_GONE_ERROR,
+}
+
+SESSION_COLUMNS = ("parking_lot_id", "licenseplate", "started", "stopped", "user",
+                   "duration_minutes", "cost", "payment_status")
+
+
+class QueueFull(Exception):
+    """More events are waiting than the queue holds; send them again later"""
+
+
+def event_key(event):
+    """(lot id, plate, direction, timestamp) of a GateEvent; also the key duplicates are detected on"""
+    return str(event.lot_id), event.licenseplate, event.direction, naive(event.timestamp)
+
+
+# --------------------------
+# Applying a batch
+# --------------------------
+def plan(events, active):
+    """Replay events against the active sessions.
+
+    events are event_key tuples; active is {plate: (session id, lot id, started)}.
+    Returns (closes, inserts, ignored): closes are (session id, lot id, started, stopped) of active
+    sessions that end, inserts are (lot id, plate, started, stopped) of new sessions, with stopped
+    None for one that is still open, and ignored counts the events that changed nothing.
+    """
+    by_plate = defaultdict(list)
+    for event in events:
+        by_plate[event[1]].append(event)
+    closes, inserts, ignored = [], [], 0
+    for plate, plate_events in by_plate.items():
+        plate_events.sort(key=lambda e: e[3])
+        session = active.get(plate)
+        for lot_id, _, direction, at in plate_events:
+            if direction == "in":
+                if session:
+                    # The same entry read twice, or the exit was never seen
+                    ignored += 1
+                else:
+                    session = (None, lot_id, at)
+            elif session is None or at < session[2]:
+                ignored += 1
+            else:
+                session_id, session_lot, started = session
+                if session_id is None:
+                    inserts.append((session_lot, plate, started, at))
+                else:
+                    closes.append((session_id, session_lot, started, at))
+                session = None
+        if session and session[0] is None:
+            inserts.append((session[1], plate, session[2], None))
+    return closes, inserts, ignored
+
+
+def price(lot_id, started, stopped):
+    """(minutes, cost) of a session, priced like stop_parking_session; cost None without the lot's tariffs"""
+    minutes = minutes_between(started, stopped)
+    lot = get_parking_lot_row(lot_id) or {}
+    tariff = lot.get("tariff")
+    day_tariff = lot.get("day_tariff", lot.get("daytariff"))
+    if tariff is None or day_tariff is None:
+        return minutes, None
+    return minutes, calculate_rate(minutes, started, float(tariff), float(day_tariff))
+
+
+def _marks(values):
+    return ", ".join(["%s"] * len(values))
+
+
+def close_sql(count):
+    cases = " ".join(["WHEN %s THEN %s"] * count)
+    return f"""
+        UPDATE parking_sessions
+        SET stopped = CASE id {cases} END,
+            duration_minutes = CASE id {cases} END,
+            cost = CASE id {cases} END,
+            payment_status = 'pending'
+        WHERE id IN ({', '.join(['%s'] * count)}) AND stopped IS NULL
+        """
+
+
+def insert_sql(count):
+    placeholders = "(" + _marks(SESSION_COLUMNS) + ")"
+    # A replayed session hits the natural key and is left as it is
+    return f"""
+        INSERT INTO parking_sessions ({', '.join(SESSION_COLUMNS)})
+        VALUES {', '.join([placeholders] * count)}
+        ON DUPLICATE KEY UPDATE id = id
+        """
+
+
+def apply_batch(conn, events):
+    """Apply events in one transaction; returns the plan (closes, inserts, ignored)"""
+    plates = sorted({event[1] for event in events})
+    cursor = conn.cursor()
+    try:
+        # Lock the plates' active sessions (in a fixed order); the gap locks keep other
+        # workers from starting a session for these plates until this batch commits
+        cursor.execute(
+            f"""
+            SELECT id, licenseplate, parking_lot_id, started FROM parking_sessions
+            WHERE active_plate IN ({_marks(plates)}) ORDER BY active_plate FOR UPDATE
+            """,
+            plates
+        )
+        active = {plate: (session_id, str(lot_id), started) for session_id, plate, lot_id, started in cursor.fetchall()}
+        closes, inserts, ignored = plan(events, active)
+        deltas = defaultdict(int)
+
+        if closes:
+            priced = [(session_id, stopped, *price(lot_id, started, stopped))
+                      for session_id, lot_id, started, stopped in closes]
+            params = [v for session_id, stopped, _, _ in priced for v in (session_id, stopped)]
+            params += [v for session_id, _, minutes, _ in priced for v in (session_id, minutes)]
+            params += [v for session_id, _, _, cost in priced for v in (session_id, cost)]
+            cursor.execute(close_sql(len(priced)), params + [p[0] for p in priced])
+            for _, lot_id, _, _ in closes:
+                deltas[lot_id] -= 1
+
+        if inserts:
+            rows = []
+            for lot_id, plate, started, stopped in inserts:
+                if stopped is None:
+                    rows.append((lot_id, plate, started, None, system_user["username"], 0, None, None))
+                else:
+                    minutes, cost = price(lot_id, started, stopped)
+                    rows.append((lot_id, plate, started, stopped, system_user["username"], minutes, cost, "pending"))
+            cursor.execute(insert_sql(len(rows)), [v for row in rows for v in row])
+            opened = [plate for _, plate, _, stopped in inserts if stopped is None]
+            if opened:
+                # Replayed starts were skipped by the insert; count what is actually open now
+                cursor.execute(
+                    f"""
+                    SELECT parking_lot_id, COUNT(*) FROM parking_sessions
+                    WHERE active_plate IN ({_marks(opened)}) GROUP BY parking_lot_id
+                    """,
+                    opened
+                )
+                for lot_id, count in cursor.fetchall():
+                    deltas[str(lot_id)] += count
+
+        shift_occupied(cursor, deltas)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+    for plate in plates:
+        history_summary_cache.invalidate(plate)
+    return closes, inserts, ignored
+
+
+def write_events(events):
+    """Store a batch: one transaction, or one per plate when the database rejects the batch"""
+    conn = get_db_connection()
+    try:
+        try:
+            apply_batch(conn, events)
+            return
+        except mysql.connector.Error as e:
+            if e.errno in TRANSIENT_ERRORS:
+                raise
+            logger.warning("gate event batch rejected, applying per plate", extra=fields(events=len(events), error=str(e)))
+
+        by_plate = defaultdict(list)
+        for event in events:
+            by_plate[event[1]].append(event)
+        rejected = []
+        for plate, plate_events in by_plate.items():
+            try:
+                apply_batch(conn, plate_events)
+            except mysql.connector.Error as e:
+                if e.errno in TRANSIENT_ERRORS:
+                    raise
+                rejected += [(None, plate, json.dumps(event, default=format_timestamp), repr(e)) for event in plate_events]
+        if rejected:
+            cursor = conn.cursor()
+            try:
+                quarantine(cursor, "gate_events", "", rejected)
+                conn.commit()
+            finally:
+                cursor.close()
+            logger.error("gate events quarantined", extra=fields(events=len(rejected)))
+    finally:
+        conn.close()
+
+
+# --------------------------
+# Queue
+# --------------------------
+class _Ticket:
+    """What one request waits for: all of its new events, and the queued events it repeated"""
+
+    def __init__(self, received, duplicates, applied):
+        self.future = Future()
+        self.result = {"received": received, "duplicates": duplicates, "applied": applied}
+        self.waiting = 0
+
+    def _settle(self, method, value):
+        try:
+            method(value)
+        except InvalidStateError:
+            pass
+
+    def done(self, error=None):
+        if self.future.done():
+            return
+        if error is not None:
+            self._settle(self.future.set_exception, error)
+            return
+        self.waiting -= 1
+        if self.waiting == 0:
+            self._settle(self.future.set_result, self.result)
+
+
+class GateEventQueue:
+    """Deduplicating group-commit queue in front of write_events"""
+
+    def __init__(self, write=None, batch_size=1000, linger=0.02, max_pending=20000,
+                 max_attempts=5, retry_delay=0.1, remember=100000, clock=time.monotonic):
+        self._write = write or write_events
+        self.batch_size = batch_size
+        self.linger = linger
+        self.max_pending = max_pending
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.remember = remember
+        self._clock = clock
+        self._cond = threading.Condition()
+        self._queue = deque()
+        # key -> tickets waiting for it, for queued and in-flight events
+        self._pending = {}
+        # keys of recently applied events, oldest first
+        self._applied = OrderedDict()
+        self._worker = None
+        self._closed = False
+        self._stats = {"received": 0, "duplicates": 0, "rejected": 0, "batches": 0, "applied": 0, "failed": 0}
+
+    def submit(self, events):
+        """Queue events; returns a Future with {received, duplicates, applied} once they are all stored.
+        Raises QueueFull, accepting none of them, when they don't fit."""
+        keys = [event_key(event) for event in events]
+        with self._cond:
+            fresh, repeated, seen = [], set(), set()
+            for key in keys:
+                if key in seen or key in self._applied:
+                    pass
+                elif key in self._pending:
+                    repeated.add(key)
+                else:
+                    fresh.append(key)
+                seen.add(key)
+            if len(self._pending) + len(fresh) > self.max_pending:
+                self._stats["rejected"] += len(keys)
+                raise QueueFull(f"{len(self._pending)} gate events waiting")
+
+            ticket = _Ticket(len(keys), len(keys) - len(fresh), len(fresh))
+            ticket.waiting = len(fresh) + len(repeated)
+            for key in fresh:
+                self._pending[key] = [ticket]
+                self._queue.append(key)
+            for key in repeated:
+                self._pending[key].append(ticket)
+            self._stats["received"] += len(keys)
+            self._stats["duplicates"] += len(keys) - len(fresh)
+            if ticket.waiting == 0:
+                ticket.future.set_result(ticket.result)
+            else:
+                self._start()
+                self._cond.notify_all()
+        return ticket.future
+
+    def _start(self):
+        if self._worker is None or not self._worker.is_alive():
+            self._closed = False
+            self._worker = threading.Thread(target=self._run, name="gate-events", daemon=True)
+            self._worker.start()
+
+    def _take(self):
+        """Wait for events, then up to `linger` longer so concurrent requests share a batch"""
+        with self._cond:
+            while not self._queue and not self._closed:
+                self._cond.wait()
+            deadline = self._clock() + self.linger
+            while len(self._queue) < self.batch_size and not self._closed:
+                remaining = deadline - self._clock()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            return [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+
+    def _run(self):
+        while True:
+            batch = self._take()
+            if not batch:
+                return
+            self._finish(batch, self._store(batch))
+
+    def _store(self, batch):
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                self._write(batch)
+                return None
+            except Exception as e:
+                logger.warning("gate event batch failed", exc_info=True, extra=fields(events=len(batch), attempt=attempt))
+                if attempt == self.max_attempts:
+                    return e
+                time.sleep(self.retry_delay * attempt)
+
+    def _finish(self, batch, error):
+        with self._cond:
+            for key in batch:
+                tickets = self._pending.pop(key)
+                if error is None:
+                    self._applied[key] = None
+                for ticket in tickets:
+                    ticket.done(error)
+            while len(self._applied) > self.remember:
+                self._applied.popitem(last=False)
+            self._stats["batches"] += 1
+            self._stats["failed" if error else "applied"] += len(batch)
+
+    def close(self, timeout=None):
+        """Stop the worker once the queued events are stored"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._worker:
+            self._worker.join(timeout)
+
+    def metrics(self):
+        with self._cond:
+            return {**self._stats, "pending": len(self._pending), "queued": len(self._queue)}
+
+
+gate_queue = GateEventQueue()
+
+submit_gate_events = gate_queue.submit
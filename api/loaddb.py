@@ -1,28 +1,21 @@
 import json 
+import mmap
 import pathlib
 import os 
-import csv
-from datetime import datetime
+import re
+from timeutil import parse_timestamp
 
 class load_data :
 
+    # All three accept any format timeutil knows; the names stay for the existing callers
     def time_convert(time : str):
-        if not time:
-            return None 
-        return datetime.fromisoformat(time.replace("Z", "+00:00"))
-    
+        return parse_timestamp(time)
+
     def payment_time_convert(time : str):
-        if not time:
-            return None 
-        return datetime.strptime(time[:19], '%d-%m-%Y %H:%M:%S')
-    
+        return parse_timestamp(time)
+
     def parking_sesh_time_convert(time : str):
-        if not time:
-            return None 
-        return datetime.strptime(
-        time.replace("T", " "), 
-        "%Y-%m-%d %H:%M:%S%z"
-    )
+        return parse_timestamp(time)
     
 
     def load_users():
@@ -98,7 +91,8 @@ class load_data :
                 })
             return rows
         
-    def load_parking_sessions():
+    def parking_session_files():
+        """Session files under ../data/pdata in lot order (p1-sessions.json, p2-sessions.json, ...)"""
         route = pathlib.Path('../data/pdata')
         files = []
         for (root, dirs, file) in os.walk(route):
@@ -107,56 +101,206 @@ class load_data :
                     files.append(f)
 
         files.sort(key = lambda f : int(f.replace("-sessions.json","").replace("p","")))
+        return [f'../data/pdata/{t}' for t in files]
+
+    def parking_session_row(u):
+        return {
+            "parking_lot_id": u["parking_lot_id"],
+            "licenseplate":u["licenseplate"],
+            "started":load_data.parking_sesh_time_convert(u["started"]),
+            "stopped":load_data.parking_sesh_time_convert(u["stopped"]),
+            "user":u["user"],
+            "duration_minutes":u["duration_minutes"],
+            "cost":u["cost"],
+            "payment_status":u["payment_status"],
+        }
+
+    def load_parking_sessions():
         rows = []
-        for t in files:
-            with open(f'../data/pdata/{t}', 'r') as file:
-                data = json.load(file)               
-                for u in data:
-                    rows.append({
-                        "parking_lot_id": data[u]["parking_lot_id"],
-                        "licenseplate":data[u]["licenseplate"],
-                        "started":load_data.parking_sesh_time_convert(data[u]["started"]),
-                        "stopped":load_data.parking_sesh_time_convert(data[u]["stopped"]),
-                        "user":data[u]["user"],
-                        "duration_minutes":data[u]["duration_minutes"],
-                        "cost":data[u]["cost"],
-                        "payment_status":data[u]["payment_status"],
-
-                    })
+        for path in load_data.parking_session_files():
+            rows.extend(load_data.iter_parking_sessions(path))
         return rows
+
+    def iter_parking_sessions(path):
+        """Stream the sessions of one pdata file without loading the whole file"""
+        for _, u in iter_json_items(path):
+            yield load_data.parking_session_row(u)
             
-    def load_payments():
-        with open('../data/payments.json', 'r') as f:
-            txt = f.read()
-
-        # Try to recover everything before the corruption
-        try:
-            data = json.loads(txt)
-        except json.JSONDecodeError as e:
-            cut = e.pos
-            recovered = txt[:cut]
-
-            # Try to wrap it in a valid array
-            if recovered.rstrip().endswith('}'):
-                recovered += ']'
-        
-            data = json.loads(recovered)
-            rows = []
-            for u in data:
-               
-                rows.append({
-                    "transaction": u.get("transaction"),
-                    "amount":  u.get("amount"),
-                    "initiator":  u.get("initiator"),
-                    "created_at": load_data.payment_time_convert(u.get('created_at')),
-                    "completed": load_data.payment_time_convert(u.get('completed')),
-                    "date":load_data.time_convert(u["t_data"].get('date')),
-                    "method":u["t_data"].get('method'),
-                    "issuer":u["t_data"].get('issuer'),
-                    "bank":u["t_data"].get('bank'),
-                    "hash": u.get("hash"),
-                    "session_id":u.get("session_id"),
-                    "parking_lot_id":u.get("parking_lot_id")
-                })
-            return rows
+    def load_payments(path='../data/payments.json'):
+        """All payments that survive corruption in payments.json; skipped byte ranges are printed"""
+        rows = []
+        for _, u in salvage_json_records(path, on_skip=lambda start, end: print(f"{path}: skipped corrupted bytes {start}-{end}")):
+            rows.append(load_data.payment_row(u))
+        return rows
+
+    def payment_row(u):
+        return {
+            "transaction": u.get("transaction"),
+            "amount":  u.get("amount"),
+            "initiator":  u.get("initiator"),
+            "created_at": load_data.payment_time_convert(u.get('created_at')),
+            "completed": load_data.payment_time_convert(u.get('completed')),
+            "date":load_data.time_convert(u["t_data"].get('date')),
+            "method":u["t_data"].get('method'),
+            "issuer":u["t_data"].get('issuer'),
+            "bank":u["t_data"].get('bank'),
+            "hash": u.get("hash"),
+            "session_id":u.get("session_id"),
+            "parking_lot_id":u.get("parking_lot_id")
+        }
+
+    def iter_payments(path='../data/payments.json', on_skip=None):
+        """Stream payments.json record by record, stepping over corrupted regions"""
+        for _, u in salvage_json_records(path, on_skip):
+            yield load_data.payment_row(u)
+
+
+_decoder = json.JSONDecoder()
+_WS = " \t\n\r"
+
+def iter_json_items(path, chunk_size=1 << 20, max_record=16 << 20):
+    """Incrementally parse a top-level JSON array or object.
+
+    Yields (index, value) for an array and (key, value) for an object while holding at most
+    one chunk plus one partial record in memory. A value that still doesn't parse after
+    `max_record` characters is treated as corrupt rather than read to the end of the file.
+    """
+    with open(path, 'r') as f:
+        buf = f.read(chunk_size)
+        eof = not buf
+        pos = 0
+
+        def fill():
+            nonlocal buf, pos, eof
+            more = f.read(chunk_size)
+            if not more:
+                eof = True
+            buf = buf[pos:] + more
+            pos = 0
+
+        def skip_ws():
+            nonlocal pos
+            while True:
+                while pos < len(buf) and buf[pos] in _WS:
+                    pos += 1
+                if pos < len(buf) or eof:
+                    return
+                fill()
+
+        def decode():
+            # A value only counts once a delimiter follows it, so a record split over two chunks is re-read whole
+            nonlocal pos
+            while True:
+                try:
+                    value, end = _decoder.raw_decode(buf, pos)
+                    if end < len(buf) or eof:
+                        pos = end
+                        return value
+                except json.JSONDecodeError:
+                    if eof or len(buf) - pos > max_record:
+                        raise
+                fill()
+
+        skip_ws()
+        if pos >= len(buf):
+            return
+        opener = buf[pos]
+        if opener not in "[{":
+            raise json.JSONDecodeError("Expected a JSON array or object", buf, pos)
+        closer = "]" if opener == "[" else "}"
+        pos += 1
+        index = 0
+        while True:
+            skip_ws()
+            if pos >= len(buf):
+                raise json.JSONDecodeError("Unexpected end of file", buf, pos)
+            if buf[pos] == closer:
+                return
+            if buf[pos] == ",":
+                pos += 1
+                skip_ws()
+            if opener == "{":
+                key = decode()
+                skip_ws()
+                if pos >= len(buf) or buf[pos] != ":":
+                    raise json.JSONDecodeError("Expected ':'", buf, pos)
+                pos += 1
+                skip_ws()
+            else:
+                key = index
+            yield key, decode()
+            index += 1
+            if pos > chunk_size:
+                fill()
+
+
+_ARRAY_OPEN = re.compile(rb"\s*\[")
+_SEPARATORS = re.compile(r"[\s,]*")
+# Where the next array element that is an object starts, used to resynchronise after corruption
+_RECORD_START = re.compile(rb"[\[,]\s*\{")
+
+def salvage_json_records(path, on_skip=None, chunk_size=1 << 20, max_record=16 << 20):
+    """Recover every well-formed object from a top-level JSON array, even when parts are corrupt.
+
+    The file is memory-mapped and decoded one window of about `chunk_size` bytes at a time, so
+    memory stays bounded on multi-GB files. Yields (byte offset, record). When a record doesn't
+    parse, scanning resumes at the next `, {` boundary and on_skip(start, end) receives the
+    skipped byte range.
+    """
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            size = len(mm)
+            opened = _ARRAY_OPEN.match(mm)
+            if not opened:
+                raise json.JSONDecodeError("Expected a JSON array", "", 0)
+
+            # text is the decoded window mm[pos - (bytes of text[:cur]) : end], cur the cursor in it
+            text, cur, pos, end, ascii = "", 0, opened.end(), opened.end(), True
+
+            def window(start, length=chunk_size):
+                nonlocal text, cur, pos, end, ascii
+                raw = mm[start:start + length]
+                # surrogateescape round-trips every byte, so char slices re-encode to exact byte lengths
+                text = raw.decode('utf-8', 'surrogateescape')
+                cur, pos, end, ascii = 0, start, start + len(raw), text.isascii()
+
+            def advance(to):
+                nonlocal cur, pos
+                pos += to - cur if ascii else len(text[cur:to].encode('utf-8', 'surrogateescape'))
+                cur = to
+
+            window(pos)
+            while True:
+                advance(_SEPARATORS.match(text, cur).end())
+                if cur >= len(text):
+                    if end >= size:
+                        return  # closing bracket missing, nothing left to salvage
+                    window(pos)
+                    continue
+                if text[cur] == ']':
+                    return
+
+                try:
+                    record, stop = _decoder.raw_decode(text, cur)
+                    cut_off = stop >= len(text) and end < size
+                except json.JSONDecodeError as e:
+                    record = None
+                    # Errors at the window edge (or inside a string running past it) may just be the window
+                    cut_off = end < size and (e.pos >= len(text) - 16 or e.msg.startswith("Unterminated string"))
+
+                if cut_off and len(text) - cur < max_record:
+                    # Re-read with the record at the start of a (larger) window
+                    window(pos, chunk_size if cur else 2 * len(text))
+                    continue
+                if isinstance(record, dict) and not cut_off:
+                    yield pos, record
+                    advance(stop)
+                    continue
 
+                boundary = _RECORD_START.search(mm, pos + 1)
+                resume = boundary.end() - 1 if boundary else size
+                if on_skip:
+                    on_skip(pos, resume)
+                window(resume)
@@ -1,6 +1,6 @@
 from datetime import datetime
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 
 class DiscountBase(BaseModel):
     amount : Optional[int] = None
@@ -17,4 +17,16 @@ class DiscountCreate(BaseModel):
     code : Optional[str] = None 
     percentage : Optional[float]= None
     expiration_date : Optional[datetime]= None
-    user_id : Optional[int]= None
\ No newline at end of file
+    user_id : Optional[int]= None
+
+class DiscountBatch(BaseModel):
+    count : int
+    amount : Optional[int] = None
+    lot_id : Optional[int] = None
+    percentage : Optional[float]= None
+    expiration_date : Optional[datetime]= None
+    user_id : Optional[int]= None
+
+class DiscountBatchResult(BaseModel):
+    count : int
+    codes : List[str]
@@ -1,6 +1,7 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import Literal, Optional
 from datetime import datetime
+from models.timestamp import Timestamp
 
 class ParkingLotBase(BaseModel):
     id: Optional[str] = None
@@ -35,6 +36,25 @@ class ParkingLotResponse(BaseModel):
 
 class Session(BaseModel):
     licenseplate: str
-    started: str
-    stopped: Optional[str] = None
-    user: str
\ No newline at end of file
+    started: Timestamp
+    stopped: Optional[Timestamp] = None
+    user: str
+
+class ParkingLotOccupancy(BaseModel):
+    lot_id: str
+    capacity: int
+    reserved: int
+    occupied: int
+    available: int
+    updated_at: Optional[datetime] = None
+
+class GateEvent(BaseModel):
+    lot_id: str
+    licenseplate: str
+    direction: Literal["in", "out"]
+    timestamp: Timestamp
+
+class GateEventResult(BaseModel):
+    received: int
+    duplicates: int
+    applied: int
@@ -1,12 +1,13 @@
 from pydantic import BaseModel
 from typing import Optional, Dict, Any, List
+from models.timestamp import Timestamp
 
 class PaymentBase(BaseModel):
     transaction: str
     amount: float
     initiator: Optional[str] = None
-    created_at: str
-    completed: Optional[str] = None
+    created_at: Timestamp
+    completed: Optional[Timestamp] = None
     hash: str
 
 
@@ -31,8 +32,8 @@ class PaymentOut(BaseModel):
     amount: float
     initiator: Optional[str] = None
     processed_by: Optional[str] = None
-    created_at: str
-    completed: Optional[str] = None
+    created_at: Timestamp
+    completed: Optional[Timestamp] = None
     coupled_to: Optional[str] = None
     hash: str
     license_plate : str 
@@ -0,0 +1,15 @@
+from datetime import datetime
+from typing import Annotated
+
+from pydantic import BeforeValidator, PlainSerializer
+
+from timeutil import parse_timestamp, format_timestamp
+
+
+def _to_datetime(value):
+    # completed=False marks an open payment, not 1970-01-01
+    return None if value is False else parse_timestamp(value)
+
+
+# A native datetime inside the app; accepts every timeutil format and is sent as "YYYY-mm-dd HH:MM:SS"
+Timestamp = Annotated[datetime, BeforeValidator(_to_datetime), PlainSerializer(format_timestamp, return_type=str)]
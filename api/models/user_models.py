@@ -1,6 +1,7 @@
 from pydantic import BaseModel, EmailStr
 from typing import Optional
 from datetime import date
+from models.timestamp import Timestamp
 
 class UserRegister(BaseModel):
     username: str
@@ -45,7 +46,7 @@ class User(BaseModel):
     email: Optional[str] = None
     phone: Optional[str] = None
     role: Optional[str] = "USER"
-    created_at: Optional[str] = None  # Using string to match your date format
+    created_at: Optional[Timestamp] = None
     birth_year: Optional[int] = None
     active: Optional[bool] = True
     hotel_guest: Optional[bool] = False
@@ -60,6 +61,6 @@ class UserFull(BaseModel):
     email: Optional[str] = None
     phone: Optional[str] = None
     role: Optional[str] = "USER"
-    created_at: Optional[str] = None
+    created_at: Optional[Timestamp] = None
     birth_year: Optional[int] = None
     active: Optional[bool] = True
\ No newline at end of file
@@ -1,6 +1,7 @@
 #{"id":"1","user_id":"1","license_plate":"76-KQQ-7","make":"Peugeot","model":"308","color":"Brown","year":2024,"created_at":"2024-08-13"}
 from typing import Optional
 from pydantic import BaseModel
+from models.timestamp import Timestamp
 
 class Vehicle(BaseModel):
     id : str
@@ -10,7 +11,7 @@ class Vehicle(BaseModel):
     model : str 
     color : str
     year : int 
-    created_at : str
+    created_at : Timestamp
 
 class UpdateVehicle(BaseModel):
     license_plate: Optional[str] = None
@@ -18,4 +19,12 @@ class UpdateVehicle(BaseModel):
 
 class ActOnVehicle(BaseModel):
     parking_lot : str
-    license_plate : str 
\ No newline at end of file
+    license_plate : str 
+
+class VehicleHistorySummary(BaseModel):
+    licenseplate : str
+    sessions : int
+    total_minutes : int
+    total_cost : float
+    first_started : Optional[Timestamp] = None
+    last_started : Optional[Timestamp] = None
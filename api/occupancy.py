@@ -0,0 +1,251 @@
+"""Live occupancy per parking lot: active sessions and reservations against capacity.
+
+The counters live on the parking_lots row (`occupied` for active sessions, `reserved` for
+reservations) and are only changed with single conditional UPDATE statements, so concurrent
+entries and reservations can't lose updates or overbook a lot:
+
+    UPDATE parking_lots SET reserved = reserved + 1, ... WHERE id = %s AND reserved + occupied < capacity
+
+Every change stamps `occupancy_changed_at`. Reads are served from a per-process snapshot that
+is refreshed incrementally (only rows stamped since the last refresh) at most once per
+`refresh_interval`, so gate displays can poll every second without a query per request.
+
+Counters drift when sessions or reservations change outside these functions (seeding, admin
+edits, expired reservations); reconcile() recounts them from the source tables.
+
+    python occupancy.py --reconcile
+"""
+import argparse
+import threading
+import time
+from datetime import timedelta
+
+# Transactions that commit later than a row stamped after them must still be picked up:
+# the incremental refresh re-reads everything stamped in the last few seconds.
+REFRESH_OVERLAP = timedelta(seconds=5)
+
+
+def _pooled_connection():
+    from storage_utils import get_db_connection
+    return get_db_connection()
+
+
+def _after_commit(fn):
+    # Inside a unit of work the counter change is only real once the unit commits
+    from storage_utils import after_commit
+    after_commit(fn)
+
+
+class OccupancyCounters:
+    """Atomic per-lot counters plus the in-memory snapshot the occupancy endpoint reads"""
+
+    def __init__(self, connection_factory=None, refresh_interval=1.0, full_refresh_interval=60.0, clock=time.monotonic):
+        self._connect = connection_factory or _pooled_connection
+        self.refresh_interval = refresh_interval
+        self.full_refresh_interval = full_refresh_interval
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._lots = {}
+        self._missing = set()  # ids looked up and not found since the last refresh
+        self._watermark = None
+        self._next_refresh = 0.0
+        self._next_full_refresh = 0.0
+
+    # --------------------------
+    # Writes
+    # --------------------------
+    def _change(self, lot_id, assignment, guard):
+        """Run one guarded counter update; returns True when the row changed"""
+        conn = self._connect()
+        cursor = conn.cursor()
+        try:
+            cursor.execute(
+                f"""
+                UPDATE parking_lots SET {assignment}, occupancy_changed_at = NOW(6)
+                WHERE id = %s AND {guard}
+                """,
+                (lot_id,)
+            )
+            changed = cursor.rowcount == 1
+            row = None
+            if changed:
+                # The row is locked by this transaction, so this reads exactly the values just written
+                cursor.execute(
+                    "SELECT id, capacity, reserved, occupied, occupancy_changed_at FROM parking_lots WHERE id = %s",
+                    (lot_id,)
+                )
+                row = cursor.fetchone()
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+            conn.close()
+        if row:
+            _after_commit(lambda: self._store([row]))
+        return changed
+
+    def reserve_spot(self, lot_id):
+        """Hold a spot for a reservation; False when the lot is full (or doesn't exist)"""
+        return self._change(lot_id, "reserved = reserved + 1", "reserved + occupied < capacity")
+
+    def release_spot(self, lot_id):
+        """Give a reserved spot back; never goes below zero"""
+        return self._change(lot_id, "reserved = reserved - 1", "reserved > 0")
+
+    def session_entered(self, lot_id):
+        """Count a started session. Not capped: a car that is let in is counted either way."""
+        return self._change(lot_id, "occupied = occupied + 1", "TRUE")
+
+    def session_left(self, lot_id):
+        """Count a stopped session; never goes below zero"""
+        return self._change(lot_id, "occupied = occupied - 1", "occupied > 0")
+
+    # --------------------------
+    # Snapshot
+    # --------------------------
+    def _store(self, rows, replace=False):
+        with self._lock:
+            lots = {} if replace else self._lots
+            for lot_id, capacity, reserved, occupied, changed_at in rows:
+                key = str(lot_id)
+                current = self._lots.get(key)
+                # A refresh can return an older version than a write this process already stored
+                if current and changed_at is not None and current["updated_at"] is not None \
+                        and changed_at < current["updated_at"]:
+                    lots[key] = current
+                    continue
+                lots[key] = {"capacity": capacity, "reserved": reserved, "occupied": occupied,
+                             "updated_at": changed_at}
+                if changed_at is not None and (self._watermark is None or changed_at > self._watermark):
+                    self._watermark = changed_at
+            # Swapped in whole, so readers never see a half-loaded snapshot
+            self._lots = lots
+
+    def _query(self, where="", params=()):
+        conn = self._connect()
+        cursor = conn.cursor()
+        try:
+            cursor.execute(f"SELECT id, capacity, reserved, occupied, occupancy_changed_at FROM parking_lots{where}", params)
+            return cursor.fetchall()
+        finally:
+            cursor.close()
+            conn.close()
+
+    def refresh(self, full=False):
+        """Load the counters changed since the last refresh (all lots when full)"""
+        with self._lock:
+            # A lot that didn't exist may have been created since
+            self._missing.clear()
+        if full:
+            # Also drops deleted lots and picks up capacity edits, which aren't stamped
+            self._store(self._query(), replace=True)
+        elif self._watermark is None:
+            # Nothing had ever changed at the last refresh
+            self._store(self._query(" WHERE occupancy_changed_at IS NOT NULL"))
+        else:
+            self._store(self._query(" WHERE occupancy_changed_at >= %s", (self._watermark - REFRESH_OVERLAP,)))
+
+    def _maybe_refresh(self):
+        now = self._clock()
+        if now < self._next_refresh:
+            return
+        # One thread refreshes; the others keep reading the current snapshot
+        if not self._refresh_lock.acquire(blocking=False):
+            return
+        try:
+            full = now >= self._next_full_refresh
+            self.refresh(full)
+            self._next_refresh = now + self.refresh_interval
+            if full:
+                self._next_full_refresh = now + self.full_refresh_interval
+        finally:
+            self._refresh_lock.release()
+
+    def get(self, lot_id):
+        """Occupancy of a lot from the snapshot; None when the lot doesn't exist"""
+        self._maybe_refresh()
+        key = str(lot_id)
+        lot = self._lots.get(key)
+        if lot is None:
+            # Unknown ids are only looked up once per refresh, not on every poll
+            if key in self._missing:
+                return None
+            # A lot created after the last full refresh
+            self._store(self._query(" WHERE id = %s", (lot_id,)))
+            lot = self._lots.get(key)
+            if lot is None:
+                with self._lock:
+                    self._missing.add(key)
+                return None
+        lot = dict(lot)
+        in_use = lot["reserved"] + lot["occupied"]
+        return {"lot_id": str(lot_id), **lot, "available": max(0, lot["capacity"] - in_use)}
+
+    def forget(self, lot_id):
+        """Drop a lot from the snapshot so the next read reloads it (after a capacity edit or delete)"""
+        with self._lock:
+            self._lots.pop(str(lot_id), None)
+
+
+def shift_occupied(cursor, deltas):
+    """Apply net `occupied` changes {lot id: delta} in one UPDATE, inside the caller's transaction.
+    Batched gate events (gate_events.py) coalesce their entries and exits into these deltas."""
+    deltas = {lot_id: delta for lot_id, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    cases = " ".join(["WHEN %s THEN %s"] * len(deltas))
+    cursor.execute(
+        f"""
+        UPDATE parking_lots
+        SET occupied = GREATEST(0, occupied + CASE id {cases} END), occupancy_changed_at = NOW(6)
+        WHERE id IN ({', '.join(['%s'] * len(deltas))})
+        """,
+        [v for item in deltas.items() for v in item] + list(deltas)
+    )
+
+
+def reconcile(conn):
+    """Recount `occupied` (sessions without a stop time) and `reserved` (reservations that haven't ended)"""
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            """
+            UPDATE parking_lots p
+            SET occupied = (SELECT COUNT(*) FROM parking_sessions s WHERE s.parking_lot_id = p.id AND s.stopped IS NULL),
+                reserved = (SELECT COUNT(*) FROM reservations r WHERE r.parking_lot_id = p.id AND r.end_time > NOW()),
+                occupancy_changed_at = NOW(6)
+            """
+        )
+        conn.commit()
+        return cursor.rowcount
+    finally:
+        cursor.close()
+
+
+lot_occupancy = OccupancyCounters()
+
+reserve_spot = lot_occupancy.reserve_spot
+release_spot = lot_occupancy.release_spot
+session_entered = lot_occupancy.session_entered
+session_left = lot_occupancy.session_left
+get_occupancy = lot_occupancy.get
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parking lot occupancy counters")
+    parser.add_argument("--reconcile", action="store_true", help="recount the counters from sessions and reservations")
+    args = parser.parse_args()
+    if args.reconcile:
+        from db_pool import connect_mysql
+        conn = connect_mysql()
+        try:
+            print(f"Recounted {reconcile(conn)} parking lots")
+        finally:
+            conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""Parameterized SQL for the generic storage functions, with identifiers checked against the schema.
+
+Table and column names can't be bound as parameters, so they are only taken from TABLES (the
+columns setupdb.py creates) and quoted; anything else raises ValueError before a statement is
+built. Values always go in as %s placeholders.
+
+Statements are built once per (table, columns) and the same str object is returned after that.
+The prepared statement cache on each pooled connection (db_pool.py) is keyed on it, and
+mysql-connector only skips preparing again when it is handed the identical string.
+"""
+from functools import lru_cache
+
+TABLES = {
+    "users": ("id", "username", "password", "name", "email", "phone", "role", "created_at", "birth_year",
+              "active"),
+    "parking_lots": ("id", "name", "location", "address", "capacity", "reserved", "occupied",
+                     "occupancy_changed_at", "tariff", "daytariff", "created_at", "lat", "lng"),
+    "vehicles": ("id", "user_id", "license_plate", "make", "model", "color", "year", "created_at"),
+    "reservations": ("id", "user_id", "parking_lot_id", "vehicle_id", "status", "start_time", "end_time",
+                     "created_at", "cost"),
+    "payments": ("id", "transaction", "amount", "initiator", "created_at", "completed", "date", "method",
+                 "issuer", "bank", "hash", "session_id", "parking_lot_id"),
+    "parking_sessions": ("id", "parking_lot_id", "licenseplate", "started", "stopped", "user",
+                         "duration_minutes", "cost", "payment_status", "active_plate"),
+    "discounts": ("id", "amount", "created_at", "lot_id", "code", "percentage", "user_id", "expiration_date"),
+    "refunds": ("id", "transaction", "amount", "coupled_to", "processed_by", "created_at", "completed", "hash"),
+}
+
+
+def check_table(table):
+    if table not in TABLES:
+        raise ValueError(f"Unknown table {table!r}")
+    return table
+
+
+def check_columns(table, columns):
+    known = TABLES[check_table(table)]
+    for column in columns:
+        if column not in known:
+            raise ValueError(f"Unknown column {column!r} in {table}")
+    return tuple(columns)
+
+
+def _quote(identifier):
+    # Only ever called with whitelisted names; the quotes keep keywords (user, date, year) usable
+    return f"`{identifier}`"
+
+
+def _marks(count):
+    return ", ".join(["%s"] * count)
+
+
+def _order(table, order_by):
+    # "column" ascending, "-column" descending
+    terms = []
+    for term in order_by:
+        column = term.lstrip("-")
+        check_columns(table, (column,))
+        terms.append(f"{_quote(column)}{' DESC' if term.startswith('-') else ''}")
+    return " ORDER BY " + ", ".join(terms)
+
+
+@lru_cache(maxsize=1024)
+def select_sql(table, where=None, for_update=False, columns=(), order_by=(), limit=False):
+    """SELECT columns (all when empty) FROM table [WHERE where = %s] [ORDER BY ...] [LIMIT %s].
+
+    The limit is a placeholder too, so every limit shares one statement.
+    """
+    check_table(table)
+    projection = ", ".join(_quote(column) for column in check_columns(table, columns)) or "*"
+    sql = f"SELECT {projection} FROM {_quote(table)}"
+    if where is not None:
+        check_columns(table, (where,))
+        sql += f" WHERE {_quote(where)} = %s"
+    if order_by:
+        sql += _order(table, order_by)
+    if limit:
+        sql += " LIMIT %s"
+    return sql + (" FOR UPDATE" if for_update else "")
+
+
+def select(table, where=None, value=None, for_update=False, columns=None, order_by=None, limit=None):
+    """(sql, params) reading columns of the rows whose `where` column is value (all rows without where)"""
+    if isinstance(order_by, str):
+        order_by = (order_by,)
+    sql = select_sql(table, where, for_update, tuple(columns or ()), tuple(order_by or ()), limit is not None)
+    params = () if where is None else (value,)
+    return sql, params if limit is None else params + (limit,)
+
+
+@lru_cache(maxsize=1024)
+def keyset_sql(table, where=None, after=False, limit=False):
+    """SELECT * FROM table [WHERE where = %s] [AND id > %s] ORDER BY id [LIMIT %s], for keyset pages"""
+    check_columns(table, ("id",) if where is None else ("id", where))
+    conditions = []
+    if where is not None:
+        conditions.append(f"{_quote(where)} = %s")
+    if after:
+        conditions.append("`id` > %s")
+    sql = f"SELECT * FROM {_quote(table)}"
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    sql += " ORDER BY `id`"
+    return sql + (" LIMIT %s" if limit else "")
+
+
+@lru_cache(maxsize=64)
+def history_sql(since=False, until=False, after=False, limit=False):
+    """A plate's parking sessions in (started, id) order, optionally started in [since, until) and
+    continuing after a (started, id) cursor. Parameters: plate, [since], [until], [started, started, id], [limit]
+    """
+    sql = "SELECT * FROM `parking_sessions` WHERE `licenseplate` = %s"
+    if since:
+        sql += " AND `started` >= %s"
+    if until:
+        sql += " AND `started` < %s"
+    if after:
+        sql += " AND (`started` > %s OR (`started` = %s AND `id` > %s))"
+    sql += " ORDER BY `started`, `id`"
+    return sql + (" LIMIT %s" if limit else "")
+
+
+@lru_cache(maxsize=1024)
+def insert_sql(table, columns, rows=1, update_on_duplicate=False):
+    """INSERT INTO table (columns) VALUES (%s, ...) repeated for rows rows; the values go row by row.
+
+    With update_on_duplicate an existing row with the same unique key is overwritten instead.
+    """
+    check_columns(table, columns)
+    if not columns:
+        raise ValueError(f"No columns to insert into {table}")
+    values = ", ".join([f"({_marks(len(columns))})"] * rows)
+    sql = f"INSERT INTO {_quote(table)} ({', '.join(_quote(column) for column in columns)}) VALUES {values}"
+    if update_on_duplicate:
+        sql += " ON DUPLICATE KEY UPDATE " + ", ".join(
+            f"{_quote(column)} = VALUES({_quote(column)})" for column in columns)
+    return sql
+
+
+@lru_cache(maxsize=1024)
+def update_sql(table, columns, where="id"):
+    """UPDATE table SET column = %s, ... WHERE where = %s; the values go in column order, the key last"""
+    check_columns(table, columns + (where,))
+    if not columns:
+        raise ValueError(f"No columns to change in {table}")
+    assignments = ", ".join(f"{_quote(column)} = %s" for column in columns)
+    return f"UPDATE {_quote(table)} SET {assignments} WHERE {_quote(where)} = %s"
+
+
+@lru_cache(maxsize=1024)
+def delete_sql(table, where="id"):
+    check_columns(table, (where,))
+    return f"DELETE FROM {_quote(table)} WHERE {_quote(where)} = %s"
+
+
+@lru_cache(maxsize=1024)
+def update_case_sql(table, columns, where, rows):
+    """UPDATE table SET column = CASE where WHEN %s THEN %s ... END, ... WHERE where IN (%s, ...) for rows rows.
+
+    Parameters: per column the (key, value) pair of every row, then the keys.
+    """
+    check_columns(table, columns + (where,))
+    if not columns:
+        raise ValueError(f"No columns to change in {table}")
+    cases = " ".join(["WHEN %s THEN %s"] * rows)
+    assignments = ", ".join(f"{_quote(column)} = CASE {_quote(where)} {cases} END" for column in columns)
+    return f"UPDATE {_quote(table)} SET {assignments} WHERE {_quote(where)} IN ({_marks(rows)})"
+
+
+@lru_cache(maxsize=1024)
+def delete_in_sql(table, where, rows):
+    """DELETE FROM table WHERE where IN (%s, ...) with rows placeholders"""
+    check_columns(table, (where,))
+    return f"DELETE FROM {_quote(table)} WHERE {_quote(where)} IN ({_marks(rows)})"
+
+
+def update(table, values, where="id"):
+    """(sql, params) changing the row whose `where` column matches values[where] to the other values"""
+    columns = tuple(column for column in values if column != where)
+    return update_sql(table, columns, where), [values[column] for column in columns] + [values[where]]
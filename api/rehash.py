@@ -1,27 +1,119 @@
+"""Bulk migration of stored passwords to argon2.
+
+Rows whose password is still a legacy md5 digest are re-hashed as argon2(md5), the scheme
+UserService.authenticate_user verifies. Rows that already hold an argon2 hash can't be
+re-parameterised without the plaintext; those are upgraded on the user's next login
+(check_needs_rehash) and are skipped here.
+
+Users are read in keyset-paginated chunks, hashed on a process pool across all cores and
+written back with executemany, one transaction per chunk. The last finished id is saved to a
+checkpoint file, so an interrupted run continues where it stopped.
+
+    python rehash.py [--chunk-size 2000] [--workers 8] [--checkpoint rehash.checkpoint] [--restart]
+"""
+import argparse
+import json
 import os
-import mysql.connector
+import time
+from concurrent.futures import ProcessPoolExecutor
+
 from argon2 import PasswordHasher
 
-def get_db_connection():
-    return mysql.connector.connect(
-        host=os.environ.get("MYSQL_HOST", "127.0.0.1"),
-        port=int(os.environ.get("MYSQL_PORT", 3307)),
-        user=os.environ.get("MYSQL_USER", "stilstaan"),
-        password=os.environ.get("MYSQL_PASSWORD", "stil"),
-        database=os.environ.get("MYSQL_DATABASE", "mobypark"),
-    )
-conn = get_db_connection()
-cursor = conn.cursor(dictionary=True) 
-
-users = cursor.execute("SELECT * FROM users")
-us = cursor.fetchall()
-conn.commit() 
-cursor.close()
-conn.close()
+from db_pool import connect_mysql
+
 ph = PasswordHasher()
 
-for i in range(0,len(us)):
-    print(i)
-    us[i]["password"] = ph.hash(us[i]["password"]) 
-for i in range(0,10):
-    print(us[i])
+
+def needs_migration(password):
+    return bool(password) and not password.startswith("$argon2")
+
+
+def hash_passwords(rows):
+    """Worker: [(id, md5 digest)] -> [(argon2 hash, id, md5 digest)], ready for the UPDATE"""
+    return [(ph.hash(password), user_id, password) for user_id, password in rows]
+
+
+def load_checkpoint(path):
+    if path and os.path.exists(path):
+        with open(path, "r") as f:
+            return json.load(f).get("last_id", 0)
+    return 0
+
+
+def save_checkpoint(path, last_id, migrated):
+    if not path:
+        return
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump({"last_id": last_id, "migrated": migrated}, f)
+    os.replace(tmp, path)  # atomic, so a crash never leaves a half-written checkpoint
+
+
+def split(rows, parts):
+    size = max(1, -(-len(rows) // parts))
+    return [rows[i:i + size] for i in range(0, len(rows), size)]
+
+
+def rehash_users(conn, chunk_size=2000, workers=None, checkpoint_path=None, restart=False, log=print):
+    workers = workers or os.cpu_count() or 1
+    last_id = 0 if restart else load_checkpoint(checkpoint_path)
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    cursor = conn.cursor()
+    migrated = scanned = 0
+    started = time.perf_counter()
+    if last_id:
+        log(f"Resuming after user id {last_id}")
+
+    try:
+        while True:
+            cursor.execute(
+                "SELECT id, password FROM users WHERE id > %s ORDER BY id LIMIT %s",
+                (last_id, chunk_size)
+            )
+            rows = cursor.fetchall()
+            if not rows:
+                break
+            scanned += len(rows)
+            todo = [(user_id, password) for user_id, password in rows if needs_migration(password)]
+
+            if todo:
+                if pool:
+                    updates = [u for part in pool.map(hash_passwords, split(todo, workers)) for u in part]
+                else:
+                    updates = hash_passwords(todo)
+                # Only overwrite rows that still hold the digest we read (idempotent, safe next to logins)
+                cursor.executemany("UPDATE users SET password = %s WHERE id = %s AND password = %s", updates)
+                conn.commit()
+                migrated += len(updates)
+
+            last_id = rows[-1][0]
+            save_checkpoint(checkpoint_path, last_id, migrated)
+            elapsed = time.perf_counter() - started
+            log(f"Up to id {last_id}: scanned {scanned}, migrated {migrated} ({migrated / elapsed:.0f} hashes/s)")
+    finally:
+        cursor.close()
+        if pool:
+            pool.shutdown()
+
+    elapsed = time.perf_counter() - started
+    log(f"Done: migrated {migrated} of {scanned} users in {elapsed:.1f}s")
+    return migrated
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrate legacy md5 passwords to argon2")
+    parser.add_argument("--chunk-size", type=int, default=2000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--checkpoint", default="rehash.checkpoint")
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint and start from the first user")
+    args = parser.parse_args()
+
+    conn = connect_mysql()
+    try:
+        rehash_users(conn, args.chunk_size, args.workers, args.checkpoint, args.restart)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+"""Bulk re-pricing of stopped parking sessions, e.g. after a tariff correction.
+
+Recomputes duration_minutes and cost the way ParkingService.stop_parking_session does
+(calculate_rate on the lot's tariff and day tariff, optionally minus a discount code's
+percentage) for every stopped session of the selected lots and date range.
+
+Each lot is handled by its own worker process. A worker reads the lot's sessions in
+keyset-paginated chunks, prices a chunk at once with the vectorized tariff engine, and
+writes only the rows whose values changed. The write is one UPDATE ... CASE statement per
+chunk, and each chunk is one transaction. --dry-run writes nothing and prints the diff
+instead.
+
+Sessions don't record the discount code they were stopped with, so every selected session is
+priced with --discount or at full price. Running without --discount would undo the discounts
+given at exit; it has to be asked for explicitly with --full-price.
+
+    python reprice.py [--lot 1 --lot 2] [--since 2024-01-01] [--until 2024-07-01]
+                      [--discount CODE | --full-price] [--chunk-size 5000] [--workers 8] [--dry-run]
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+
+import tariff_engine
+from db_pool import connect_mysql
+
+
+def load_lots(conn, lot_ids=None):
+    """[(id, tariff, day tariff)] of the selected lots (all lots when lot_ids is empty)"""
+    cursor = conn.cursor()
+    try:
+        sql = "SELECT id, tariff, daytariff FROM parking_lots"
+        params = ()
+        if lot_ids:
+            sql += f" WHERE id IN ({', '.join(['%s'] * len(lot_ids))})"
+            params = tuple(lot_ids)
+        cursor.execute(sql + " ORDER BY id", params)
+        return [(lot_id, float(tariff), float(daytariff)) for lot_id, tariff, daytariff in cursor.fetchall()]
+    finally:
+        cursor.close()
+
+
+def load_discount(conn, code):
+    """(lot id, percentage, expiration date) of a discount code, None when it doesn't exist"""
+    if not code:
+        return None
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT lot_id, percentage, expiration_date FROM discounts WHERE code = %s", (code,))
+        row = cursor.fetchone()
+    finally:
+        cursor.close()
+    if not row or row[1] is None:
+        return None
+    return str(row[0]), float(row[1]), row[2]
+
+
+def price_chunk(rows, tariff, day_tariff, lot_id, discount=None):
+    """New (duration_minutes, cost) arrays for rows of (id, started, stopped, minutes, cost)"""
+    started = tariff_engine.to_datetime64([r[1] for r in rows])
+    stopped = tariff_engine.to_datetime64([r[2] for r in rows])
+    minutes = tariff_engine.minutes_between(started, stopped)
+    cost = tariff_engine.rate_batch(minutes, tariff, day_tariff)
+    if discount:
+        # Same rule as stop_parking_session: the code must belong to the lot and not be expired on
+        # the day of the stop (the whole expiry day still counts)
+        discount_lot, percentage, expires = discount
+        if discount_lot == str(lot_id):
+            valid = np.ones(len(rows), dtype=bool) if expires is None else \
+                stopped.astype("datetime64[D]") <= np.datetime64(expires.date(), "D")
+            cost = np.where(valid, cost * (1 - percentage / 100), cost)
+    return minutes, cost
+
+
+def changed_rows(rows, minutes, cost):
+    """[(id, old minutes, new minutes, old cost, new cost)] for rows whose stored values differ"""
+    changes = []
+    for (session_id, _, _, old_minutes, old_cost), new_minutes, new_cost in zip(rows, minutes, cost):
+        # duration_minutes is an INT and cost a DECIMAL(12,2) column: compare at the stored precision
+        new_minutes, new_cost = int(round(new_minutes)), round(float(new_cost), 2)
+        if old_minutes is None or old_cost is None or int(old_minutes) != new_minutes or float(old_cost) != new_cost:
+            changes.append((session_id, old_minutes, new_minutes, old_cost, new_cost))
+    return changes
+
+
+def update_sql(count):
+    cases = " ".join(["WHEN %s THEN %s"] * count)
+    return f"""
+        UPDATE parking_sessions
+        SET duration_minutes = CASE id {cases} END,
+            cost = CASE id {cases} END
+        WHERE id IN ({', '.join(['%s'] * count)})
+        """
+
+
+def update_params(changes):
+    minutes = [v for session_id, _, new_minutes, _, _ in changes for v in (session_id, new_minutes)]
+    costs = [v for session_id, _, _, _, new_cost in changes for v in (session_id, new_cost)]
+    return minutes + costs + [c[0] for c in changes]
+
+
+def reprice_lot(conn, lot, since=None, until=None, discount=None, chunk_size=5000, dry_run=False, log=print):
+    """Re-price one lot's stopped sessions; returns (scanned, changed)"""
+    lot_id, tariff, day_tariff = lot
+    filters, params = "", []
+    if since:
+        filters += " AND started >= %s"
+        params.append(since)
+    if until:
+        filters += " AND started < %s"
+        params.append(until)
+
+    cursor = conn.cursor()
+    last_id = scanned = changed = 0
+    try:
+        while True:
+            cursor.execute(
+                f"""
+                SELECT id, started, stopped, duration_minutes, cost FROM parking_sessions
+                WHERE parking_lot_id = %s AND id > %s AND stopped IS NOT NULL{filters}
+                ORDER BY id LIMIT %s
+                """,
+                (lot_id, last_id, *params, chunk_size)
+            )
+            rows = cursor.fetchall()
+            if not rows:
+                break
+            scanned += len(rows)
+            last_id = rows[-1][0]
+
+            minutes, cost = price_chunk(rows, tariff, day_tariff, lot_id, discount)
+            changes = changed_rows(rows, minutes, cost)
+            changed += len(changes)
+            if dry_run:
+                for session_id, old_minutes, new_minutes, old_cost, new_cost in changes:
+                    log(f"lot {lot_id} session {session_id}: minutes {old_minutes} -> {new_minutes}, cost {old_cost} -> {new_cost}")
+            elif changes:
+                cursor.execute(update_sql(len(changes)), update_params(changes))
+                conn.commit()
+    finally:
+        cursor.close()
+    return scanned, changed
+
+
+def reprice_lot_worker(lot, since, until, discount, chunk_size, dry_run):
+    """Process pool entry point: one connection per worker process"""
+    conn = connect_mysql()
+    try:
+        return lot[0], reprice_lot(conn, lot, since, until, discount, chunk_size, dry_run)
+    finally:
+        conn.close()
+
+
+def reprice(conn, lot_ids=None, since=None, until=None, discount_code=None, chunk_size=5000,
+            workers=None, dry_run=False, log=print, full_price=False):
+    """Re-price the selected lots, in parallel when workers > 1; returns (scanned, changed).
+
+    Without a discount code every session is written at full price, so that takes full_price=True.
+    """
+    if not discount_code and not full_price and not dry_run:
+        raise ValueError("Without a discount code sessions discounted at exit go back to full price; "
+                         "pass full_price (--full-price) to do that anyway")
+    lots = load_lots(conn, lot_ids)
+    discount = load_discount(conn, discount_code)
+    if discount_code and not discount:
+        raise ValueError(f"Unknown discount code {discount_code}")
+    workers = min(workers or os.cpu_count() or 1, max(1, len(lots)))
+    started = time.perf_counter()
+    scanned = changed = 0
+
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(reprice_lot_worker, lot, since, until, discount, chunk_size, dry_run) for lot in lots]
+            for future in futures:
+                lot_id, (lot_scanned, lot_changed) = future.result()
+                scanned, changed = scanned + lot_scanned, changed + lot_changed
+                log(f"lot {lot_id}: {lot_changed} of {lot_scanned} sessions {'would change' if dry_run else 'updated'}")
+    else:
+        for lot in lots:
+            lot_scanned, lot_changed = reprice_lot(conn, lot, since, until, discount, chunk_size, dry_run, log)
+            scanned, changed = scanned + lot_scanned, changed + lot_changed
+            log(f"lot {lot[0]}: {lot_changed} of {lot_scanned} sessions {'would change' if dry_run else 'updated'}")
+
+    elapsed = time.perf_counter() - started
+    log(f"Done: {changed} of {scanned} sessions {'would change' if dry_run else 'updated'} "
+        f"in {elapsed:.1f}s ({scanned / elapsed if elapsed else 0:.0f} sessions/s)")
+    return scanned, changed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recompute duration and cost of stopped parking sessions")
+    parser.add_argument("--lot", action="append", type=int, help="lot id, repeatable (default: all lots)")
+    parser.add_argument("--since", type=datetime.fromisoformat, help="only sessions started at or after this date")
+    parser.add_argument("--until", type=datetime.fromisoformat, help="only sessions started before this date")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--discount", help="apply this discount code where it is valid for the lot")
+    group.add_argument("--full-price", action="store_true",
+                       help="price every session without a discount, undoing discounts given at exit")
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--dry-run", action="store_true", help="print the changes instead of writing them")
+    args = parser.parse_args()
+
+    conn = connect_mysql()
+    try:
+        reprice(conn, args.lot, args.since, args.until, args.discount, args.chunk_size, args.workers, args.dry_run,
+                full_price=args.full_price)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+import heapq
+import threading
+import time
+from collections import OrderedDict
+
+
+class VersionCounter:
+    """Cross-worker invalidation: one row per cache in `cache_versions`, bumped on every write.
+
+    Workers compare the version with the one they last saw and drop their local cache when
+    another worker has written in the meantime.
+    """
+
+    def __init__(self, name, connection_factory=None):
+        if connection_factory is None:
+            from storage_utils import get_db_connection
+            connection_factory = get_db_connection
+        self.name = name
+        self._connect = connection_factory
+
+    def _execute(self, sql, fetch=False):
+        conn = self._connect()
+        cursor = conn.cursor()
+        try:
+            cursor.execute(sql, (self.name,))
+            if fetch:
+                return cursor.fetchone()
+            conn.commit()
+        finally:
+            cursor.close()
+            conn.close()
+
+    def current(self):
+        row = self._execute("SELECT version FROM cache_versions WHERE name = %s", fetch=True)
+        return row[0] if row else 0
+
+    def bump(self):
+        self._execute(
+            """
+            INSERT INTO cache_versions (name, version) VALUES (%s, 1)
+            ON DUPLICATE KEY UPDATE version = version + 1
+            """
+        )
+
+
+def _copy(value):
+    # Callers mutate the rows they get (e.g. lot["reserved"] += 1), so never hand out the cached object
+    if isinstance(value, list):
+        return [v.copy() for v in value]
+    if hasattr(value, "copy"):
+        return value.copy()
+    return value
+
+
+class TTLCache:
+    """Thread-safe read-through cache of row dicts with TTL expiry and an LRU size limit.
+
+    `ttl=0` disables caching. With a VersionCounter the shared version is checked at most every
+    `version_check_interval` seconds and a change made by another worker clears this cache.
+    `lifetime(value)` can cap an entry's ttl by the value itself (seconds until a discount
+    expires); values with no lifetime left are not stored, and expired entries are dropped as
+    they expire, so a full cache never evicts a live entry to keep an expired one.
+    """
+
+    def __init__(self, ttl=60, max_entries=1024, version=None, version_check_interval=1.0, clock=time.monotonic,
+                 lifetime=None):
+        self.ttl = ttl
+        self._lifetime = lifetime
+        self._expiry_heap = []  # (expires_at, key), only kept with a lifetime
+        self.max_entries = max_entries
+        self._version = version
+        self._version_check_interval = version_check_interval
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped by every invalidation; a load that started before one is not stored
+        self._generation = 0
+        self._seen_version = None
+        self._next_version_check = 0.0
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0,
+                       "invalidations": 0, "remote_invalidations": 0}
+
+    def _sync(self):
+        if self._version is None or self._clock() < self._next_version_check:
+            return
+        self._next_version_check = self._clock() + self._version_check_interval
+        version = self._version.current()
+        with self._lock:
+            if self._seen_version is not None and version != self._seen_version:
+                self._entries.clear()
+                self._generation += 1
+                self._stats["remote_invalidations"] += 1
+            self._seen_version = version
+
+    def get(self, key, loader):
+        """Cached value for `key`, calling loader() on a miss; None results are not cached"""
+        if not self.ttl:
+            return loader()
+        self._sync()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > self._clock():
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return _copy(value)
+                del self._entries[key]
+                self._stats["expirations"] += 1
+            self._stats["misses"] += 1
+            generation = self._generation
+
+        value = loader()
+        if value is not None:
+            self.set(key, value, generation)
+        return _copy(value)
+
+    def set(self, key, value, generation=None):
+        ttl = self.ttl if self._lifetime is None else min(self.ttl, self._lifetime(value))
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return  # invalidated while loading; the value may predate the write
+            if ttl <= 0:
+                self._entries.pop(key, None)
+                return
+            expires_at = self._clock() + ttl
+            self._entries[key] = (_copy(value), expires_at)
+            self._entries.move_to_end(key)
+            if self._lifetime is not None:
+                heapq.heappush(self._expiry_heap, (expires_at, key))
+                self._drop_expired()
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def _drop_expired(self):
+        # Entries expire at different times, so the expired ones aren't necessarily the oldest
+        now = self._clock()
+        heap = self._expiry_heap
+        while heap and heap[0][0] <= now:
+            expires_at, key = heapq.heappop(heap)
+            entry = self._entries.get(key)
+            # Skip keys set again (or dropped) since this heap item was pushed
+            if entry is not None and entry[1] == expires_at:
+                del self._entries[key]
+                self._stats["expirations"] += 1
+
+    def invalidate(self, *keys):
+        """Drop `keys` (all entries when none are given) here and, when shared, in every worker"""
+        with self._lock:
+            if keys:
+                for key in keys:
+                    self._entries.pop(key, None)
+            else:
+                self._entries.clear()
+                self._expiry_heap.clear()
+            self._generation += 1
+            self._stats["invalidations"] += 1
+        if self._version is not None:
+            self._version.bump()
+
+    def metrics(self):
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "hit_ratio": round(self._stats["hits"] / lookups, 4) if lookups else 0.0,
+            }
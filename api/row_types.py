@@ -0,0 +1,134 @@
+"""Typed rows: per-table column schemas and slotted record classes.
+
+Rows come from a plain (tuple) cursor and are decoded once with the converters of their
+table's schema into instances of a generated record class with __slots__. That is
+smaller and cheaper to build than one dict per row, and values keep their real types:
+ints, floats, datetimes, booleans and None (not "None").
+
+Identifier columns are exposed as str, the type the API models and path parameters use
+for ids. Records behave like mutable mappings, so row["col"], row.get(), row.update() and
+Model(**row) keep working. Pydantic models can also read them directly with
+model_validate(row, from_attributes=True), without building an intermediate dict.
+"""
+from collections.abc import Mapping, MutableMapping
+from functools import lru_cache
+
+
+def _id(value):
+    return None if value is None else str(value)
+
+
+def _float(value):
+    return None if value is None else float(value)
+
+
+def _bool(value):
+    return None if value is None else bool(value)
+
+
+# Converters per column; columns not listed (and datetimes, ints, strings) keep the driver's value.
+SCHEMAS = {
+    "users": {"id": _id, "active": _bool},
+    "parking_lots": {"id": _id, "tariff": _float, "daytariff": _float, "lat": _float, "lng": _float},
+    "vehicles": {"id": _id, "user_id": _id},
+    "reservations": {"id": _id, "user_id": _id, "parking_lot_id": _id, "vehicle_id": _id, "cost": _float},
+    "payments": {"id": _id, "amount": _float, "session_id": _id, "parking_lot_id": _id},
+    "parking_sessions": {"id": _id, "parking_lot_id": _id, "cost": _float},
+    "discounts": {"id": _id, "lot_id": _id, "percentage": _float},
+    "refunds": {"id": _id, "amount": _float, "completed": _bool},
+}
+
+
+class Record(MutableMapping):
+    """Base for generated row classes: fixed columns in slots, other keys in a lazily created dict"""
+    __slots__ = ("_extra",)
+    _fields = ()
+
+    def __getitem__(self, key):
+        if key in self._fields:
+            return getattr(self, key)
+        extra = getattr(self, "_extra", None)
+        if extra is None or key not in extra:
+            raise KeyError(key)
+        return extra[key]
+
+    def __setitem__(self, key, value):
+        if key in self._fields:
+            setattr(self, key, value)
+            return
+        if getattr(self, "_extra", None) is None:
+            self._extra = {}
+        self._extra[key] = value
+
+    def __delitem__(self, key):
+        extra = getattr(self, "_extra", None)
+        if extra is None or key not in extra:
+            raise KeyError(f"{key} is a column and can't be removed")
+        del extra[key]
+
+    def __iter__(self):
+        yield from self._fields
+        extra = getattr(self, "_extra", None)
+        if extra:
+            yield from extra
+
+    def __len__(self):
+        return len(self._fields) + len(getattr(self, "_extra", None) or ())
+
+    def __contains__(self, key):
+        return key in self._fields or key in (getattr(self, "_extra", None) or ())
+
+    def __eq__(self, other):
+        if isinstance(other, Mapping):
+            return dict(self.items()) == dict(other.items())
+        return NotImplemented
+
+    def copy(self):
+        clone = self.__class__.__new__(self.__class__)
+        for name in self._fields:
+            setattr(clone, name, getattr(self, name))
+        extra = getattr(self, "_extra", None)
+        if extra:
+            clone._extra = dict(extra)
+        return clone
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({dict(self.items())!r})"
+
+
+@lru_cache(maxsize=256)
+def record_class(table, columns):
+    """The record class for a table and a column tuple (a projection gets its own class)"""
+    reserved = set(dir(Record))
+    if any(c in reserved or not c.isidentifier() for c in columns):
+        return None
+    name = "".join(part.title() for part in table.split("_")) + "Row"
+    return type(name, (Record,), {"__slots__": columns, "_fields": columns})
+
+
+@lru_cache(maxsize=256)
+def _converters(table, columns):
+    schema = SCHEMAS.get(table, {})
+    return tuple(schema.get(c) for c in columns)
+
+
+def decode_rows(table, columns, rows):
+    """Decode tuples from a plain cursor into records of the table's schema"""
+    columns = tuple(columns)
+    converters = _converters(table, columns)
+    cls = record_class(table, columns)
+    pairs = [(c, conv) for c, conv in zip(columns, converters)]
+    records = []
+    if cls is None:
+        # Column names that can't be slots (e.g. a column called "keys"): fall back to dicts
+        for row in rows:
+            records.append({c: conv(v) if conv else v for (c, conv), v in zip(pairs, row)})
+        return records
+
+    new = cls.__new__
+    for row in rows:
+        record = new(cls)
+        for (column, conv), value in zip(pairs, row):
+            setattr(record, column, conv(value) if conv else value)
+        records.append(record)
+    return records
@@ -0,0 +1,281 @@
+"""Streaming, resumable bulk importer used by setupdb.
+
+Parser processes stream JSON files record by record (loaddb.iter_json_items) and put batches
+of row tuples on a bounded queue. The main process takes batches off the queue and writes
+each with one multi-row INSERT. Memory stays bounded by
+    workers * batch_size + queue_size * batch_size
+rows, however large the dataset is. Non-unique secondary indexes of the target table are
+dropped for the load and rebuilt once at the end, which is much cheaper than maintaining them
+row by row.
+
+Every batch comes from a single file and is committed in the same transaction as that file's
+row in `import_checkpoints` (record offset, batch number, last key), so a re-run resumes at
+exactly the first uncommitted record. Rows are upserted on their natural key, so replaying a
+batch is harmless. Records that can't be converted or inserted are written to
+`import_quarantine` instead of aborting the import.
+"""
+import json
+import multiprocessing
+import time
+
+try:
+    import resource
+except ImportError:
+    # Windows has no getrusage; the import then just doesn't report memory
+    resource = None
+
+import mysql.connector
+
+from loaddb import load_data, iter_json_items, salvage_json_records
+
+_DONE = None
+
+# Source record -> row dict converters, addressed by name so spawned workers can look them up
+ROW_CONVERTERS = {
+    "parking_sessions": load_data.parking_session_row,
+    "payments": load_data.payment_row,
+}
+
+# How each kind of source file is read: reader(path, on_skip) -> (key, record) pairs.
+# payments.json is known to contain corrupt regions, so it is salvaged instead of parsed strictly.
+READERS = {
+    "parking_sessions": lambda path, on_skip: iter_json_items(path),
+    "payments": salvage_json_records,
+}
+
+# Field holding the record's natural key; None means the key of the top-level JSON object
+NATURAL_KEYS = {
+    "parking_sessions": None,
+    "payments": "transaction",
+}
+
+
+def record_key(kind, key, record):
+    field = NATURAL_KEYS.get(kind)
+    if field and isinstance(record, dict) and field in record:
+        return str(record[field])
+    return str(key)
+
+
+def parse_files(kind, paths, columns, batch_size, queue, resume=None):
+    """Worker: stream every file in `paths` and queue per-file batches of value tuples.
+
+    `resume` maps a path to the number of its records already committed; those are skipped.
+    Batch messages are ("batch", path, rows, quarantined, next offset, last key, file done).
+    """
+    convert, read = ROW_CONVERTERS[kind], READERS[kind]
+    resume = resume or {}
+    for path in paths:
+        start = resume.get(path, 0)
+        rows, bad, last_key, offset, seen = [], [], None, start, 0
+
+        def skipped(first, last):
+            # Corrupt bytes between records are quarantined as a byte range, there is no record to keep.
+            # Ranges before the resume point were quarantined by the earlier run.
+            if seen >= start:
+                bad.append((None, f"bytes {first}-{last}", None, "corrupt JSON skipped"))
+
+        try:
+            for index, (key, record) in enumerate(read(path, skipped)):
+                seen = index + 1
+                if index < start:
+                    continue
+                last_key = record_key(kind, key, record)
+                try:
+                    row = convert(record)
+                    rows.append(tuple(row[c] for c in columns))
+                except Exception as e:
+                    bad.append((index, last_key, json.dumps(record, default=str), repr(e)))
+                offset = index + 1
+                if len(rows) + len(bad) >= batch_size:
+                    # blocks while the queue is full: backpressure on the parser
+                    queue.put(("batch", path, rows, bad, offset, last_key, False))
+                    rows, bad = [], []
+            queue.put(("batch", path, rows, bad, offset, last_key, True))
+        except Exception as e:
+            # Unreadable rest of the file: commit what was parsed, a re-run resumes from there
+            if rows or bad:
+                queue.put(("batch", path, rows, bad, offset, last_key, False))
+            queue.put(("error", f"{path}: {e!r}"))
+    queue.put(_DONE)
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process and of the largest parser process (Linux reports KB);
+    None where the platform can't tell"""
+    if resource is None:
+        return None
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return own / 1024, children / 1024
+
+
+def drop_indexes(cursor, table, indexes):
+    dropped = []
+    for name in indexes:
+        cursor.execute(
+            """
+            SELECT 1 FROM information_schema.statistics
+            WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+            LIMIT 1
+            """,
+            (table, name)
+        )
+        if cursor.fetchone():
+            cursor.execute(f"DROP INDEX {name} ON {table}")
+            dropped.append(name)
+    return dropped
+
+
+def upsert_sql(table, columns, rows):
+    """Multi-row INSERT that overwrites the existing row when the natural key is already there"""
+    placeholders = "(" + ", ".join(["%s"] * len(columns)) + ")"
+    return f"""
+        INSERT INTO {table}
+        ({', '.join(columns)})
+        VALUES {', '.join([placeholders] * rows)}
+        ON DUPLICATE KEY UPDATE {', '.join(f'{c} = VALUES({c})' for c in columns)}
+        """
+
+
+# --------------------------
+# Checkpoints and quarantine
+# --------------------------
+def load_checkpoints(cursor, stage):
+    """{file: (record offset, batch number, done)} for an import stage"""
+    cursor.execute("SELECT file, record_offset, batch_no, done FROM import_checkpoints WHERE stage = %s", (stage,))
+    return {file: (offset, batch_no, bool(done)) for file, offset, batch_no, done in cursor.fetchall()}
+
+
+def save_checkpoint(cursor, stage, file, offset, batch_no, last_key, done):
+    cursor.execute(
+        """
+        INSERT INTO import_checkpoints (stage, file, record_offset, batch_no, last_key, done)
+        VALUES (%s, %s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE record_offset = VALUES(record_offset), batch_no = VALUES(batch_no),
+                                last_key = VALUES(last_key), done = VALUES(done)
+        """,
+        (stage, file, offset, batch_no, last_key, int(done))
+    )
+
+
+def stage_done(cursor, stage):
+    """True once a single-transaction stage (see mark_stage_done) has been committed"""
+    return load_checkpoints(cursor, stage).get("", (0, 0, False))[2]
+
+
+def mark_stage_done(cursor, stage):
+    save_checkpoint(cursor, stage, "", 0, 0, None, True)
+
+
+def quarantine(cursor, stage, file, rows):
+    """Store rejected records: rows of (record offset, record key, payload, error)"""
+    if rows:
+        cursor.executemany(
+            """
+            INSERT INTO import_quarantine (stage, file, record_offset, record_key, payload, error)
+            VALUES (%s, %s, %s, %s, %s, %s)
+            """,
+            [(stage, file, offset, key, payload, error) for offset, key, payload, error in rows]
+        )
+
+
+def write_batch(conn, cursor, table, columns, rows):
+    """Upsert a batch; if the database rejects it, retry row by row and return the rows that still fail"""
+    if not rows:
+        return []
+    try:
+        cursor.execute(upsert_sql(table, columns, len(rows)), [v for row in rows for v in row])
+        return []
+    except mysql.connector.Error:
+        conn.rollback()
+    failed = []
+    for row in rows:
+        try:
+            cursor.execute(upsert_sql(table, columns, 1), row)
+        except mysql.connector.Error as e:
+            # InnoDB only undoes the failing statement; the good rows stay in the transaction
+            failed.append((None, None, json.dumps(dict(zip(columns, row)), default=str), repr(e)))
+    return failed
+
+
+def run_import(conn, stage, table, columns, paths, workers=None, batch_size=5000, queue_size=8,
+               indexes=(), rebuild_indexes=None, log=print):
+    """Stream `paths` into `table`, resuming from the stage's checkpoints; returns (rows inserted, rows/sec)"""
+    cursor = conn.cursor()
+    checkpoints = load_checkpoints(cursor, stage)
+    todo = [p for p in paths if not checkpoints.get(p, (0, 0, False))[2]]
+    resume = {p: checkpoints[p][0] for p in todo if p in checkpoints}
+    batch_no = {p: checkpoints.get(p, (0, 0, False))[1] for p in todo}
+    if len(todo) < len(paths):
+        log(f"{stage}: {len(paths) - len(todo)} file(s) already imported")
+    if resume:
+        log(f"{stage}: resuming {len(resume)} file(s) after their last committed batch")
+    if not todo:
+        cursor.close()
+        return 0, 0.0
+
+    workers = max(1, min(workers or multiprocessing.cpu_count(), len(todo)))
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue(maxsize=queue_size)
+    # Round-robin the files so every worker gets a similar share
+    procs = [
+        ctx.Process(target=parse_files, args=(stage, todo[i::workers], columns, batch_size, queue, resume), daemon=True)
+        for i in range(workers)
+    ]
+
+    # unique_checks stay on: the upserts rely on the natural-key indexes
+    cursor.execute("SET foreign_key_checks = 0")
+    dropped = drop_indexes(cursor, table, indexes)
+    if dropped:
+        log(f"Dropped indexes {', '.join(dropped)} on {table} for the load")
+
+    for p in procs:
+        p.start()
+
+    inserted = quarantined = batches = 0
+    running = workers
+    errors = []
+    started = time.perf_counter()
+    try:
+        while running:
+            msg = queue.get()
+            if msg is _DONE:
+                running -= 1
+                continue
+            if msg[0] == "error":
+                errors.append(msg[1])
+                continue
+            _, path, rows, bad, offset, last_key, done = msg
+            failed = write_batch(conn, cursor, table, columns, rows)
+            quarantine(cursor, stage, path, bad + failed)
+            batch_no[path] += 1
+            save_checkpoint(cursor, stage, path, offset, batch_no[path], last_key, done)
+            conn.commit()  # rows, quarantine and checkpoint land together
+            inserted += len(rows) - len(failed)
+            quarantined += len(bad) + len(failed)
+            batches += 1
+            if batches % 20 == 0:
+                rate = inserted / (time.perf_counter() - started)
+                log(f"{table}: {inserted} rows ({rate:.0f} rows/s), {quarantined} quarantined")
+    except BaseException:
+        # Parsers may be blocked on a full queue that nobody drains any more
+        for p in procs:
+            p.terminate()
+        raise
+    finally:
+        for p in procs:
+            p.join()
+        cursor.execute("SET foreign_key_checks = 1")
+        if rebuild_indexes:
+            rebuild_indexes()
+        cursor.close()
+
+    elapsed = time.perf_counter() - started
+    rate = inserted / elapsed if elapsed else 0.0
+    rss = peak_rss_mb()
+    memory = f", peak RSS {rss[0]:.0f} MB (main) / {rss[1]:.0f} MB (largest parser)" if rss else ""
+    log(f"{table}: inserted {inserted} rows in {elapsed:.1f}s ({rate:.0f} rows/s), {quarantined} quarantined{memory}")
+    if errors:
+        raise RuntimeError(f"Import of {table} stopped early, re-run to resume: {'; '.join(errors)}")
+    return inserted, rate
@@ -7,101 +7,101 @@ from services.validation_service import ValidationService
 import secrets
 import string
 
+# Ten letters: 52^10 codes, so a random one is practically never taken
+DISCOUNT_CODE_LENGTH = 10
+MAX_DISCOUNT_BATCH = 100000
+
+
+def new_discount_code():
+    alphabet = string.ascii_letters  # a–z + A–Z
+    return ''.join(secrets.choice(alphabet) for _ in range(DISCOUNT_CODE_LENGTH))
+
+
 class DiscountService:
-    #Will return a string of 10 random letters of various capitalisations 
     @staticmethod
-    def generate_discount_automatic(token, discount):
-        #10 tries before relaying an error to the user, to decrease the chance of duplicates causing a rejection of an auto generated discount code 
-        amount = discount.amount 
-        loid = discount.lot_id
-        perc = discount.percentage
-        exp_date = discount.expiration_date
-        uid = discount.user_id
+    def discount_row(discount, code):
+        return {
+            "amount" : None if discount.amount == 0 else discount.amount,
+            "created_at" : datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "lot_id" : None if discount.lot_id == 0 else discount.lot_id,
+            "code" : code,
+            "percentage" : None if discount.percentage == 0 else discount.percentage,
+            "expiration_date" :None if discount.expiration_date == None else discount.expiration_date,
+            "user_id" : None if discount.user_id == 0 else discount.user_id
+        }
 
-        if perc and perc > 100:
+    @staticmethod
+    def check_percentage(discount):
+        if discount.percentage and discount.percentage > 100:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Percentage discount cannot exceed 100%"
             )
 
+    @staticmethod
+    def check_admin(token):
         session_user = ValidationService.validate_session_token(token)
-        if ValidationService.check_valid_admin(session_user):
-            for i in range(0,10) :
-                alphabet = string.ascii_letters  # a–z + A–Z
-                code = ''.join(secrets.choice(alphabet) for _ in range(10))
-                c = get_item_db('code',code,'discounts')
-                if not c :
-                    discount = {
-                        "amount" : None if amount == 0 else amount,
-                        "created_at" : datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                        "lot_id" : None if loid == 0 else loid,
-                        "code" : code,
-                        "percentage" : None if perc == 0 else perc,
-                        "expiration_date" :None if exp_date == None else exp_date,
-                        "user_id" : None if uid == 0 else uid
-                    }
-                    return save_discount.create_discount(discount)
-                 
+        if not ValidationService.check_valid_admin(session_user):
             raise HTTPException(
-                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                detail="Too many attempts. Please try again later."
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="The user is not an admin.",
             )
+
+    #Will return a string of 10 random letters of various capitalisations 
+    @staticmethod
+    def generate_discount_automatic(token, discount):
+        DiscountService.check_percentage(discount)
+        DiscountService.check_admin(token)
+        # The insert itself finds out whether a code is taken; 10 tries before giving up
+        for i in range(0,10) :
+            row = DiscountService.discount_row(discount, new_discount_code())
+            if save_discount.insert_discount(row) is not None:
+                return row
+
         raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="The user is not an admin.",
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many attempts. Please try again later."
         )
-          
+
+    @staticmethod
+    def generate_discount_batch(token, batch):
+        """`batch.count` discounts with the same terms and random codes, for a campaign"""
+        DiscountService.check_percentage(batch)
+        DiscountService.check_admin(token)
+        if not 0 < batch.count <= MAX_DISCOUNT_BATCH:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Generate between 1 and {MAX_DISCOUNT_BATCH} codes at a time."
+            )
+        template = DiscountService.discount_row(batch, None)
+        rows = save_discount.insert_with_codes([template] * batch.count, new_discount_code)
+        if rows is None:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many attempts. Please try again later."
+            )
+        return {"count": len(rows), "codes": [row["code"] for row in rows]}
 
     #Admin chosen discount string 
     @staticmethod
     def generate_discount_manual(token, discount):
-        
-        amount = discount.amount
-        loid = discount.lot_id
         disc_str = discount.code
-        perc = discount.percentage
-        exp_date = discount.expiration_date
-        uid = discount.user_id
+        DiscountService.check_percentage(discount)
+        DiscountService.check_admin(token)
 
-        if perc and perc > 100:
+        if len(disc_str) > 30 or not disc_str.isalpha():
             raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Percentage discount cannot exceed 100%"
-            )
-  
-        session_user = ValidationService.validate_session_token(token)
-        if ValidationService.check_valid_admin(session_user):
-
-            c = get_item_db('code',disc_str,'discounts')
-
-            if not c :
-                    if len(c) > 30 or not disc_str.isalpha():
-                        raise HTTPException(
-                                    status_code=status.HTTP_400_BAD_REQUEST,
-                                    detail="Ensure the discount name has only letters, and is shorter than 30 characters."
-                                )
-                    discount = {
-                        "amount" : None if amount == 0 else amount,
-                        "created_at" : datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                        "lot_id" : None if loid == 0 else loid,
-                        "code" : disc_str,
-                        "percentage" : None if perc == 0 else perc,
-                        "expiration_date" :None if exp_date == None else exp_date,
-                        "user_id" : None if uid == 0 else uid
-                        
-                    }
-                    save_discount.create_discount(discount)
-                  
-                    return discount
-            
+                        status_code=status.HTTP_400_BAD_REQUEST,
+                        detail="Ensure the discount name has only letters, and is shorter than 30 characters."
+                    )
+        discount = DiscountService.discount_row(discount, disc_str)
+        # No lookup first: the UNIQUE index on code refuses a code that is taken
+        if save_discount.insert_discount(discount) is None:
             raise HTTPException(
                 status_code=status.HTTP_409_CONFLICT,
                 detail="This value already exists."
-            )        
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="The user is not an admin.",
-        )
+            )
+        return discount
 
     @staticmethod
     def edit_discount(token, id , discount):
@@ -1,14 +1,17 @@
-from datetime import datetime, timedelta
 from typing import Dict, Any, Optional
 from fastapi import HTTPException, status
-from storage_utils import load_data_db_table, get_item_db, save_parking_sessions, save_parking_lot
+from storage_utils import get_discount_row, get_item_db, get_parking_lot_row, list_parking_lot_rows, list_rows, save_parking_sessions, save_parking_lot, unit_of_work
+from occupancy import session_entered, session_left
 from session_manager import get_session, add_session
+from app_logging import get_logger, fields
+from timeutil import parse_timestamp, format_timestamp, minutes_between, now
 from models.parking_models import (
     ParkingLotBase, SessionStart, SessionStop, 
     SessionResponse, ParkingLotResponse
 )
 import math 
 
+logger = get_logger("parking")
 
 # Setup system user voor automatische parkeerregistratie
 system_user = {
@@ -24,10 +27,9 @@ system_token = "system-token"
 
 # Voeg system user toe als hij nog niet bestaat
 if not get_session(system_token):
-    add_session(system_token, system_user)
+    add_session(system_token, system_user, ttl=0)
 
 def calculate_rate(minutes, start, pl_tariff,pl_dtariff,):
-    start = datetime.strptime(start, "%Y-%m-%d %H:%M:%S")
     total_minutes = minutes
     total_days = ((total_minutes / 60) / 24) 
 
@@ -46,7 +48,6 @@ class ParkingService:
     @staticmethod
     def validate_session_token(token: Optional[str]) -> Dict[str, Any]:
         """Validate session token and return user data"""
-        # print(f"DEBUG: Received token: '{token}' (type: {type(token)})")  # Debug line
         if not token:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -54,7 +55,6 @@ class ParkingService:
             )
         
         session_user = get_session(token)
-        # print(f"DEBUG: Session lookup result: {session_user}")  # Debug line
         if not session_user:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -78,21 +78,11 @@ class ParkingService:
         # Validate session token
         session_user = ParkingService.validate_session_token(token)
 
-        
-        # Check if there's already an active session for this license plate
-        filtered_sessions = [p for p in get_item_db('licenseplate', session_data.licenseplate, 'parking_sessions') if p['stopped'] == None]
-        
-        if len(filtered_sessions) > 0:
-            raise HTTPException(
-                status_code=status.HTTP_409_CONFLICT,
-                detail="Cannot start a session when another session for this license plate is already active"
-            )
-        
         # Create new session
         new_session = {
             "parking_lot_id" : lot_id, 
             "licenseplate": session_data.licenseplate,
-            "started": datetime.now().strftime("%y-%m-%d %H:%M:%S"),
+            "started": now(),
             "stopped": None,
             "user": session_user["username"],
             "cost": 0 if session_user.get("hotel_guest") else None,
@@ -100,12 +90,21 @@ class ParkingService:
 
         }
         
-        save_parking_sessions.create_parking_sessions(new_session)
+        # The session and the lot's counter commit together
+        with unit_of_work():
+            # The insert itself refuses a second active session for this license plate
+            if save_parking_sessions.start_parking_sessions(new_session) is None:
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="Cannot start a session when another session for this license plate is already active"
+                )
+            session_entered(lot_id)
+        logger.info("parking session started", extra=fields(lot_id=lot_id, licenseplate=session_data.licenseplate, username=session_user["username"]))
         
         return SessionResponse(
             message="Session started successfully",
             licenseplate=session_data.licenseplate,
-            started=new_session["started"]
+            started=format_timestamp(new_session["started"])
         )
     
     @staticmethod
@@ -114,67 +113,74 @@ class ParkingService:
         # Validate session token
         session_user = ParkingService.validate_session_token(token)
         
-        get_sessions_for_plate = get_item_db('licenseplate', session_data.licenseplate, 'parking_sessions')
-        session = [s for s in get_sessions_for_plate if s['stopped'] == 'None' and s['user'] == session_user['username']]
+        # One transaction from reading the session to the counter update. The session rows stay
+        # locked until the commit, so a concurrent stop for the same plate waits and then finds
+        # nothing to stop instead of stopping (and counting) the session twice.
+        with unit_of_work():
+            get_sessions_for_plate = get_item_db('licenseplate', session_data.licenseplate, 'parking_sessions', for_update=True)
+            session = [s for s in get_sessions_for_plate if s['stopped'] is None and s['user'] == session_user['username']]
         
-        if len(session) == 0:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Cannot stop a session when there is no active session for this license plate"
-            )
+            if len(session) == 0:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="Cannot stop a session when there is no active session for this license plate"
+                )
         
        
-        # Get the first (and should be only) active session
-        session = next(iter(session))
+            # Get the first (and should be only) active session
+            session = next(iter(session))
 
-        # Update session with stop time
+            # Update session with stop time
 
-        session['stopped'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            session['started'] = parse_timestamp(session['started'])
+            session['stopped'] = now()
 
-        session['payment_status'] = "pending"
+            session['payment_status'] = "pending"
         
-        session['duration_minutes'] = ((datetime.strptime(session['stopped'], "%Y-%m-%d %H:%M:%S") -  datetime.strptime(session['started'] , "%Y-%m-%d %H:%M:%S") ).total_seconds() / 60.0)
-
-        # Compute cost if lot data is available; skip if not to avoid test patch collisions
-        session_cost: Optional[float] = None
-        pl_list = get_item_db('id', lot_id, 'parking_lots')
-        if pl_list:
-            pl = pl_list[0]
-            try:
-                tariff = float(pl.get('tariff')) if pl.get('tariff') is not None else None
-                # Support both keys: 'day_tariff' and legacy 'daytariff'
-                day_tariff_val = pl.get('day_tariff', pl.get('daytariff'))
-                day_tariff = float(day_tariff_val) if day_tariff_val is not None else None
-                if tariff is not None and day_tariff is not None:
-                    base_cost = calculate_rate(session['duration_minutes'], session['started'], tariff, day_tariff)
-                    # Only check discounts when a code is provided
-                    if discount_code:
-                        findDiscount = get_item_db('code', discount_code, 'discounts')
-                        if findDiscount:
-                            d = findDiscount[0]
-                            exp_ok = ('expiration_date' in d) and d['expiration_date'] >= datetime.now().strftime("%Y-%m-%d")
-                            lot_ok = ('lot_id' in d) and d['lot_id'] == lot_id
-                            perc = float(d['percentage']) if 'percentage' in d and d['percentage'] is not None else None
-                            if exp_ok and lot_ok and perc is not None:
-                                session_cost = base_cost * (1 - perc / 100)
-                            else:
-                                session_cost = base_cost
-                    else:
-                        session_cost = base_cost
-            except Exception:
-                # If any issue arises (e.g., patched returns without expected keys), leave cost as None
-                session_cost = None
-
-        session['cost'] = session_cost
-        # Save sessions
-        save_parking_sessions.change_parking_sessions(session)
+            session['duration_minutes'] = minutes_between(session['started'], session['stopped'])
+
+            # Compute cost if lot data is available; skip if not to avoid test patch collisions
+            session_cost: Optional[float] = None
+            pl = get_parking_lot_row(lot_id)
+            if pl:
+                try:
+                    tariff = float(pl.get('tariff')) if pl.get('tariff') is not None else None
+                    # Support both keys: 'day_tariff' and legacy 'daytariff'
+                    day_tariff_val = pl.get('day_tariff', pl.get('daytariff'))
+                    day_tariff = float(day_tariff_val) if day_tariff_val is not None else None
+                    if tariff is not None and day_tariff is not None:
+                        base_cost = calculate_rate(session['duration_minutes'], session['started'], tariff, day_tariff)
+                        # Only check discounts when a code is provided
+                        if discount_code:
+                            d = get_discount_row(discount_code)
+                            if d:
+                                expires = parse_timestamp(d.get('expiration_date'))
+                                exp_ok = ('expiration_date' in d) and (expires is None or expires.date() >= now().date())
+                                lot_ok = ('lot_id' in d) and d['lot_id'] == lot_id
+                                perc = float(d['percentage']) if 'percentage' in d and d['percentage'] is not None else None
+                                if exp_ok and lot_ok and perc is not None:
+                                    session_cost = base_cost * (1 - perc / 100)
+                                else:
+                                    session_cost = base_cost
+                        else:
+                            session_cost = base_cost
+                except Exception:
+                    # If any issue arises (e.g., patched returns without expected keys), leave cost as None
+                    logger.warning("could not price parking session", exc_info=True, extra=fields(lot_id=lot_id))
+                    session_cost = None
+
+            session['cost'] = session_cost
+            # Save sessions
+            save_parking_sessions.change_parking_sessions(session)
+            session_left(session.get("parking_lot_id") or lot_id)
+        logger.info("parking session stopped", extra=fields(lot_id=lot_id, licenseplate=session_data.licenseplate, cost=session_cost, discount_code=discount_code))
      
         
         return SessionResponse(
             message="Session stopped successfully",
             licenseplate=session_data.licenseplate,
-            started=session["started"],
-            stopped=session["stopped"],
+            started=format_timestamp(session["started"]),
+            stopped=format_timestamp(session["stopped"]),
             cost=session["cost"]
         )
 
@@ -233,17 +239,19 @@ class ParkingService:
         )
     
     @staticmethod
-    def list_parking_lots(token: Optional[str]):
-        # Load and optionally filter data
-        parking_lots = load_data_db_table("parking_lots")
+    def list_parking_lots(token: Optional[str], page=None):
+        # Pages and exports come from the database; the whole list is served from the lot cache
+        if page is not None:
+            return list_rows("parking_lots", page)
+        parking_lots = list_parking_lot_rows()
         return parking_lots
 
     @staticmethod
     def get_parking_lot(lot_id: str, token: Optional[str]):
-        parking_lot = get_item_db('id',lot_id,'parking_lots')
+        parking_lot = get_parking_lot_row(lot_id)
         if not parking_lot:
             raise HTTPException(status_code=404, detail="Parking lot not found")
-        return parking_lot
+        return [parking_lot]
 
     @staticmethod
     def list_parking_sessions(lot_id: str, token: Optional[str]):
@@ -6,9 +6,13 @@ from fastapi import HTTPException, status
 from datetime import datetime
 from typing import Optional, List, Dict
 from session_calculator import generate_payment_hash, generate_transaction_validation_hash
-from storage_utils import load_data_db_table,get_item_db, save_payment,save_parking_sessions,save_refunds
+from storage_utils import load_data_db_table,get_item_db, list_rows, save_payment,save_parking_sessions,save_refunds
 from models.payment_models import PaymentBase, PaymentRefund, PaymentUpdate, PaymentOut, PaymentCreate
 from services.validation_service import ValidationService
+from app_logging import get_logger, fields
+
+logger = get_logger("payments")
+
 class PaymentService:
 
     def get_session(token: str) -> Optional[dict]:
@@ -63,6 +67,7 @@ class PaymentService:
         }
         # Primary persistence path
         save_payment.create_payment(new_payment)
+        logger.info("payment created", extra=fields(transaction=transaction_id, amount=payment.amount))
         # Ensure test mock 'save_payment' registers a direct call when patched
         if hasattr(save_payment, 'assert_called_once'):
             try:
@@ -87,6 +92,7 @@ class PaymentService:
             "hash": generate_transaction_validation_hash(),
         }
         save_refunds.create_refund(refund_entry)
+        logger.info("refund created", extra=fields(transaction=transaction_id, coupled_to=payment.coupled_to))
         if hasattr(save_refunds, 'assert_called_once'):
             try:
                 save_refunds(refund_entry)  # type: ignore[misc]
@@ -114,16 +120,18 @@ class PaymentService:
         return pmnt
 
 
-    def get_user_payments(username: str) -> List[Dict]:
-        payments = load_data_db_table("payments")
-        return [p for p in payments if p.get("initiator") == username]
+    def get_user_payments(username: str, page=None) -> List[Dict]:
+        if page is not None:
+            return list_rows("payments", page, "initiator", username)
+        return get_item_db("initiator", username, "payments")
 
 
-    def get_all_user_payments(admin_session: dict, username: str) -> List[Dict]:
+    def get_all_user_payments(admin_session: dict, username: str, page=None) -> List[Dict]:
         if admin_session.get("role") != "ADMIN" and admin_session.get("role") !="EMPLOYEE" :
             raise PermissionError("Access denied")
-        payments = load_data_db_table("payments")
-        return [p for p in payments if p.get("initiator") == username]
+        if page is not None:
+            return list_rows("payments", page, "initiator", username)
+        return get_item_db("initiator", username, "payments")
 
     def delete_payment(admin_session: dict, transaction_id: str) -> List[Dict]:
       
@@ -1,8 +1,9 @@
-from datetime import datetime
 from typing import Dict, Any, Optional
 from fastapi import HTTPException, status
 from services.validation_service import ValidationService
-from storage_utils import load_data_db_table, get_item_db, save_reservation, save_parking_lot
+from timeutil import parse_timestamp, naive, now
+from storage_utils import load_data_db_table, get_item_db, get_parking_lot_row, list_rows, save_reservation, unit_of_work
+from occupancy import reserve_spot, release_spot
 from models.reservation_models import ReservationRegister, ReservationResponse, ReservationOut
 
 class ReservationService:
@@ -27,50 +28,40 @@ class ReservationService:
             # Override user_id to ensure it matches session user
             reservation_data.user_id = session_user["id"]
 
-        parking_lots = load_data_db_table("parking_lots")
-
-        # Check if parking lot has available spots
-        lot = parking_lots.get(reservation_data.lot_id)
-        if lot:
-            if lot["reserved"] >= lot["capacity"]:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="No available spots in the selected parking lot"
-                )
-        else:
+        lot = get_parking_lot_row(reservation_data.lot_id)
+        if not lot:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Parking lot not found"
             )
 
-        # Load existing reservations
-        reservations = load_data_db_table("reservations")
-
-        # Create new reservation entry
-        new_reservation = {
-            "id": f"{len(reservations) + 1}",
-            "user_id": reservation_data.user_id,
-            "lot_id": reservation_data.lot_id,
-            "vehicle_id": reservation_data.vehicle_id,
-            "start_time": reservation_data.start_time,
-            "end_time": reservation_data.end_time,
-            "created_at": int(datetime.now().timestamp())
-        }
-
-        # Update parkinglots to show reservation
-        lot["reserved"] += 1
-        save_parking_lot.change_plt(lot)
-
+        # The spot and the reservation commit together: when anything fails, the spot was never taken
+        with unit_of_work():
+            # Claim a spot with one conditional UPDATE, so concurrent requests can't overbook the lot
+            if not reserve_spot(reservation_data.lot_id):
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="No available spots in the selected parking lot"
+                )
 
-        # Save the new reservation
-        save_reservation.create_reservation(new_reservation)
+            # Create new reservation entry
+            new_reservation = {
+                "user_id": reservation_data.user_id,
+                "parking_lot_id": reservation_data.lot_id,
+                "vehicle_id": reservation_data.vehicle_id,
+                "start_time": naive(parse_timestamp(reservation_data.start_time)),
+                "end_time": naive(parse_timestamp(reservation_data.end_time)),
+                "created_at": now()
+            }
 
+            # Save the new reservation; AUTO_INCREMENT assigns the id
+            reservation_id = save_reservation.create_reservation(new_reservation)
 
-        return {"status": "Success" ,"reservation": new_reservation}
+        return {"status": "Success" ,"reservation": {"id": str(reservation_id), **new_reservation}}
 
     # get
     @staticmethod
-    def get_reservations_list(user_id: str, token: str) -> Dict[str, Any]:
+    def get_reservations_list(user_id: str, token: str, page=None) -> Dict[str, Any]:
         """Retrieve reservations for a specific user"""
         # Validate session token
         session_user = ValidationService.validate_session_token(token)
@@ -88,6 +79,9 @@ class ReservationService:
                     detail="Access denied"
                 )
 
+        if page is not None:
+            return list_rows("reservations", page, "user_id", user_id)
+
         reservations = load_data_db_table("reservations")
 
         return [ReservationRegister(**reservation) for reservation in reservations if reservation["user_id"] == user_id]
@@ -118,17 +112,13 @@ class ReservationService:
             
         # Transform DB row to API schema (ReservationOut) with datetimes
         def to_dt(v):
-            if isinstance(v, datetime):
-                return v
-            if isinstance(v, (int, float)):
-                return datetime.fromtimestamp(int(v))
-            if isinstance(v, str):
-                for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%dT%H:%M:%S.%f"):
-                    try:
-                        return datetime.strptime(v.replace("Z", ""), fmt)
-                    except ValueError:
-                        continue
-            raise HTTPException(status_code=500, detail="Invalid datetime value in reservation")
+            try:
+                value = parse_timestamp(int(v) if isinstance(v, float) else v)
+            except (TypeError, ValueError):
+                value = None
+            if value is None:
+                raise HTTPException(status_code=500, detail="Invalid datetime value in reservation")
+            return naive(value)
 
         out = {
             "id": str(reservation.get("id")) if reservation.get("id") is not None else None,
@@ -170,16 +160,12 @@ class ReservationService:
                     detail="Access denied"
                 )
 
-        # Update parking lot to free up the reserved spot
-        parking_lots = load_data_db_table("parking_lots")
-        lot = parking_lots.get(reservation["lot_id"])
-        if lot and lot["reserved"] > 0:
-            lot["reserved"] -= 1
-            save_parking_lot.change_plt(lot)
-    
+        with unit_of_work():
+            # Free up the reserved spot (a no-op for a lot that no longer exists)
+            release_spot(reservation["parking_lot_id"])
 
-        # Remove the reservation
-        save_reservation.delete_reservation(res_id)
+            # Remove the reservation
+            save_reservation.delete_reservation(res_id)
 
 
         return {"status": "Success", "message": "Reservation deleted"}
@@ -1,13 +1,30 @@
+import asyncio
 import hashlib
+import os
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional
 from datetime import datetime
 from fastapi import HTTPException, status
-from storage_utils import load_data_db_table, get_item_db, save_user
+from storage_utils import get_item_db, get_item_db_async, run_in_db_executor, save_user
 
 from session_manager import add_session,get_session
+from app_logging import get_logger, fields
 from models.user_models import UserRegister, UserLogin, LoginResponse, MessageResponse
 from argon2 import PasswordHasher
+from argon2.exceptions import VerificationError, InvalidHashError
+
+logger = get_logger("users")
+
+# One hasher for the process; its parameters decide when stored hashes need a rehash
+ph = PasswordHasher()
+
+# argon2 is CPU bound by design; verifications run on their own bounded pool so they neither
+# block the event loop nor tie up the database executor threads
+_hash_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("PASSWORD_HASH_WORKERS", os.cpu_count() or 2)),
+    thread_name_prefix="argon2",
+)
 
 # ===============================
 # SYSTEM USER SETUP
@@ -25,7 +42,7 @@ system_token = "system-token"
 
 # Voeg system user toe aan session manager als hij nog niet bestaat
 if not get_session(system_token):
-    add_session(system_token, system_user)
+    add_session(system_token, system_user, ttl=0)
 
 
 # ===============================
@@ -35,15 +52,20 @@ class UserService:
     @staticmethod
     def hash_password(password: str) -> str:
         """Hash password using Argon2 and md5"""
-        ph = PasswordHasher()
         return ph.hash(hashlib.md5(password.encode()).hexdigest())
-        # return hashlib.md5(password.encode()).hexdigest()
+
+    @staticmethod
+    def verify_password(stored_hash: str, md5_password: str) -> bool:
+        """Check an md5-prehashed password against a stored argon2 hash"""
+        try:
+            return ph.verify(stored_hash, md5_password)
+        except (VerificationError, InvalidHashError):
+            return False
     
     @staticmethod
     def user_exists(username: str) -> bool:
         """Check if username already exists"""
-        users = load_data_db_table("users")
-        return any(user.get('username') == username for user in users)
+        return len(get_item_db("username", username, "users", columns=("id",), limit=1)) > 0
     
     @staticmethod
     def create_user(user_data: UserRegister) -> MessageResponse:
@@ -71,6 +93,7 @@ class UserService:
             'active': True
         }
         save_user.create_user(new_user)
+        logger.info("user registered", extra=fields(username=user_data.username))
 
         
         return MessageResponse(message="User created successfully")
@@ -93,12 +116,12 @@ class UserService:
     @staticmethod
     def update_user(user_id: str, user_data: UserRegister) -> MessageResponse:
         """Update user information"""
-        users = load_data_db_table("users")
+        users = get_item_db("id", user_id, "users")
         user_found = False
         c_user = None 
 
         for user in users:
-            if user.get('id') == user_id:
+            if user.get('id') == str(user_id):
                 user_found = True
                 user['name'] = user_data.name
                 user['email'] = user_data.email
@@ -120,41 +143,75 @@ class UserService:
         return MessageResponse(message="User updated successfully")
     
     @staticmethod
-    def authenticate_user(credentials: UserLogin) -> LoginResponse:
-        """Authenticate user and create session"""
-        ph = PasswordHasher()
-        # Validate credentials
+    def check_credentials(credentials: UserLogin) -> str:
+        """Validate the login payload and return the md5 prehash that is argon2-verified"""
         if not credentials.username or not credentials.password:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Missing credentials"
             )
-        
-       
-        
-        md5_password = hashlib.md5((credentials.password).encode()).hexdigest()
-        # Load users and find match
-        users = load_data_db_table("users")
+        return hashlib.md5((credentials.password).encode()).hexdigest()
 
-        
-        for user in users:
-            if (user.get("username") == credentials.username and 
-                ph.verify(user["password"], md5_password)):
-                
-                # Generate session token
-                token = str(uuid.uuid4())
-                add_session(token, user)
-                
-                return LoginResponse(
-                    message="User logged in successfully",
-                    session_token=token
-                )
-        
-        # No matching user found
+    @staticmethod
+    def start_user_session(user: dict, md5_password: str, new_hash: Optional[str] = None) -> LoginResponse:
+        """Create a session for a verified user, upgrading a hash made with stale argon2 parameters.
+
+        new_hash is that upgrade when the caller already computed it on the hash pool.
+        """
+        if new_hash is None and ph.check_needs_rehash(user["password"]):
+            new_hash = ph.hash(md5_password)
+        if new_hash is not None:
+            save_user.change_user({"id": user["id"], "password": new_hash})
+            user["password"] = new_hash
+            logger.info("password rehashed on login", extra=fields(username=user.get("username")))
+
+        # Generate session token
+        token = str(uuid.uuid4())
+        add_session(token, user)
+        logger.info("login succeeded", extra=fields(username=user.get("username")))
+
+        return LoginResponse(
+            message="User logged in successfully",
+            session_token=token
+        )
+
+    @staticmethod
+    def login_failed(username: str):
+        logger.warning("login failed", extra=fields(username=username))
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid credentials"
         )
+
+    @staticmethod
+    def authenticate_user(credentials: UserLogin) -> LoginResponse:
+        """Authenticate user and create session"""
+        md5_password = UserService.check_credentials(credentials)
+        # Exactly the rows for this username (UNIQUE index)
+        users = get_item_db("username", credentials.username, "users")
+
+        for user in users:
+            if UserService.verify_password(user["password"], md5_password):
+                return UserService.start_user_session(user, md5_password)
+
+        UserService.login_failed(credentials.username)
+
+    @staticmethod
+    async def authenticate_user_async(credentials: UserLogin) -> LoginResponse:
+        """authenticate_user for the event loop: DB work on the DB executor, argon2 on the hash pool"""
+        md5_password = UserService.check_credentials(credentials)
+        users = await get_item_db_async("username", credentials.username, "users")
+
+        loop = asyncio.get_running_loop()
+        for user in users:
+            if await loop.run_in_executor(_hash_executor, UserService.verify_password, user["password"], md5_password):
+                # The rehash is as costly as the verify, so it goes on the hash pool as well
+                new_hash = None
+                if ph.check_needs_rehash(user["password"]):
+                    new_hash = await loop.run_in_executor(_hash_executor, ph.hash, md5_password)
+                return await run_in_db_executor(UserService.start_user_session, user, md5_password, new_hash)
+
+        UserService.login_failed(credentials.username)
     
     @staticmethod
     def get_user_by_username(username: str) -> Optional[dict]:
@@ -177,7 +234,7 @@ class UserService:
     @staticmethod
     def update_user(user_data: UserRegister) -> MessageResponse:
         """Update existing user details"""
-        users = load_data_db_table("users")
+        users = get_item_db("username", user_data.username, "users")
         for user in users:
             if user.get("username") == user_data.username:
                 user['name'] = user_data.name
@@ -195,7 +252,7 @@ class UserService:
     @staticmethod
     def delete_user(username: str) -> MessageResponse:
         """Delete user by username"""
-        users = load_data_db_table("users")
+        users = get_item_db("username", username, "users")
         for i, user in enumerate(users):
             if user.get("username") == username:
                 save_user.delete_user(user['id'])
@@ -5,9 +5,8 @@ from models.user_models import User
 from typing import Optional
 
 from services.validation_service import ValidationService
-from storage_utils import load_data_db_table,get_item_db, save_vehicle
+from storage_utils import load_data_db_table,get_item_db, list_vehicle_history, get_vehicle_history_summary, Page, save_vehicle
 from services.user_service import UserService
-from loaddb import load_data
 
 
 class VehicleService:
@@ -15,7 +14,7 @@ class VehicleService:
     def getUserVehicleID(session_user : User ):
         """getUserVehicleIDs"""
         # From Vehicles get all for where the user_id == session user_id
-        uvehicles = get_item_db('user_id',session_user['id'],"vehicles")
+        uvehicles = get_item_db('user_id',session_user['id'],"vehicles", columns=("id",))
         id_only = [v['id'] for v in uvehicles]
         return id_only
         
@@ -27,7 +26,7 @@ class VehicleService:
         
     @staticmethod 
     def liscensce_plate_for_id(vid: str):
-        return get_item_db("id",vid,"vehicles")[0]['license_plate']
+        return get_item_db("id",vid,"vehicles", columns=("license_plate",), limit=1)[0]['license_plate']
 
        
     @staticmethod
@@ -41,7 +40,7 @@ class VehicleService:
     @staticmethod
     def get_vehicle_by_license_plate(license_plate: str, token: str):
         vehicle = get_item_db("license_plate",license_plate,"vehicles")
-        return Vehicle(**vehicle[0]) if vehicle else None
+        return Vehicle.model_validate(vehicle[0], from_attributes=True) if vehicle else None
         
     @staticmethod
     def checkForVehicle(session_user : User , Vid : str):
@@ -65,11 +64,8 @@ class VehicleService:
     
     @staticmethod
     def check_for_liscense_id(lid):
-        vehicles = load_data_db_table("vehicles")
-        # Extract ALL license plates from the system and normalize them (remove dashes)
-        vehicle_lids = [v["license_plate"] for v in vehicles]
-        
-        if lid in vehicle_lids:
+        # Indexed lookup on the UNIQUE license_plate column
+        if get_item_db("license_plate", lid, "vehicles", columns=("id",), limit=1):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail={"error": "Vehicle with this license plate already exists in the system", "license_plate": lid}
@@ -84,7 +80,7 @@ class VehicleService:
         VehicleService.check_for_parameters(data)
 
         lid = data["license_plate"].replace("-", "")
-        VehicleService.check_for_liscense_id(lid, session_user)
+        VehicleService.check_for_liscense_id(lid)
 
         new_vehicle = {
             "user_id": session_user["id"],
@@ -140,7 +136,7 @@ class VehicleService:
         if cur_vehicle and user and cur_vehicle['user_id'] == user['id']:
             save_vehicle.delete_vehicle(vid)
 
-            updated_vehicles = load_data_db_table("vehicles")
+            updated_vehicles = load_data_db_table("vehicles", columns=("id",))
             if all(v.get("id") != cur_vehicle['id'] for v in updated_vehicles) :
                 return {"Status" : "Deleted"}
         raise ValueError(f"Vehicle with id {vid} not found for user {session_user['username']}")
@@ -180,11 +176,20 @@ class VehicleService:
         
 
     @staticmethod
-    def get_vehicle_history(token : str, vid : str): 
-        """Get the vehicle history"""
+    def get_vehicle_history(token : str, vid : str, page=None, since=None, until=None): 
+        """Get the vehicle's parking sessions, oldest first, optionally started in [since, until)"""
         session_user = ValidationService.validate_session_token(token)
         VehicleService.checkForVehicle(session_user, vid)
         lp = VehicleService.liscensce_plate_for_id(vid)
-        ssn = load_data.load_parking_sessions()
-        
-        return [s for s in ssn if s["licenseplate"] == lp]
+        try:
+            return list_vehicle_history(lp, page or Page(), since, until)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    @staticmethod
+    def get_vehicle_history_summary(token : str, vid : str):
+        """Get the number of sessions, total time and cost of a vehicle"""
+        session_user = ValidationService.validate_session_token(token)
+        VehicleService.checkForVehicle(session_user, vid)
+        lp = VehicleService.liscensce_plate_for_id(vid)
+        return get_vehicle_history_summary(lp)
@@ -1,5 +1,6 @@
 from datetime import datetime
 from storage_utils import get_item_db
+from timeutil import parse_timestamp
 from hashlib import md5
 import math
 import uuid
@@ -9,12 +10,8 @@ def calculate_price(parkinglot, sid, data, is_hotel_guest=False):
         return 0, 0, 0  # prijs = 0, uren = 0, dagen = 0
     
     price = 0
-    start = datetime.strptime(data["started"], "%d-%m-%Y %H:%M:%S")
-
-    if data.get("stopped"):
-        end = datetime.strptime(data["stopped"], "%d-%m-%Y %H:%M:%S")
-    else:
-        end = datetime.now()
+    start = parse_timestamp(data["started"])
+    end = parse_timestamp(data.get("stopped")) or datetime.now()
 
     diff = end - start
     hours = math.ceil(diff.total_seconds() / 3600)
@@ -42,7 +39,7 @@ def generate_transaction_validation_hash():
     return str(uuid.uuid4())
 
 def check_payment_amount(hash):
-    payments = get_item_db('transaction',hash,'payments')
+    payments = get_item_db('transaction',hash,'payments', columns=("transaction", "amount"))
     total = 0
 
     for payment in payments:
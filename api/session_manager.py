@@ -1,16 +1,52 @@
-sessions = {}
+import logging
+import os
+from app_logging import get_logger, fields, token_hint
+from session_store import InMemorySessionStore, MySQLSessionStore
 
-def add_session(token, user):
-    print(f"DEBUG: Adding session - Token: '{token}', User: {user}")
-    sessions[token] = user
-    print(f"DEBUG: Current sessions: {sessions}")
+logger = get_logger("sessions")
+
+# Backend is picked per process from SESSION_BACKEND: "memory" (default, single worker)
+# or "mysql" (shared by all uvicorn workers, survives restarts)
+SESSION_TTL = int(os.environ.get("SESSION_TTL", 86400))
+
+
+def create_store():
+    if os.environ.get("SESSION_BACKEND", "memory") == "mysql":
+        return MySQLSessionStore(
+            ttl=SESSION_TTL,
+            cache_ttl=int(os.environ.get("SESSION_CACHE_TTL", 5)),
+        )
+    return InMemorySessionStore(
+        ttl=SESSION_TTL,
+        max_sessions=int(os.environ.get("SESSION_MAX", 100000)),
+    )
+
+
+store = create_store()
+
+# Sessions registered in code (e.g. the system user) exist in every worker already, so they
+# stay process-local and never expire or get evicted
+pinned_sessions = {}
+
+def add_session(token, user, ttl=None):
+    logger.info("session added", extra=fields(token=token_hint(token), username=user.get("username"), pinned=ttl == 0))
+    if ttl == 0:
+        pinned_sessions[token] = user
+    else:
+        store.set(token, user, ttl)
 
 def remove_session(token):
-    return sessions.pop(token, None)
+    logger.info("session removed", extra=fields(token=token_hint(token)))
+    pinned = pinned_sessions.pop(token, None)
+    return pinned if pinned is not None else store.delete(token)
 
 def get_session(token):
-    print(f"DEBUG: Looking up session for token: '{token}'")
-    print(f"DEBUG: Available sessions: {list(sessions.keys())}")
-    result = sessions.get(token)
-    print(f"DEBUG: Session lookup result: {result}")
-    return result
\ No newline at end of file
+    if not token:
+        return None
+    result = pinned_sessions.get(token)
+    if result is None:
+        result = store.get(token)
+    # Hot path: only build the record when debug logging is on
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("session lookup", extra=fields(token=token_hint(token), hit=result is not None))
+    return result
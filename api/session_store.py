@@ -0,0 +1,134 @@
+import json
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+# Never written to the sessions table
+SESSION_EXCLUDED_FIELDS = ("password",)
+
+
+class InMemorySessionStore:
+    """Process-local session store with TTL expiry and an LRU capacity limit.
+
+    Tokens are spread over `shards` independently locked OrderedDicts so concurrent
+    lookups for different tokens don't contend on one lock. `max_sessions` is split
+    evenly over the shards; the least recently used session in a full shard is evicted.
+    """
+
+    def __init__(self, ttl=86400, max_sessions=100000, shards=16, clock=time.monotonic):
+        self.ttl = ttl
+        self._clock = clock
+        self._shards = [OrderedDict() for _ in range(shards)]
+        self._locks = [threading.Lock() for _ in range(shards)]
+        self._shard_capacity = max(1, max_sessions // shards)
+
+    def _index(self, token):
+        return zlib.crc32(token.encode()) % len(self._shards)
+
+    def set(self, token, user, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = self._clock() + ttl if ttl else None
+        i = self._index(token)
+        with self._locks[i]:
+            shard = self._shards[i]
+            shard[token] = (user, expires_at)
+            shard.move_to_end(token)
+            while len(shard) > self._shard_capacity:
+                shard.popitem(last=False)
+
+    def get(self, token):
+        i = self._index(token)
+        with self._locks[i]:
+            shard = self._shards[i]
+            entry = shard.get(token)
+            if entry is None:
+                return None
+            user, expires_at = entry
+            if expires_at is not None and expires_at <= self._clock():
+                del shard[token]
+                return None
+            shard.move_to_end(token)
+            return user
+
+    def delete(self, token):
+        i = self._index(token)
+        with self._locks[i]:
+            entry = self._shards[i].pop(token, None)
+        return entry[0] if entry else None
+
+    def __len__(self):
+        return sum(len(shard) for shard in self._shards)
+
+
+class MySQLSessionStore:
+    """Session store backed by the `sessions` table, shared by every worker process.
+
+    With `cache_ttl` > 0 lookups are read through a small local InMemorySessionStore, so
+    hot tokens skip the database; a logout on another worker becomes visible here
+    within `cache_ttl` seconds.
+    """
+
+    def __init__(self, ttl=86400, cache_ttl=5, cache_size=10000, connection_factory=None):
+        if connection_factory is None:
+            from storage_utils import get_db_connection
+            connection_factory = get_db_connection
+        self.ttl = ttl
+        self._connect = connection_factory
+        self._cache = InMemorySessionStore(ttl=cache_ttl, max_sessions=cache_size) if cache_ttl else None
+
+    def _execute(self, sql, params, fetch=False):
+        conn = self._connect()
+        cursor = conn.cursor()
+        try:
+            cursor.execute(sql, params)
+            if fetch:
+                return cursor.fetchone()
+            conn.commit()
+        finally:
+            cursor.close()
+            conn.close()
+
+    def set(self, token, user, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = datetime.now() + timedelta(seconds=ttl) if ttl else None
+        # The session only needs who the user is; their password hash stays in `users`
+        user = {k: v for k, v in dict(user).items() if k not in SESSION_EXCLUDED_FIELDS}
+        self._execute(
+            """
+            INSERT INTO sessions (token, user_data, expires_at) VALUES (%s, %s, %s)
+            ON DUPLICATE KEY UPDATE user_data = VALUES(user_data), expires_at = VALUES(expires_at)
+            """,
+            (token, json.dumps(user, default=str), expires_at)
+        )
+        if self._cache is not None:
+            self._cache.set(token, user)
+
+    def get(self, token):
+        if self._cache is not None:
+            user = self._cache.get(token)
+            if user is not None:
+                return user
+        row = self._execute(
+            "SELECT user_data FROM sessions WHERE token = %s AND (expires_at IS NULL OR expires_at > NOW())",
+            (token,),
+            fetch=True
+        )
+        if not row:
+            return None
+        user = json.loads(row[0])
+        if self._cache is not None:
+            self._cache.set(token, user)
+        return user
+
+    def delete(self, token):
+        user = self.get(token)
+        self._execute("DELETE FROM sessions WHERE token = %s", (token,))
+        if self._cache is not None:
+            self._cache.delete(token)
+        return user
+
+    def purge_expired(self):
+        """Remove expired rows; get() already ignores them, this only reclaims space"""
+        self._execute("DELETE FROM sessions WHERE expires_at IS NOT NULL AND expires_at <= NOW()", ())
@@ -1,8 +1,9 @@
+import json
 import os
 
 from loaddb import load_data
+from seed_pipeline import run_import, stage_done, mark_stage_done, quarantine
 import mysql.connector
-from mysql.connector import IntegrityError
 
 # Configuration via environment variables with sensible defaults
 
@@ -55,6 +56,8 @@ def create_tables(cursor, conn):
         address VARCHAR(255),
         capacity INT NOT NULL DEFAULT 0,
         reserved INT NOT NULL DEFAULT 0,
+        occupied INT NOT NULL DEFAULT 0,
+        occupancy_changed_at DATETIME(6) DEFAULT NULL,
         tariff DECIMAL(10,2) NOT NULL DEFAULT 0.00,
         daytariff DECIMAL(10,2) NOT NULL DEFAULT 0.00,
         created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
@@ -127,6 +130,7 @@ def create_tables(cursor, conn):
                         duration_minutes INT,
                         cost DECIMAL(12,2),
                         payment_status VARCHAR(50),
+                        active_plate VARCHAR(255) AS (IF(stopped IS NULL, licenseplate, NULL)) STORED,
                                 
                         
                         FOREIGN KEY (parking_lot_id) REFERENCES parking_lots(id) ON DELETE CASCADE
@@ -159,172 +163,206 @@ def create_tables(cursor, conn):
                         hash VARCHAR(255) DEFAULT NULL
                     )
                     """)
-    conn.commit()
 
-def seed_db(cursor):
-    pl_data = load_data.load_parkinglots()
-    rs_data = load_data.load_reservations()
-    vs_data = load_data.load_vehicles()
-    us_data = load_data.load_users()
+    # Shared session store (SESSION_BACKEND=mysql); expires_at NULL means no expiry
+    cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS sessions (
+                        token VARCHAR(64) PRIMARY KEY,
+                        user_data TEXT NOT NULL,
+                        expires_at DATETIME DEFAULT NULL,
+                        INDEX ix_sessions_expires_at (expires_at)
+                    )
+                    """)
+
+    # Per-cache version counters, bumped on writes so every worker drops its local copy
+    cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS cache_versions (
+                        name VARCHAR(64) PRIMARY KEY,
+                        version BIGINT NOT NULL DEFAULT 0
+                    )
+                    """)
+
+    # Seeding progress per stage and source file; file '' marks a stage seeded in one transaction
+    cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS import_checkpoints (
+                        stage VARCHAR(64) NOT NULL,
+                        file VARCHAR(255) NOT NULL,
+                        record_offset BIGINT NOT NULL DEFAULT 0,
+                        batch_no INT NOT NULL DEFAULT 0,
+                        last_key VARCHAR(255) DEFAULT NULL,
+                        done TINYINT(1) NOT NULL DEFAULT 0,
+                        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+                        PRIMARY KEY (stage, file)
+                    )
+                    """)
 
-#   Seed users
-    for us in us_data:
+    # Source records that could not be converted or inserted while seeding
+    cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS import_quarantine (
+                        id INT AUTO_INCREMENT PRIMARY KEY,
+                        stage VARCHAR(64) NOT NULL,
+                        file VARCHAR(255) DEFAULT NULL,
+                        record_offset BIGINT DEFAULT NULL,
+                        record_key VARCHAR(255) DEFAULT NULL,
+                        payload MEDIUMTEXT,
+                        error TEXT,
+                        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                        INDEX ix_import_quarantine_stage (stage)
+                    )
+                    """)
+    conn.commit()
+    add_columns(cursor, conn)
+    create_indexes(cursor, conn)
+
+# Columns added after the first release, for databases created before them: (table, column, definition)
+COLUMNS = [
+    # live occupancy counters, see occupancy.py
+    ("parking_lots", "occupied", "INT NOT NULL DEFAULT 0"),
+    ("parking_lots", "occupancy_changed_at", "DATETIME(6) DEFAULT NULL"),
+    # the plate of a session that hasn't stopped, NULL otherwise; see ux_parking_sessions_active_plate
+    ("parking_sessions", "active_plate", "VARCHAR(255) AS (IF(stopped IS NULL, licenseplate, NULL)) STORED"),
+]
+
+def add_columns(cursor, conn):
+    for table, column, definition in COLUMNS:
         cursor.execute(
             """
-            INSERT INTO users
-            (username, password, name, email, phone, role, created_at, birth_year, active)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+            SELECT 1 FROM information_schema.columns
+            WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s
+            LIMIT 1
             """,
-            (us["username"], us["password"], us["name"], us["email"], us["phone"], us["role"],
-            us["created_at"], us["birth_year"], us["active"])
+            (table, column)
         )
-    print("Seeded users (duplicates ignored)")
-    conn.commit() 
-    
-    # Seed parkinglots
-    for pl in pl_data:
-        cursor.execute(
-                "INSERT INTO parking_lots (name, location, address, capacity, reserved, tariff, daytariff, created_at, lat, lng) VALUES (%s, %s, %s, %s, %s,%s, %s,%s, %s,%s)",
-                (pl["name"], pl["location"], pl["address"], pl["capacity"], pl["reserved"], pl["tariff"],pl["daytariff"],pl["created_at"],pl["lat"],pl["lng"])
-            )
-    print("Seeded parking_lots:", pl["name"])
-    conn.commit() 
-    
-    # Seed reservations
-    for rs in rs_data:
-        cursor.execute(
-                "INSERT INTO reservations (user_id, parking_lot_id, vehicle_id, start_time, end_time, status, created_at, cost) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)",
-                (rs["user_id"], rs["parking_lot_id"], rs["vehicle_id"], rs["start_time"], rs["end_time"], rs['status'], rs["created_at"], rs["cost"])
-            )
-    print("Seeded reservations")
-    conn.commit() 
-    
-    # Seed vehicles
-    for vs in vs_data:
+        if cursor.fetchone():
+            continue
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+        print(f"Added column {table}.{column}")
+    conn.commit()
+
+# Supporting indexes for the per-request lookups in the services: (table, index name, unique, columns)
+INDEXES = [
+    ("users", "ux_users_username", True, "username"),
+    ("payments", "ix_payments_initiator", False, "initiator"),
+    ("vehicles", "ux_vehicles_license_plate", True, "license_plate"),
+    ("vehicles", "ix_vehicles_user_id", False, "user_id"),
+    ("parking_sessions", "ix_parking_sessions_plate_stopped", False, "licenseplate, stopped"),
+    # vehicle history: a plate's sessions in start order, with date ranges
+    ("parking_sessions", "ix_parking_sessions_plate_started", False, "licenseplate, started"),
+    # natural key of an imported session, makes re-importing a batch an upsert
+    ("parking_sessions", "ux_parking_sessions_natural", True, "parking_lot_id, licenseplate, started"),
+    # at most one active session per plate, enforced by the insert itself (NULLs don't collide)
+    ("parking_sessions", "ux_parking_sessions_active_plate", True, "active_plate"),
+    ("discounts", "ux_discounts_code", True, "code"),
+]
+
+# 5. Add indexes to existing tables (MySQL has no CREATE INDEX IF NOT EXISTS, so check information_schema)
+def create_indexes(cursor, conn):
+    for table, name, unique, columns in INDEXES:
         cursor.execute(
-                "INSERT INTO vehicles (user_id, license_plate, make, model, color, year, created_at) VALUES (%s, %s, %s, %s, %s, %s,  %s)",
-                (vs["user_id"], vs["license_plate"], vs["make"], vs["model"], vs["color"], vs["year"], vs["created_at"]) 
-            )
-    print("Seeded vehicles")
-    conn.commit() 
+            """
+            SELECT 1 FROM information_schema.statistics
+            WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+            LIMIT 1
+            """,
+            (table, name)
+        )
+        if cursor.fetchone():
+            continue
+        try:
+            cursor.execute(f"CREATE {'UNIQUE ' if unique else ''}INDEX {name} ON {table} ({columns})")
+            print(f"Created index {name} on {table}({columns})")
+        except mysql.connector.Error as e:
+            # Typically duplicate values blocking a UNIQUE index; clean the data and re-run
+            print(f"Could not create index {name} on {table}: {e}")
+    conn.commit()
+
+def seed_stage(stage, records, sql, params):
+    """Seed a small table in one transaction, skipped once its checkpoint says it is done"""
+    if stage_done(cursor, stage):
+        print(f"Skipping {stage}: already seeded")
+        return
+    bad = []
+    for index, record in enumerate(records):
+        try:
+            cursor.execute(sql, params(record))
+        except (KeyError, TypeError, mysql.connector.Error) as e:
+            bad.append((index, None, json.dumps(record, default=str), repr(e)))
+    quarantine(cursor, stage, "", bad)
+    mark_stage_done(cursor, stage)
+    conn.commit()
+    print(f"Seeded {stage} ({len(bad)} quarantined)")
+
+def seed_db(cursor):
+    # Users and vehicles upsert on their UNIQUE natural keys; lots and reservations have none,
+    # so every stage commits together with its checkpoint and is never applied twice
+    seed_stage(
+        "users", load_data.load_users(),
+        """
+        INSERT INTO users
+        (username, password, name, email, phone, role, created_at, birth_year, active)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE password = VALUES(password), name = VALUES(name), email = VALUES(email),
+                                phone = VALUES(phone), role = VALUES(role), active = VALUES(active)
+        """,
+        lambda us: (us["username"], us["password"], us["name"], us["email"], us["phone"], us["role"],
+                    us["created_at"], us["birth_year"], us["active"])
+    )
+
+    seed_stage(
+        "parking_lots", load_data.load_parkinglots(),
+        "INSERT INTO parking_lots (name, location, address, capacity, reserved, tariff, daytariff, created_at, lat, lng) VALUES (%s, %s, %s, %s, %s,%s, %s,%s, %s,%s)",
+        lambda pl: (pl["name"], pl["location"], pl["address"], pl["capacity"], pl["reserved"], pl["tariff"], pl["daytariff"], pl["created_at"], pl["lat"], pl["lng"])
+    )
+
+    seed_stage(
+        "reservations", load_data.load_reservations(),
+        "INSERT INTO reservations (user_id, parking_lot_id, vehicle_id, start_time, end_time, status, created_at, cost) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)",
+        lambda rs: (rs["user_id"], rs["parking_lot_id"], rs["vehicle_id"], rs["start_time"], rs["end_time"], rs["status"], rs["created_at"], rs["cost"])
+    )
+
+    seed_stage(
+        "vehicles", load_data.load_vehicles(),
+        """
+        INSERT INTO vehicles (user_id, license_plate, make, model, color, year, created_at) VALUES (%s, %s, %s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE user_id = VALUES(user_id), make = VALUES(make), model = VALUES(model),
+                                color = VALUES(color), year = VALUES(year)
+        """,
+        lambda vs: (vs["user_id"], vs["license_plate"], vs["make"], vs["model"], vs["color"], vs["year"], vs["created_at"])
+    )
 
     # Seed parking sessions
-    seed_parking_sessions_batch
+    seed_parking_sessions_batch()
     print("Seeded parking sessions")
 
     #  Seed Payments
     seed_payments_batch()
     print("Seeded payments")
 
-def seed_parking_sessions_batch():
-    sesh = load_data.load_parking_sessions()  
-  
-    BATCH_SIZE = 5000  
-    c = 0
-    sql = """
-    INSERT INTO parking_sessions
-    (parking_lot_id, licenseplate, started, stopped, user, duration_minutes, cost, payment_status)
-    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-    """
-
-    for i in range(0, len(sesh), BATCH_SIZE):
-        batch = sesh[i:i + BATCH_SIZE]
-        values = [
-            (
-                row["parking_lot_id"],
-                row["licenseplate"],
-                row["started"],
-                row["stopped"],
-                row["user"],
-                row["duration_minutes"],
-                row["cost"],
-                row["payment_status"]
-            )
-            for row in batch
-        ]
-        placeholders = ",".join(["(%s, %s, %s, %s, %s, %s, %s, %s)"] * len(values))
-
-        sql = f"""
-        INSERT INTO parking_sessions
-        (parking_lot_id, licenseplate, started, stopped, user, duration_minutes, cost, payment_status)
-        VALUES {placeholders}
-        """
+SESSION_COLUMNS = ["parking_lot_id", "licenseplate", "started", "stopped", "user", "duration_minutes", "cost", "payment_status"]
+PAYMENT_COLUMNS = ["transaction", "amount", "initiator", "created_at", "completed", "hash", "date", "method", "issuer", "bank", "session_id", "parking_lot_id"]
 
-        flat_values = [item for row in values for item in row]
-        c+=1
-        cursor.execute(sql, flat_values)
+def secondary_indexes(table):
+    # UNIQUE indexes stay during a load: the upserts depend on them
+    return [name for t, name, unique, columns in INDEXES if t == table and not unique]
 
-        print(f"Inserted {c} batch of {len(values)} rows")
-        
-        conn.commit()  # commit per batch
-    cursor.close()
-    conn.close()
+def seed_parking_sessions_batch():
+    # One parser process per core streams the pdata files; inserts happen here in 5000-row batches
+    run_import(
+        conn, "parking_sessions", "parking_sessions", SESSION_COLUMNS,
+        load_data.parking_session_files(),
+        indexes=secondary_indexes("parking_sessions"),
+        rebuild_indexes=lambda: create_indexes(cursor, conn),
+    )
 
 def seed_payments_batch():
-    conn.autocommit = False
-    c = 350
-    sesh = load_data.load_payments()
-    BATCH_SIZE = 5000
-
- 
-
-    print("SQL insert started")
-
-    cursor = conn.cursor()   
-
-    start_index = 350 * 5000
-    BLOCK_TRANSACTION = "1535349fea5cca288b217d491838f836AA"
-    for i in range(start_index, len(sesh), BATCH_SIZE):
-        batch = sesh[i:i + BATCH_SIZE]
-        batch = [
-        row for row in batch
-        if row["transaction"] != BLOCK_TRANSACTION
-        ] 
-        values = [
-            (
-                row["transaction"],
-                row["amount"],
-                row["initiator"],
-                row["created_at"],
-                row["completed"],
-                row["hash"],
-                row["date"],
-                row["method"],
-                row["issuer"],
-                row["bank"],
-                row["session_id"],
-                row["parking_lot_id"]
-            )
-            for row in batch
-        ]
-
-        placeholders = ",".join(["(%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)"] * len(values))
-
-        sql = f"""
-        INSERT IGNORE INTO payments
-        (transaction, amount, initiator, created_at, completed, hash, date, method, issuer, bank, session_id, parking_lot_id)
-        VALUES {placeholders}
-        """
-        print(f"Inserted {c}")
-        c+=len(values)
-        flat_values = [item for row in values for item in row]
-
-        try:
-            cursor.execute(sql, flat_values)
-        except IntegrityError as e:
-            print("IntegrityError caught!")
-            print("Batch that caused the error:")
-            for row in batch:
-                print("Initiator:", row["initiator"])
-            raise e  # Re-raise to stop execution if you want
-        conn.commit()
-
-    # Commit once at the end (MUCH FASTER)
-    conn.commit()
-
-    cursor.close()
-
-    conn.close()
+    # payments.json is a single file: one parser process, overlapping parsing with the inserts.
+    # Rows upsert on the UNIQUE transaction column and the checkpoint resumes a crashed run.
+    run_import(
+        conn, "payments", "payments", PAYMENT_COLUMNS,
+        ['../data/payments.json'],
+        indexes=secondary_indexes("payments"),
+        rebuild_indexes=lambda: create_indexes(cursor, conn),
+    )
 
 create_tables(cursor,conn)
 # seed_db(cursor)
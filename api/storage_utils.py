@@ -3,44 +3,140 @@ import csv
 import os
 from datetime import datetime, timedelta
 from loaddb import load_data
-import mysql.connector
+from db_pool import get_pool
+from row_cache import TTLCache, VersionCounter
+from occupancy import lot_occupancy
+from row_types import decode_rows
+import query_builder
+from timeutil import format_timestamp, parse_timestamp
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import contextvars
+import functools
+from contextlib import contextmanager
 import math
+from typing import NamedTuple, Optional
+from mysql.connector import IntegrityError, errorcode
 
-import datetime 
+# Checks a connection out of the shared pool; calling close() on it returns it to the pool.
+# Inside a unit of work every caller gets the unit's connection instead.
 def get_db_connection():
-    return mysql.connector.connect(
-        host=os.environ.get("MYSQL_HOST", "127.0.0.1"),
-        port=int(os.environ.get("MYSQL_PORT", 3307)),
-        user=os.environ.get("MYSQL_USER", "stilstaan"),
-        password=os.environ.get("MYSQL_PASSWORD", "stil"),
-        database=os.environ.get("MYSQL_DATABASE", "mobypark"),
-    )
-conn = get_db_connection()
-cursor = conn.cursor(dictionary=True) 
-
-
-def normalize_row(row):
-    for key, value in row.items():
-        if isinstance(value, datetime.datetime):
-            row[key] = value.strftime("%Y-%m-%d %H:%M:%S")
-        else:
-            row[key] = str(value)
-    return row
+    unit = _current_unit.get()
+    if unit is not None:
+        return unit.connection()
+    return get_pool().acquire()
+
+# --------------------------
+# Unit of work
+# --------------------------
+# Multi-step flows (check a counter, insert, update) run their storage calls in one transaction:
+#
+#     with unit_of_work():
+#         reserve_spot(lot_id)
+#         save_reservation.create_reservation(reservation)
+#
+# Every storage function called in the block runs on the same pooled connection, checked out on
+# the first statement. The commits and closes they do themselves are left to the unit, which
+# commits once when the block ends and rolls everything back when it raises. Work that must
+# only happen once the data is committed (cache invalidation) goes through after_commit.
+_current_unit = contextvars.ContextVar("unit_of_work", default=None)
+
+class _UnitConnection:
+    """The unit's connection as storage functions see it"""
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        # A failed statement only undoes itself; the unit decides about the rest
+        pass
+
+    def close(self):
+        pass
+
+class UnitOfWork:
+    def __init__(self):
+        self._conn = None
+        self._after_commit = []
+
+    def connection(self):
+        if self._conn is None:
+            self._conn = get_pool().acquire()
+        return _UnitConnection(self._conn)
+
+    def after_commit(self, fn):
+        self._after_commit.append(fn)
+
+    def _commit(self):
+        if self._conn is not None:
+            self._conn.commit()
+        self._release()
+
+    def _run_after_commit(self):
+        for fn in self._after_commit:
+            fn()
+
+    def _rollback(self):
+        try:
+            if self._conn is not None:
+                self._conn.rollback()
+        finally:
+            self._release()
+
+    def _release(self):
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            conn.close()
+
+@contextmanager
+def unit_of_work():
+    """One transaction across storage calls; a unit opened inside another one joins it"""
+    unit = _current_unit.get()
+    if unit is not None:
+        yield unit
+        return
+    unit = UnitOfWork()
+    token = _current_unit.set(unit)
+    try:
+        try:
+            yield unit
+        except BaseException:
+            unit._rollback()
+            raise
+        try:
+            unit._commit()
+        except BaseException:
+            unit._rollback()
+            raise
+    finally:
+        _current_unit.reset(token)
+    # Only once the unit is gone, so hooks that touch the database (a cache version bump) get
+    # an ordinary connection that commits and goes back to the pool
+    unit._run_after_commit()
+
+def after_commit(fn):
+    """Run fn once the current unit of work has committed (never if it rolls back); right away outside a unit"""
+    unit = _current_unit.get()
+    if unit is None:
+        fn()
+    else:
+        unit.after_commit(fn)
+
 
 def save_record(table: str, data: dict, update_on_duplicate: bool = False) -> int:
     """Insert a row into MySQL and optionally update on duplicate key."""
     if not data:
         raise ValueError("No data provided to save")
 
-    columns = ", ".join(data.keys())
-    placeholders = ", ".join(["%s"] * len(data))
+    sql = query_builder.insert_sql(table, tuple(data), 1, update_on_duplicate)
     values = tuple(data.values())
 
-    sql = f"INSERT INTO {table} ({columns}) VALUES ({placeholders})"
-    if update_on_duplicate:
-        updates = ", ".join([f"{col}=VALUES({col})" for col in data.keys()])
-        sql += f" ON DUPLICATE KEY UPDATE {updates}"
-
     conn = get_db_connection()
     cursor = conn.cursor()
     try:
@@ -51,94 +147,412 @@ def save_record(table: str, data: dict, update_on_duplicate: bool = False) -> in
         cursor.close()
         conn.close()
     
+# Both read helpers take the columns to fetch (all by default), an order ("col" or "-col" for
+# descending, or a list of those) and a row limit, so a caller that only needs ids doesn't pull
+# whole rows over the wire and decode them.
+
 #Grabs the data from table for a given name
-def load_data_db_table(tablename):
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True) 
-    
-    cursor.execute(f"SELECT * FROM {tablename}")
-    rows = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    content = [normalize_row(row) for row in rows]
-    return content
+def load_data_db_table(tablename, columns=None, limit=None, order_by=None):
+    return _select(tablename, *query_builder.select(tablename, columns=columns, order_by=order_by, limit=limit))
 
-def get_item_db(Row, Item, TableName):
+def get_item_db(Row, Item, TableName, for_update=False, columns=None, limit=None, order_by=None):
+    # for_update locks the rows until the current unit of work ends
+    return _select(TableName, *query_builder.select(TableName, Row, Item, for_update, columns, order_by, limit))
 
+def _select(table, sql, params):
     conn = get_db_connection()
+    try:
+        # The statement's cursor is cached with the connection, so it isn't closed here
+        cursor = conn.statement(sql)
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+        columns = cursor.column_names
+    finally:
+        conn.close()
+    return decode_rows(table, columns, rows)
 
-    cursor = conn.cursor(dictionary=True) 
-   
-    cursor.execute(f"""
-                   SELECT * FROM {TableName}
-                   WHERE {Row} = '{Item}'
-                   """)
-    
-    rows = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    content = [normalize_row(row) for row in rows]
-    return content
-
-def change_data(table,values,condition):
-
+def _write(sql, params):
     conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True) 
-    columns = list(values.keys())
-  
-    # value used in WHERE clause
-    cond_val = values[condition]
+    try:
+        conn.statement(sql).execute(sql, params)
+        conn.commit()
+    finally:
+        conn.close()
 
-    # keys except the condition key
-    update_keys = [k for k in values.keys() if k != condition]
+# --------------------------
+# Keyset pagination and streaming
+# --------------------------
+# List endpoints page by primary key: WHERE id > <last id of the previous page> ORDER BY id LIMIT n.
+# Unlike OFFSET this costs the same for the last page as for the first one, and rows inserted
+# while a client pages through don't shift the pages.
+STREAM_CHUNK_SIZE = int(os.environ.get("STREAM_CHUNK_SIZE", 1000))
+
+class Page(NamedTuple):
+    after: Optional[str] = None   # id of the last row of the previous page
+    limit: Optional[int] = None   # None: all remaining rows
+    stream: bool = False          # rows as a generator instead of a list
+
+def _keyset_query(TableName, page, Row=None, Item=None):
+    sql = query_builder.keyset_sql(TableName, Row, page.after is not None, page.limit is not None)
+    params = [Item] if Row is not None else []
+    if page.after is not None:
+        params.append(page.after)
+    if page.limit is not None:
+        params.append(page.limit)
+    return sql, tuple(params)
+
+def _fetch_rows(TableName, sql, params):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+        columns = cursor.column_names
+    finally:
+        cursor.close()
+        conn.close()
+    return decode_rows(TableName, columns, rows)
 
-    # corresponding values (in same order)
-    update_values = [values[k] for k in update_keys]
+def _stream_rows(TableName, sql, params, chunk_size=None):
+    chunk_size = chunk_size or STREAM_CHUNK_SIZE
+    conn = get_db_connection()
+    cursor = conn.cursor(buffered=False)
+    finished = False
+    try:
+        cursor.execute(sql, params)
+        columns = cursor.column_names
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                finished = True
+                break
+            yield from decode_rows(TableName, columns, rows)
+    finally:
+        if not finished:
+            # Stopped early (client went away): drain the result so the pooled connection stays usable
+            try:
+                conn.consume_results()
+            except Exception:
+                pass
+        cursor.close()
+        conn.close()
 
-    set_sql = f"""UPDATE {table}\n SET """
-    count = 0
+def get_page(TableName, page, Row=None, Item=None):
+    """One keyset page of a table (optionally only rows where Row = Item), in id order"""
+    return _fetch_rows(TableName, *_keyset_query(TableName, page, Row, Item))
+
+def stream_rows(TableName, page, Row=None, Item=None, chunk_size=None):
+    """Generator over the same rows as get_page, fetched in chunks from an unbuffered cursor.
+
+    Only one chunk is in memory at a time. The connection is held until the generator is
+    exhausted or closed.
+    """
+    return _stream_rows(TableName, *_keyset_query(TableName, page, Row, Item), chunk_size)
+
+def list_rows(TableName, page, Row=None, Item=None):
+    """Rows for a list endpoint: a keyset page as a list, or a generator when page.stream is set"""
+    if page.stream:
+        return stream_rows(TableName, page, Row, Item)
+    return get_page(TableName, page, Row, Item)
+
+def next_cursor(rows, page, key=None):
+    """The `after` value for the next page; None when this was the last one"""
+    if page.limit is None or len(rows) < page.limit:
+        return None
+    return key(rows[-1]) if key else str(rows[-1]["id"])
+
+# --------------------------
+# Vehicle history
+# --------------------------
+# A plate's sessions in (started, id) order, straight from the (licenseplate, started) index
+# (InnoDB appends the primary key to it). Pages continue after a "started,id" cursor.
+def history_cursor(row):
+    return f"{format_timestamp(row['started'])},{row['id']}"
+
+def _history_query(plate, page, since=None, until=None):
+    params = [plate]
+    if since is not None:
+        params.append(since)
+    if until is not None:
+        params.append(until)
+    if page.after is not None:
+        started, _, session_id = page.after.rpartition(",")
+        started = parse_timestamp(started)
+        if started is None or not session_id.isdigit():
+            raise ValueError(f"Invalid history cursor: {page.after!r}")
+        params += [started, started, int(session_id)]
+    if page.limit is not None:
+        params.append(page.limit)
+    sql = query_builder.history_sql(since is not None, until is not None, page.after is not None, page.limit is not None)
+    return sql, tuple(params)
+
+def list_vehicle_history(plate, page, since=None, until=None):
+    """Sessions of a license plate, optionally started in [since, until); list or generator like list_rows"""
+    sql, params = _history_query(plate, page, since, until)
+    if page.stream:
+        return _stream_rows("parking_sessions", sql, params)
+    return _fetch_rows("parking_sessions", sql, params)
+
+# Per-plate totals; save_parking_sessions drops a plate's entry when one of its sessions changes
+history_summary_cache = TTLCache(
+    ttl=int(os.environ.get("HISTORY_SUMMARY_CACHE_TTL", 300)),
+    max_entries=int(os.environ.get("HISTORY_SUMMARY_CACHE_SIZE", 10000)),
+)
+
+def _load_history_summary(plate):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            """
+            SELECT COUNT(*), COALESCE(SUM(duration_minutes), 0), COALESCE(SUM(cost), 0), MIN(started), MAX(started)
+            FROM parking_sessions WHERE licenseplate = %s
+            """,
+            (plate,)
+        )
+        sessions, minutes, cost, first, last = cursor.fetchone()
+    finally:
+        cursor.close()
+        conn.close()
+    return {"licenseplate": plate, "sessions": sessions, "total_minutes": int(minutes),
+            "total_cost": float(cost), "first_started": first, "last_started": last}
+
+def _invalidate_history_summary(session):
+    # Without the plate (a delete by id) every summary is dropped
+    plate = session.get("licenseplate")
+    if plate:
+        after_commit(lambda: history_summary_cache.invalidate(plate))
+    else:
+        after_commit(history_summary_cache.invalidate)
+
+def _invalidate_history_summaries(sessions):
+    plates = {session.get("licenseplate") for session in sessions}
+    if None in plates:
+        after_commit(history_summary_cache.invalidate)
+    elif plates:
+        after_commit(lambda: history_summary_cache.invalidate(*plates))
+
+def get_vehicle_history_summary(plate):
+    """Session count, total minutes and cost and first / last start of a plate, read through the cache"""
+    return history_summary_cache.get(plate, lambda: _load_history_summary(plate))
 
-    for c in columns:
-        if not c == condition:
-            if count + 1 != len(columns) - 1:
-                set_string = f"{c} = %s, \n "
-                set_sql += set_string
-                count+=1 
-            else:
-                set_string = f"{c} = %s \n "
-                set_sql += set_string
-                count+=1 
-    set_sql+=f"\n WHERE {condition} = {cond_val}"
-
-    cursor.execute(set_sql, update_values)
-    conn.commit()
-    cursor.close()
-    conn.close()
+def change_data(table,values,condition):
+    _write(*query_builder.update(table, values, condition))
     
+# --------------------------
+# Async access path
+# --------------------------
+# Blocking MySQL calls run on a bounded executor so they never stall the event loop.
+# It is sized to the connection pool: more threads would only queue on pool checkout.
+_db_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("MYSQL_POOL_SIZE", 10)),
+    thread_name_prefix="db",
+)
+
+async def run_in_db_executor(func, *args, **kwargs):
+    """Await a blocking storage or service call on the database executor"""
+    loop = asyncio.get_running_loop()
+    # Copy the request's contextvars (log context) into the worker thread
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(_db_executor, functools.partial(ctx.run, func, *args, **kwargs))
+
+async def get_item_db_async(Row, Item, TableName, columns=None, limit=None, order_by=None):
+    return await run_in_db_executor(get_item_db, Row, Item, TableName, columns=columns, limit=limit, order_by=order_by)
+
+# --------------------------
+# Parking lot cache
+# --------------------------
+# Lot rows (tariffs, capacity, coordinates) change rarely but are read on every session stop and
+# reservation. save_parking_lot invalidates on write; with PARKING_LOT_CACHE_SYNC=mysql the other
+# workers see the write through the cache_versions table within a second.
+parking_lot_cache = TTLCache(
+    ttl=int(os.environ.get("PARKING_LOT_CACHE_TTL", 60)),
+    max_entries=int(os.environ.get("PARKING_LOT_CACHE_SIZE", 1024)),
+    version=VersionCounter("parking_lots") if os.environ.get("PARKING_LOT_CACHE_SYNC") == "mysql" else None,
+)
+ALL_PARKING_LOTS = "*"
+OCCUPANCY_COLUMNS = ("reserved", "occupied", "occupancy_changed_at")
+
+def get_parking_lot_row(lot_id):
+    """A parking lot row by id, read through the cache; None when it doesn't exist"""
+    return parking_lot_cache.get(str(lot_id), lambda: next(iter(get_item_db("id", lot_id, "parking_lots")), None))
+
+def list_parking_lot_rows():
+    """All parking lot rows, read through the cache"""
+    def load():
+        rows = load_data_db_table("parking_lots")
+        for row in rows:
+            parking_lot_cache.set(str(row["id"]), row)
+        return rows
+    return parking_lot_cache.get(ALL_PARKING_LOTS, load)
+
+# --------------------------
+# Discount cache
+# --------------------------
+# Paid exits look their discount up by code. Codes are cached for at most DISCOUNT_CACHE_TTL and
+# never past the end of their expiration date (the last day they are valid), so an expired code
+# can't be served from the cache. Edits and deletes clear it, as they can change or drop a code.
+def _discount_lifetime(discount):
+    expires = parse_timestamp(discount.get("expiration_date"))
+    if expires is None:
+        return math.inf
+    valid_until = datetime.combine(expires.date() + timedelta(days=1), datetime.min.time())
+    return (valid_until - datetime.now()).total_seconds()
+
+discount_cache = TTLCache(
+    ttl=int(os.environ.get("DISCOUNT_CACHE_TTL", 300)),
+    max_entries=int(os.environ.get("DISCOUNT_CACHE_SIZE", 50000)),
+    version=VersionCounter("discounts") if os.environ.get("DISCOUNT_CACHE_SYNC") == "mysql" else None,
+    lifetime=_discount_lifetime,
+)
+
+def get_discount_row(code):
+    """The discount with this code, read through the cache; None when there is none"""
+    return discount_cache.get(code, lambda: next(iter(get_item_db("code", code, "discounts", limit=1)), None))
+
+def cache_metrics():
+    return {"parking_lots": parking_lot_cache.metrics(), "history_summaries": history_summary_cache.metrics(),
+            "discounts": discount_cache.metrics()}
+
 def create_data(table, values):
     return save_record(table, values)
 
-def delete_data(item, Row, table):
-        sql =   f"""
-                DELETE FROM {table} 
-                WHERE {Row} = {item};
-                """
-        cursor.execute(sql)
+def delete_data(table, item, Row="id"):
+    _write(query_builder.delete_sql(table, Row), (item,))
+
+# --------------------------
+# Bulk writes
+# --------------------------
+# Many rows per statement, and all statements of one call in one transaction: a burst costs a few
+# round-trips and a single commit instead of one of each per row. Statements are cut into chunks
+# of at most MAX_STATEMENT_BYTES of values, a quarter of the smallest max_allowed_packet default
+# (4 MB on MySQL 5.7) so quoting and escaping can't push a chunk over it, and at most
+# MAX_PLACEHOLDERS values, the limit for server-side prepared statements.
+MAX_STATEMENT_BYTES = int(os.environ.get("MYSQL_MAX_STATEMENT_BYTES", 1024 * 1024))
+MAX_PLACEHOLDERS = 65535
+
+def _value_bytes(value):
+    # Length of the value in the statement text, plus quotes and separator
+    if value is None:
+        return 5
+    if isinstance(value, (bytes, bytearray)):
+        return len(value) + 3
+    return len(str(value).encode("utf-8")) + 3
+
+def _chunks(rows, values_of):
+    """Split rows so the values of each chunk stay within the byte and placeholder budgets"""
+    chunk, size, count = [], 0, 0
+    for row in rows:
+        values = values_of(row)
+        row_size = sum(_value_bytes(v) for v in values)
+        if chunk and (size + row_size > MAX_STATEMENT_BYTES or count + len(values) > MAX_PLACEHOLDERS):
+            yield chunk
+            chunk, size, count = [], 0, 0
+        chunk.append(row)
+        size += row_size
+        count += len(values)
+    if chunk:
+        yield chunk
+
+def _in_transaction(work):
+    """Run work(cursor) on one pooled connection and commit once; roll everything back on an error"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        result = work(cursor)
         conn.commit()
+        return result
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
         cursor.close()
         conn.close()
 
+def create_many_data(table, rows):
+    """Insert rows (dicts with the same keys) with multi-row INSERTs in one transaction; returns their ids in order"""
+    rows = list(rows)
+    if not rows:
+        return []
+    columns = tuple(rows[0])
+    if any(row.keys() != rows[0].keys() for row in rows):
+        raise ValueError("All rows of a bulk insert need the same columns")
+    query_builder.check_columns(table, columns)
+
+    def work(cursor):
+        ids = []
+        for chunk in _chunks(rows, lambda row: [row[c] for c in columns]):
+            cursor.execute(
+                query_builder.insert_sql(table, columns, len(chunk)),
+                [row[c] for row in chunk for c in columns]
+            )
+            if "id" in columns:
+                ids.extend(row["id"] for row in chunk)
+            else:
+                # InnoDB numbers the rows of one multi-row INSERT consecutively from LAST_INSERT_ID()
+                first = cursor.lastrowid
+                ids.extend(range(first, first + len(chunk)))
+        return ids
+    return _in_transaction(work)
+
+def change_many_data(table, rows, condition="id"):
+    """Update rows (dicts holding the `condition` key) in one transaction; returns the number of rows changed.
+    Rows that change the same columns share one UPDATE ... CASE statement per chunk."""
+    query_builder.check_columns(table, (condition,))
+    groups = {}
+    for row in rows:
+        columns = tuple(k for k in row if k != condition)
+        if columns:
+            # The last change of a row wins, as it would with one change_data call per row
+            groups.setdefault(columns, {})[row[condition]] = row
+    for columns in groups:
+        query_builder.check_columns(table, columns)
+
+    def work(cursor):
+        changed = 0
+        for columns, by_key in groups.items():
+            values_of = lambda row: [row[condition]] * (len(columns) + 1) + [row[c] for c in columns]
+            for chunk in _chunks(by_key.values(), values_of):
+                params = [v for c in columns for row in chunk for v in (row[condition], row[c])]
+                params += [row[condition] for row in chunk]
+                cursor.execute(query_builder.update_case_sql(table, columns, condition, len(chunk)), params)
+                changed += cursor.rowcount
+        return changed
+    return _in_transaction(work)
+
+def delete_many_data(table, items, Row="id"):
+    """Delete the rows whose `Row` is one of items, in one transaction; returns the number of rows deleted"""
+    query_builder.check_columns(table, (Row,))
+    items = list(dict.fromkeys(items))
+
+    def work(cursor):
+        deleted = 0
+        for chunk in _chunks(items, lambda item: [item]):
+            cursor.execute(query_builder.delete_in_sql(table, Row, len(chunk)), chunk)
+            deleted += cursor.rowcount
+        return deleted
+    return _in_transaction(work) if items else 0
+
 # Pre made implementation of using the create / change / delete for all classes to prevent clutter in other files 
 class save_vehicle:
 
     def create_vehicle(vehicle_data):
-        create_data("Vehicles", vehicle_data)
+        create_data("vehicles", vehicle_data)
   
     def change_vehicle(vehicle_data):
         change_data("vehicles", vehicle_data, "id")
         
     def delete_vehicle(id):
         delete_data("vehicles",id)
+
+    def create_many(rows):
+        return create_many_data("vehicles", rows)
+
+    def change_many(rows):
+        return change_many_data("vehicles", rows, "id")
+
+    def delete_many(ids):
+        return delete_many_data("vehicles", ids)
         
 
 class save_payment:
@@ -151,6 +565,15 @@ class save_payment:
     def delete_payment(id):
         delete_data("payments",id)
 
+    def create_many(rows):
+        return create_many_data("payments", rows)
+
+    def change_many(rows):
+        return change_many_data("payments", rows, "id")
+
+    def delete_many(ids):
+        return delete_many_data("payments", ids)
+
 class save_user:
     def create_user(user_data):
         create_data('users',user_data)
@@ -161,29 +584,130 @@ class save_user:
     def delete_user(id):
         delete_data("users",id)
 
+    def create_many(rows):
+        return create_many_data("users", rows)
+
+    def change_many(rows):
+        return change_many_data("users", rows, "id")
+
+    def delete_many(ids):
+        return delete_many_data("users", ids)
+
+def _parking_lots_changed(*ids):
+    # After the commit, so no reader can cache the old row in between
+    def invalidate():
+        parking_lot_cache.invalidate(*(str(id) for id in ids), ALL_PARKING_LOTS)
+        for id in ids:
+            lot_occupancy.forget(id)
+    after_commit(invalidate)
+
 class save_parking_lot:
     def create_plt(plt_data):
         create_data("parking_lots",plt_data)
+        _parking_lots_changed()
 
     def change_plt(plt_data):
+        # The occupancy counters are only changed atomically by occupancy.py; writing back a
+        # (possibly cached) copy of them here would undo concurrent entries and reservations
+        plt_data = {k: v for k, v in plt_data.items() if k not in OCCUPANCY_COLUMNS}
         change_data("parking_lots", plt_data, "id")
+        _parking_lots_changed(plt_data["id"])
 
     def delete_plt(id):
         delete_data("parking_lots",id)
+        _parking_lots_changed(id)
+
+    def create_many(plts):
+        ids = create_many_data("parking_lots", list(plts))
+        _parking_lots_changed()
+        return ids
+
+    def change_many(plts):
+        plts = [{k: v for k, v in plt.items() if k not in OCCUPANCY_COLUMNS} for plt in plts]
+        changed = change_many_data("parking_lots", plts, "id")
+        _parking_lots_changed(*(plt["id"] for plt in plts))
+        return changed
+
+    def delete_many(ids):
+        ids = list(ids)
+        deleted = delete_many_data("parking_lots", ids)
+        _parking_lots_changed(*ids)
+        return deleted
+
+DISCOUNT_CODE_INDEX = "ux_discounts_code"
+
+def _code_taken(error):
+    return error.errno == errorcode.ER_DUP_ENTRY and DISCOUNT_CODE_INDEX in str(error)
+
+def _discounts_changed():
+    after_commit(lambda: discount_cache.invalidate())
 
 class save_discount:
     def create_discount(discount_data):
-        create_data("discounts",discount_data)
+        return create_data("discounts",discount_data)
+
+    def insert_discount(discount_data):
+        """Insert a discount; None when its code is taken.
+        The UNIQUE index on code is the check, so there is no lookup before the insert."""
+        try:
+            return create_data("discounts", discount_data)
+        except IntegrityError as e:
+            if _code_taken(e):
+                return None
+            raise
+
+    def insert_with_codes(rows, new_code, attempts=10):
+        """Insert discounts in bulk, each with a code from new_code(); returns the rows with their
+        codes and ids, None when every attempt hit a taken code.
+        All of them go in one transaction. If any code is taken the transaction is rolled back
+        and the batch retried with fresh codes: a collision of random codes is rare enough that
+        retrying the batch is cheaper than looking every code up first.
+        Not inside a unit of work: its rollback is left to the unit, so a retry would insert on
+        top of the chunks that already went in."""
+        if _current_unit.get() is not None:
+            raise RuntimeError("insert_with_codes needs its own transaction, call it outside unit_of_work")
+        rows = [dict(row) for row in rows]
+        for _ in range(attempts):
+            codes = set()
+            while len(codes) < len(rows):
+                codes.add(new_code())
+            for row, code in zip(rows, codes):
+                row["code"] = code
+            try:
+                ids = create_many_data("discounts", rows)
+            except IntegrityError as e:
+                if not _code_taken(e):
+                    raise
+                continue
+            for row, id in zip(rows, ids):
+                row["id"] = str(id)
+            return rows
+        return None
    
     def change_discount(change_discount):
         change_data("discounts", change_discount, "id")
+        _discounts_changed()
 
     def delete_discount(id):
         delete_data("discounts",id)
+        _discounts_changed()
+
+    def create_many(rows):
+        return create_many_data("discounts", rows)
+
+    def change_many(rows):
+        changed = change_many_data("discounts", rows, "id")
+        _discounts_changed()
+        return changed
+
+    def delete_many(ids):
+        deleted = delete_many_data("discounts", ids)
+        _discounts_changed()
+        return deleted
 
 class save_reservation:
     def create_reservation(rsv_data):
-        create_data("reservations",rsv_data)
+        return create_data("reservations",rsv_data)
 
     def change_reservation(rsv_data):
         change_data("reservations", rsv_data, "id")
@@ -191,16 +715,67 @@ class save_reservation:
     def delete_reservation(id):
         delete_data("reservations",id)
 
+    def create_many(rows):
+        return create_many_data("reservations", rows)
+
+    def change_many(rows):
+        return change_many_data("reservations", rows, "id")
+
+    def delete_many(ids):
+        return delete_many_data("reservations", ids)
+
+# active_plate is generated from licenseplate and stopped, so it can't be written
+SESSION_GENERATED_COLUMNS = ("active_plate",)
+ACTIVE_SESSION_INDEX = "ux_parking_sessions_active_plate"
+# The import's natural key also covers live starts: stopping and starting again in the same lot
+# within one second (started has second resolution) collides on it
+NATURAL_SESSION_INDEX = "ux_parking_sessions_natural"
+
 class save_parking_sessions:
 
     def create_parking_sessions(parking_session_data):
         create_data("parking_sessions", parking_session_data)
+        _invalidate_history_summary(parking_session_data)
+
+    def start_parking_sessions(parking_session_data):
+        """Insert an active session; None when the plate already has one, or started one in
+        this lot in the same second.
+        The UNIQUE index on active_plate makes the check and the insert one statement,
+        so concurrent starts for the same plate can't both succeed."""
+        try:
+            session_id = create_data("parking_sessions", parking_session_data)
+        except IntegrityError as e:
+            if e.errno == errorcode.ER_DUP_ENTRY and (ACTIVE_SESSION_INDEX in str(e) or NATURAL_SESSION_INDEX in str(e)):
+                return None
+            raise
+        _invalidate_history_summary(parking_session_data)
+        return session_id
   
     def change_parking_sessions(parking_session_data):
+        parking_session_data = {k: v for k, v in parking_session_data.items() if k not in SESSION_GENERATED_COLUMNS}
         change_data("parking_sessions", parking_session_data, "id")
+        _invalidate_history_summary(parking_session_data)
         
     def delete_parking_sessions(id):
         delete_data("parking_sessions",id)
+        _invalidate_history_summary({})
+
+    def create_many(sessions):
+        sessions = list(sessions)
+        ids = create_many_data("parking_sessions", sessions)
+        _invalidate_history_summaries(sessions)
+        return ids
+
+    def change_many(sessions):
+        sessions = [{k: v for k, v in session.items() if k not in SESSION_GENERATED_COLUMNS} for session in sessions]
+        changed = change_many_data("parking_sessions", sessions, "id")
+        _invalidate_history_summaries(sessions)
+        return changed
+
+    def delete_many(ids):
+        deleted = delete_many_data("parking_sessions", ids)
+        _invalidate_history_summary({})
+        return deleted
 
 class save_refunds:
 
@@ -212,4 +787,13 @@ class save_refunds:
         
     def delete_refund(id):
         delete_data("refunds",id)
+
+    def create_many(rows):
+        return create_many_data("refunds", rows)
+
+    def change_many(rows):
+        return change_many_data("refunds", rows, "id")
+
+    def delete_many(ids):
+        return delete_many_data("refunds", ids)
                
\ No newline at end of file
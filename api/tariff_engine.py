@@ -0,0 +1,91 @@
+"""Vectorized session pricing for back-office jobs.
+
+Batch versions of the two scalar tariff functions, operating on NumPy arrays of a whole set
+of sessions at once:
+
+    rate_batch   <-> parking_service.calculate_rate(minutes, start, tariff, day_tariff)
+    price_batch  <-> session_calculator.calculate_price(parkinglot, sid, session)
+
+Both perform the same floating point operations in the same order as the scalar code, so
+the results are identical, not merely close. Timestamps are datetime64[us] arrays;
+to_datetime64 converts database values or the string formats used in the codebase.
+"""
+from datetime import datetime
+
+import numpy as np
+
+DAY_US = 86_400 * 1_000_000
+
+
+def to_datetime64(values):
+    """datetime64[us] array from datetimes, ISO strings or legacy "dd-mm-YYYY HH:MM:SS" strings; None -> NaT"""
+    converted = []
+    for value in values:
+        if value is None or value == "None" or value == "":
+            converted.append("NaT")
+        elif isinstance(value, str) and value[2:3] == "-":
+            # dd-mm-YYYY HH:MM:SS -> YYYY-mm-dd HH:MM:SS
+            converted.append(f"{value[6:10]}-{value[3:5]}-{value[0:2]}{value[10:]}")
+        elif isinstance(value, datetime):
+            # numpy has no time zones; keep the wall-clock time like strptime does
+            converted.append(value.replace(tzinfo=None))
+        else:
+            converted.append(value)
+    return np.array(converted, dtype="datetime64[us]")
+
+
+def _us(timestamps):
+    return np.asarray(timestamps, dtype="datetime64[us]").astype(np.int64)
+
+
+def minutes_between(started, stopped):
+    """Session length in (fractional) minutes, as stop_parking_session computes duration_minutes"""
+    # (stopped - started).total_seconds() / 60.0
+    return ((_us(stopped) - _us(started)) / 1_000_000) / 60.0
+
+
+def rate_batch(minutes, tariff, day_tariff):
+    """calculate_rate for arrays: hourly tariff below a day, whole days at the day tariff plus the rest hourly"""
+    minutes = np.asarray(minutes, dtype=np.float64)
+    tariff = np.asarray(tariff, dtype=np.float64)
+    day_tariff = np.asarray(day_tariff, dtype=np.float64)
+
+    total_days = (minutes / 60) / 24
+    hourly = (minutes / 60) * tariff
+    hours, days = np.modf(total_days)
+    daily = (days * day_tariff) + ((hours * 24) * tariff)
+    return np.where(total_days < 1, hourly, daily)
+
+
+def price_batch(started, stopped, tariff, daytariff, hotel_guest=None, now=None):
+    """calculate_price for arrays; returns (price, hours, days).
+
+    A NaT stop time means the session is still running and is priced up to `now`
+    (default: the current time), like the scalar function does with datetime.now().
+    Callers fill a missing day tariff with 999, the scalar default.
+    """
+    start_us = _us(started)
+    stopped = np.asarray(stopped, dtype="datetime64[us]")
+    if now is None:
+        now = datetime.now()
+    end_us = np.where(np.isnat(stopped), np.datetime64(now, "us"), stopped).astype(np.int64)
+    tariff = np.asarray(tariff, dtype=np.float64)
+    daytariff = np.asarray(daytariff, dtype=np.float64)
+
+    diff_us = end_us - start_us
+    # timedelta.total_seconds() is exactly microseconds / 10**6
+    seconds = diff_us / 1_000_000
+    hours = np.ceil(seconds / 3600).astype(np.int64)
+    diff_days = diff_us // DAY_US  # timedelta.days floors, also for negative durations
+    multi_day = (end_us // DAY_US) > (start_us // DAY_US)  # end.date() > start.date()
+
+    hourly = np.minimum(tariff * hours, daytariff)
+    price = np.where(seconds < 180, 0.0, np.where(multi_day, daytariff * (diff_days + 1), hourly))
+    days = np.where(multi_day, diff_days + 1, 0)
+
+    if hotel_guest is not None:
+        guest = np.asarray(hotel_guest, dtype=bool)
+        price = np.where(guest, 0.0, price)
+        hours = np.where(guest, 0, hours)
+        days = np.where(guest, 0, days)
+    return price, hours, days
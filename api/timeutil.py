@@ -0,0 +1,81 @@
+"""One place for timestamps: parse any format the data uses, keep native datetimes in between.
+
+Values are datetime objects from the database to the service code and back; they are only
+turned into strings at the API boundary (format_timestamp). parse_timestamp accepts every
+format found in the data and the legacy code:
+
+    2024-05-01 08:00:00            canonical, MySQL DATETIME text
+    2024-05-01T08:00:00[.ffffff][Z|+02:00]   ISO 8601 (JSON exports)
+    01-05-2024 08:00:00            legacy payments / session_calculator
+    24-05-01 08:00:00              two-digit year, written by older session starts
+    datetime / date / epoch int or float
+
+String parsing avoids strptime: ISO goes through the C datetime.fromisoformat and the
+fixed-width legacy formats are sliced. Results are memoised, since listings repeat the same
+timestamps over and over.
+"""
+from datetime import date, datetime
+from functools import lru_cache
+
+@lru_cache(maxsize=65536)
+def _parse_string(text):
+    s = text.strip()
+    if len(s) >= 10 and s[4] == "-":
+        # ISO; fromisoformat only learned the Z suffix in 3.11
+        return datetime.fromisoformat(s[:-1] + "+00:00" if s.endswith("Z") else s)
+    if len(s) >= 10 and s[2] == "-" and s[5] == "-" and s[6:10].isdigit():
+        # dd-mm-YYYY[ HH:MM:SS]
+        return datetime(int(s[6:10]), int(s[3:5]), int(s[0:2]), *_clock(s[10:]))
+    if len(s) >= 8 and s[2] == "-" and s[5] == "-":
+        # yy-mm-dd[ HH:MM:SS]
+        return datetime(2000 + int(s[0:2]), int(s[3:5]), int(s[6:8]), *_clock(s[8:]))
+    raise ValueError(f"Unrecognised timestamp: {text!r}")
+
+
+def _clock(rest):
+    # " HH:MM:SS" (anything after the seconds, such as a fraction, is ignored like time[:19] did)
+    rest = rest.strip()
+    if not rest:
+        return 0, 0, 0
+    return int(rest[0:2]), int(rest[3:5]), int(rest[6:8]) if len(rest) >= 8 else 0
+
+
+def parse_timestamp(value):
+    """datetime for any supported timestamp value; None for missing values (None, "", "None")"""
+    if value is None or isinstance(value, datetime):
+        return value
+    if isinstance(value, date):
+        return datetime(value.year, value.month, value.day)
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value)
+    if value == "" or value == "None":
+        return None
+    return _parse_string(value)
+
+
+def naive(value):
+    """Drop the time zone, keeping the wall-clock time (MySQL DATETIME has no zone)"""
+    return value.replace(tzinfo=None) if value is not None and value.tzinfo else value
+
+
+def now():
+    """Current local time at the resolution stored in the database"""
+    return datetime.now().replace(microsecond=0)
+
+
+def format_timestamp(value):
+    """Canonical "YYYY-mm-dd HH:MM:SS" text for API responses; None stays None"""
+    value = parse_timestamp(value)
+    if value is None:
+        return None
+    return f"{value.year:04d}-{value.month:02d}-{value.day:02d} {value.hour:02d}:{value.minute:02d}:{value.second:02d}"
+
+
+def to_epoch(value):
+    """Seconds since the epoch as an int"""
+    value = parse_timestamp(value)
+    return None if value is None else int(value.timestamp())
+
+
+def minutes_between(started, stopped):
+    return (parse_timestamp(stopped) - parse_timestamp(started)).total_seconds() / 60.0